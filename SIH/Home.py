@@ -1,7 +1,10 @@
 import streamlit as st
 from chatbot_component import render_chatbot_sidebar
+import perf_trace
 
 st.set_page_config(page_title="Agri Suite", page_icon="🧑‍🌾", layout="wide", initial_sidebar_state="expanded")
+perf_trace.start("Home")
+perf_trace.mark("layout")
 
 st.title("🧑‍🌾 Agri Suite / കാർഷിക സ്യൂട്ട്")
 st.markdown("*Unified dashboards: Disease Detection, Farm Planning, Weather Advisory, and Agri Market*")
@@ -22,11 +25,11 @@ st.markdown(
 # Use the sidebar to navigate to any dashboard page
 
 # Render the agricultural chatbot in sidebar
+perf_trace.mark("chatbot")
 render_chatbot_sidebar()
 
 # Handle redirect from other pages
 if st.session_state.get('redirect_to_chatbot', False):
     st.session_state.redirect_to_chatbot = False
 
-
-
+perf_trace.finish()
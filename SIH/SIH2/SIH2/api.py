@@ -1,8 +1,11 @@
 # api.py
-from flask import Flask, jsonify, request
-from data_fetcher import get_data
+from flask import Flask, Response, request
+from price_service import PriceService
+from prices_http import handle_prices
 
 app = Flask(__name__)
+# one dataset per process: loaded once, refreshed incrementally, indexed by crop/market
+price_service = PriceService()
 
 @app.route("/prices", methods=["GET"])
 def prices():
@@ -10,17 +13,17 @@ def prices():
     Query params:
       crop - optional crop name (string)
       market - optional market name (string)
+      limit - optional page size (1..MAX_PAGE_SIZE); returns {"items": [...], "next_cursor": ...}
+      cursor - optional next_cursor from the previous page
+      format - json (default), ndjson, arrow (Arrow IPC stream), parquet or csv (gzip);
+               also negotiated from the Accept header. For ndjson the next page cursor,
+               if any, is sent in the X-Next-Cursor header.
+    Without limit/cursor/format the response is the full JSON list, as before.
+    Every response carries an ETag; a matching If-None-Match gets 304.
     """
-    df = get_data()
-    crop = request.args.get("crop")
-    market = request.args.get("market")
-    res = df.copy()
-    if crop:
-        res = res[res["crop"].str.lower() == crop.lower()]
-    if market:
-        res = res[res["market"].str.lower() == market.lower()]
-    # to json
-    return jsonify(res.to_dict(orient="records"))
+    headers = {k.lower(): v for k, v in request.headers.items()}
+    status, out, body = handle_prices(price_service, request.args.to_dict(), headers)
+    return Response(body, status=status, headers=out)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8000, debug=True)
@@ -5,34 +5,74 @@ import pandas as pd
 import numpy as np
 import pydeck as pdk
 import plotly.express as px
-from data_fetcher import get_data
-from utils import find_nearest_markets, get_user_location_by_ip, best_price_for_crop, normalize_price_column, haversine
+import plotly.graph_objects as go
+from map_clusters import MIN_ZOOM, MAX_ZOOM, MapClusters
+from arbitrage import TRANSPORT_COST_PER_KM
+from price_store import PriceStore, build_snapshot
+from utils import coords_key, get_user_location_by_ip, haversine, market_distances, reverse_geocode
+
+# rerun profiler from the Agri Suite (SIH/perf_trace.py); optional so the app still runs standalone
+try:
+    import perf_trace
+except ImportError:
+    perf_trace = None
+mark = perf_trace.mark if perf_trace else (lambda name: None)
+cache_data = perf_trace.cache_data if perf_trace else st.cache_data
 
 # Only set page config if running as the main Streamlit page, not when embedded
 if not os.environ.get("EMBEDDED_STREAMLIT"):
     st.set_page_config(page_title="Kerala Farmer Market Prices", layout="wide", initial_sidebar_state="expanded")
+    if perf_trace:
+        # when embedded, the Agri Market page owns the trace
+        perf_trace.start("Market Price Tracker")
 
 st.title("🌾 Kerala Farmers’ Market Price Tracker")
 st.markdown("Track current market prices across Kerala markets, find the nearest market, and compare best prices for your crop.")
 
 # --- load data (CSV or mock) ---
-@st.cache_data(ttl=120)  # refresh every 2 minutes
-def load_prices():
-    df = get_data()
-    # standardize column names
-    expected = ["market", "market_lat", "market_lon", "crop", "unit", "price", "timestamp"]
-    for c in expected:
-        if c not in df.columns:
-            df[c] = pd.NA
-    df = df[expected]
-    df = normalize_price_column(df, "price")
-    # Drop rows with no price or crop or market
-    df = df.dropna(subset=["price", "crop", "market"]).reset_index(drop=True)
-    return df
-
-df_prices = load_prices()
+@st.cache_resource
+def get_price_store():
+    # one store per process; it keeps already-parsed rows across cache refreshes
+    return PriceStore()
+
+@cache_data(ttl=120)  # refresh every 2 minutes
+def refresh_prices():
+    store = get_price_store()
+    # only rows added since the last refresh are parsed and normalized
+    store.refresh()
+    return store.version
+
+@st.cache_resource(max_entries=2)
+def load_snapshot(version):
+    # a resource, not cache_data: shared as-is by every session and rerun, never
+    # pickled, so the net-price ranker's per-cell distance cache keeps its hits
+    store = get_price_store()
+    # spatial index and crop/market row lookup, rebuilt only when the data refreshes
+    snap = build_snapshot(store.frame(), store.version, store.generation, store.fingerprint(), store.history.copy())
+    # map clusters for every zoom level, so the map only ships what is in view
+    snap["clusters"] = MapClusters(snap["summary"])
+    return snap
+
+@st.cache_resource(max_entries=2)
+def load_market_distances(markets_key, _markets):
+    # market x market distances, memory-mapped from disk and shared by every session;
+    # keyed on the market list (not the data version) and never copied into memory
+    return market_distances(_markets)
+
+mark("data load")
+snapshot = load_snapshot(refresh_prices())
+df_prices = snapshot["prices"]
+market_index = snapshot["market_index"]
+price_lookup = snapshot["lookup"]
+price_history = snapshot["history"]
+# best prices, per-crop stats and map aggregates, computed once per data refresh
+price_summary = snapshot["summary"]
+net_price_ranker = snapshot["ranker"]
+map_clusters = snapshot["clusters"]
+distance_matrix = load_market_distances(coords_key(market_index.markets), market_index.markets)
 
 # --- Sidebar: filters and location ---
+mark("filters")
 st.sidebar.header("Filters & Location")
 
 # Search / filter controls
@@ -44,18 +84,27 @@ selected_market = st.sidebar.multiselect("Filter by market (optional)", options=
 
 min_price = float(df_prices["price"].min()) if not df_prices["price"].empty else 0.0
 max_price = float(df_prices["price"].max()) if not df_prices["price"].empty else 1000.0
+default_price_range = (float(round(min_price,2)), float(round(max_price,2)))
 price_range = st.sidebar.slider("Price range", min_value=float(round(min_price,2)), max_value=float(round(max_price*1.5,2)),
-                                value=(float(round(min_price,2)), float(round(max_price,2))))
+                                value=default_price_range)
+# with the full range, charts can use the precomputed summary tables
+full_price_range = tuple(price_range) == default_price_range
 
 st.sidebar.markdown("---")
 st.sidebar.write("Get nearest markets:")
 auto_detect = st.sidebar.button("Detect my approximate location (IP-based)")
 manual_lat = st.sidebar.text_input("Or enter latitude (optional)", value="")
 manual_lon = st.sidebar.text_input("Or enter longitude (optional)", value="")
+search_radius = st.sidebar.number_input("Show all markets within (km, 0 = nearest 5 only)", min_value=0, max_value=500, value=0, step=10)
 
 user_location = None
 if auto_detect:
-    loc = get_user_location_by_ip()
+    try:
+        # the browser's IP as seen by Streamlit's proxy headers (Streamlit >= 1.37)
+        request_headers = dict(st.context.headers)
+    except AttributeError:
+        request_headers = None
+    loc = get_user_location_by_ip(headers=request_headers)
     if loc:
         st.sidebar.success(f"Detected location: {loc[0]:.4f}, {loc[1]:.4f}")
         user_location = loc
@@ -69,27 +118,32 @@ if manual_lat.strip() and manual_lon.strip():
         user_lon = float(manual_lon.strip())
         user_location = (user_lat, user_lon)
         st.sidebar.success(f"Using manual location: {user_lat:.4f}, {user_lon:.4f}")
+        area = reverse_geocode(user_lat, user_lon)
+        if area and area.get("district"):
+            taluk = f", {area['taluk']} taluk" if area.get("taluk") else ""
+            st.sidebar.caption(f"{'District' if area['exact'] else 'Nearest district'}: {area['district']}{taluk}")
     except:
         st.sidebar.warning("Invalid manual coordinates — ignoring.")
 
 # UI: choose a reference market as fallback
 st.sidebar.markdown("Or pick your town's market:")
 user_market_pick = st.sidebar.selectbox("Pick nearest market manually (optional)", options=["None"] + markets_list, index=0)
+picked_market = None
 if user_market_pick != "None" and user_location is None:
     # take coordinates from data for that market (first row)
-    row = df_prices[df_prices["market"] == user_market_pick].iloc[0]
+    row = price_lookup.select(df_prices, market=user_market_pick).iloc[0]
     if pd.notna(row["market_lat"]) and pd.notna(row["market_lon"]):
         user_location = (float(row["market_lat"]), float(row["market_lon"]))
+        picked_market = user_market_pick
         st.sidebar.info(f"Using coordinates of {user_market_pick}")
 
 # --- Filtering the main DataFrame ---
-df_filtered = df_prices.copy()
-
-if selected_crop != "All":
-    df_filtered = df_filtered[df_filtered["crop"].str.lower() == selected_crop.lower()]
+mark("tables")
+crop_filter = None if selected_crop == "All" else selected_crop
+# rows for the selected crop, looked up once and reused by every section below
+crop_df = price_lookup.select(df_prices, crop=crop_filter)
 
-if selected_market:
-    df_filtered = df_filtered[df_filtered["market"].isin(selected_market)]
+df_filtered = price_lookup.select(df_prices, crop=crop_filter, market=selected_market or None)
 
 df_filtered = df_filtered[(df_filtered["price"] >= price_range[0]) & (df_filtered["price"] <= price_range[1])]
 
@@ -118,13 +172,14 @@ def format_price_df(df):
 st.dataframe(df_filtered.sort_values(["crop","market","price"], ascending=[True, True, False]).reset_index(drop=True), use_container_width=True)
 
 # --- Best Price comparison for selected crop ---
+mark("best price")
 st.markdown("---")
 st.subheader("Best price comparison")
 
 if selected_crop == "All":
     st.info("Select a crop in the sidebar to see best price comparisons.")
 else:
-    best_rows = best_price_for_crop(df_prices, selected_crop)
+    best_rows = price_summary.best(selected_crop)
     if best_rows is None or best_rows.empty:
         st.warning("No data available for this crop.")
     else:
@@ -132,10 +187,10 @@ else:
         st.markdown(f"**Highest current price for {selected_crop}: ₹{best_rows['price'].iloc[0]:.2f} / {best_rows['unit'].iloc[0]}**")
         st.table(best_rows[["market","price","unit","timestamp"]].drop_duplicates().reset_index(drop=True))
         st.markdown("**All market prices for this crop:**")
-        crop_df = df_prices[df_prices["crop"].str.lower() == selected_crop.lower()].sort_values("price", ascending=False)
-        st.dataframe(crop_df[["market","price","unit","market_lat","market_lon","timestamp"]].reset_index(drop=True), use_container_width=True)
+        st.dataframe(crop_df.sort_values("price", ascending=False)[["market","price","unit","market_lat","market_lon","timestamp"]].reset_index(drop=True), use_container_width=True)
 
 # --- Visualization: Bar chart of prices across markets for the selected crop ---
+mark("charts")
 st.markdown("---")
 st.subheader("Visual comparison")
 
@@ -143,11 +198,13 @@ viz_col1, viz_col2 = st.columns([1,1])
 with viz_col1:
     if selected_crop == "All":
         # top crops average price
-        avg_by_crop = df_filtered.groupby("crop").price.mean().reset_index().sort_values("price", ascending=False)
+        if full_price_range:
+            avg_by_crop = price_summary.crop_averages(selected_market or None)
+        else:
+            avg_by_crop = df_filtered.groupby("crop", observed=True).price.mean().reset_index().sort_values("price", ascending=False)
         fig = px.bar(avg_by_crop, x="crop", y="price", title="Average price by crop (filtered)", labels={"price":"Avg Price (₹)"})
         st.plotly_chart(fig, use_container_width=True)
     else:
-        crop_df = df_prices[df_prices["crop"].str.lower() == selected_crop.lower()]
         if crop_df.empty:
             st.write("No data for selected crop.")
         else:
@@ -159,28 +216,82 @@ with viz_col2:
     if selected_crop == "All":
         st.write("Select a crop to see distribution.")
     else:
-        crop_df = df_prices[df_prices["crop"].str.lower() == selected_crop.lower()]
-        if not crop_df.empty:
-            fig2 = px.box(crop_df, y="price", points="all", title=f"Price distribution for {selected_crop}")
+        dist = price_summary.crop_distribution(selected_crop)
+        if dist is not None:
+            # box drawn from precomputed quartiles rather than every price row
+            fig2 = go.Figure(go.Box(
+                name=selected_crop, q1=[dist["q1"]], median=[dist["median"]], q3=[dist["q3"]],
+                lowerfence=[dist["min"]], upperfence=[dist["max"]], mean=[dist["mean"]],
+            ))
+            fig2.update_layout(title=f"Price distribution for {selected_crop} ({int(dist['n'])} prices)", yaxis_title="price")
             st.plotly_chart(fig2, use_container_width=True)
 
+# --- Price trend for the selected crop at one market (precomputed rolling stats) ---
+mark("trend")
+st.markdown("---")
+st.subheader("Price trend")
+
+if selected_crop == "All":
+    st.info("Select a crop in the sidebar to see its price trend.")
+else:
+    trend_markets = sorted(crop_df["market"].dropna().unique())
+    trend_col1, trend_col2 = st.columns([2, 1])
+    with trend_col1:
+        trend_market = st.selectbox("Market", options=trend_markets, index=0) if trend_markets else None
+    with trend_col2:
+        trend_days = st.selectbox("Period (days)", options=[7, 30, 90, 365], index=1)
+    trend = price_history.trend(selected_crop, trend_market, days=trend_days) if trend_market else None
+    if trend is None or trend.empty:
+        st.write("No dated prices for this crop and market.")
+    else:
+        latest = trend.iloc[-1]
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("Latest price", f"₹{latest['price']:.2f}", f"{latest['price'] - latest['mean_7d']:+.2f} vs 7-day avg")
+        m2.metric("7-day range", f"₹{latest['min_7d']:.2f} – ₹{latest['max_7d']:.2f}")
+        m3.metric("30-day average", f"₹{latest['mean_30d']:.2f}")
+        vol = latest["volatility_30d"]
+        m4.metric("30-day volatility", "-" if pd.isna(vol) else f"{vol * 100:.1f}%")
+        if len(trend) < 2:
+            st.caption("Only one day of prices so far; the chart fills in as daily data arrives.")
+        else:
+            trend_plot = trend[["price", "mean_7d", "mean_30d"]].reset_index()
+            fig3 = px.line(trend_plot, x="date", y=["price", "mean_7d", "mean_30d"],
+                           title=f"{selected_crop} at {trend_market}", labels={"value": "Price (₹)", "variable": ""})
+            st.plotly_chart(fig3, use_container_width=True)
+
 # --- Map showing markets and their price for selected crop or filtered set ---
+mark("map")
 st.markdown("---")
 st.subheader("Market map")
 
-map_df = df_filtered.copy()
-# If no lat/lon available, aggregate market coords from df_prices
-if "market_lat" in map_df.columns and map_df["market_lat"].notna().any():
-    # For mapping, get median lat/lon per market and average price for marker size
-    map_agg = map_df.groupby(["market","unit","market_lat","market_lon"], as_index=False).agg({
-        "price": "mean"
-    }).dropna(subset=["market_lat","market_lon"])
+if df_prices["market_lat"].notna().any():
+    map_col1, map_col2 = st.columns([1, 2])
+    with map_col1:
+        map_zoom = st.slider("Map zoom", min_value=MIN_ZOOM, max_value=MAX_ZOOM, value=7)
+    with map_col2:
+        map_centre = st.selectbox("Centre map on", options=["My location / all markets"] + markets_list, index=0)
+    centre_row = price_lookup.select(df_prices, market=map_centre).iloc[0] if map_centre in markets_list else None
+    if centre_row is not None and pd.notna(centre_row["market_lat"]) and pd.notna(centre_row["market_lon"]):
+        midpoint = (float(centre_row["market_lat"]), float(centre_row["market_lon"]))
+    elif user_location is not None:
+        midpoint = user_location
+    else:
+        midpoint = (float(market_index.lats.mean()), float(market_index.lons.mean())) if len(market_index) else (10.5, 76.3)
+    # average price per market (or per cluster of markets) for marker size
+    if full_price_range and not selected_market:
+        # precomputed clusters for this zoom, only those around the view
+        map_agg = map_clusters.viewport(midpoint[0], midpoint[1], map_zoom, crop=crop_filter)
+    elif full_price_range:
+        map_agg = price_summary.map_points(crop_filter, selected_market)
+    else:
+        map_agg = df_filtered.groupby(["market","unit","market_lat","market_lon"], as_index=False, observed=True).agg({
+            "price": "mean"
+        }).dropna(subset=["market_lat","market_lon"])
     if map_agg.empty:
         st.info("No geo coordinates in dataset to show map.")
     else:
         # use pydeck
-        midpoint = (map_agg["market_lat"].mean(), map_agg["market_lon"].mean())
-        st.write("Markets shown (size = average price). Click markers for details.")
+        st.write(f"{len(map_agg)} markers shown (size = average price; nearby markets are grouped when zoomed out). Click markers for details.")
         tooltip = {"html": "<b>{market}</b><br>Avg price: ₹{price:.2f} / {unit}", "style": {"color": "white"}}
         layer = pdk.Layer(
             "ScatterplotLayer",
@@ -193,13 +304,14 @@ if "market_lat" in map_df.columns and map_df["market_lat"].notna().any():
             radius_min_pixels=5,
             radius_max_pixels=80
         )
-        view_state = pdk.ViewState(latitude=midpoint[0], longitude=midpoint[1], zoom=7, pitch=0)
+        view_state = pdk.ViewState(latitude=midpoint[0], longitude=midpoint[1], zoom=map_zoom, pitch=0)
         r = pdk.Deck(layers=[layer], initial_view_state=view_state, tooltip=tooltip)
         st.pydeck_chart(r)
 else:
     st.info("Dataset does not include market coordinates, so map is unavailable.")
 
 # --- Nearest Market feature ---
+mark("nearest")
 st.markdown("---")
 st.subheader("Nearest markets to you")
 
@@ -207,14 +319,16 @@ if user_location is None:
     st.info("No user location provided. Use 'Detect my approximate location' or enter coordinates in the sidebar, or pick a market manually.")
 else:
     user_lat, user_lon = user_location
-    # prepare a markets DataFrame
-    markets_df = df_prices[["market","market_lat","market_lon"]].drop_duplicates(subset=["market"])
-    # drop missing coords
-    markets_df = markets_df.dropna(subset=["market_lat","market_lon"])
-    if markets_df.empty:
+    if len(market_index) == 0:
         st.warning("No market coordinates in data; cannot compute nearest markets.")
     else:
-        nearest = find_nearest_markets(df_prices, user_lat, user_lon, top_n=5)
+        if picked_market is not None and distance_matrix.position(picked_market) is not None:
+            # from a known market: one row of the precomputed distance matrix
+            nearest = distance_matrix.nearest(picked_market, k=5, radius_km=search_radius or None, include_self=True)
+        elif search_radius > 0:
+            nearest = market_index.within(user_lat, user_lon, search_radius)
+        else:
+            nearest = market_index.knn(user_lat, user_lon, k=5)
         if nearest.empty:
             st.warning("Could not compute nearby markets.")
         else:
@@ -223,16 +337,48 @@ else:
             st.table(nearest[["market","distance_km","market_lat","market_lon"]].reset_index(drop=True))
             # For convenience, show prices for nearest markets for the selected crop (or all)
             nearby_markets = nearest["market"].tolist()
-            near_prices = df_prices[df_prices["market"].isin(nearby_markets)]
-            if selected_crop != "All":
-                near_prices = near_prices[near_prices["crop"].str.lower() == selected_crop.lower()]
+            near_prices = price_lookup.select(df_prices, crop=crop_filter, market=nearby_markets)
             if near_prices.empty:
                 st.info("No price entries for the selected crop in the nearby markets. Try choosing 'All' crops or a different location.")
             else:
                 st.markdown("Prices in nearby markets:")
                 st.dataframe(near_prices[["market","crop","price","unit","timestamp"]].sort_values(["crop","price"], ascending=[True,False]).reset_index(drop=True), use_container_width=True)
 
+# --- Where to sell: price net of transport from the user's location ---
+mark("where to sell")
+st.markdown("---")
+st.subheader("Where to sell (net of transport)")
+
+if selected_crop == "All":
+    st.info("Select a crop in the sidebar to rank markets by price after transport.")
+elif user_location is None:
+    st.info("Provide your location in the sidebar to rank markets by price after transport.")
+else:
+    sell_col1, sell_col2 = st.columns([1, 1])
+    with sell_col1:
+        cost_per_km = st.number_input("Transport cost (₹ per unit per km)", min_value=0.0, value=TRANSPORT_COST_PER_KM, step=0.01, format="%.3f")
+    with sell_col2:
+        top_k = st.number_input("Markets to show", min_value=1, max_value=50, value=10, step=1)
+    # markets are only compared within one unit (₹/kg against ₹/kg)
+    sell_units = net_price_ranker.units(selected_crop)
+    sell_unit = st.selectbox("Price unit", options=sell_units, index=0) if len(sell_units) > 1 else None
+    ranked = net_price_ranker.rank(selected_crop, user_location[0], user_location[1], k=int(top_k),
+                                   per_km=cost_per_km, max_km=search_radius or None,
+                                   distances=distance_matrix.row(picked_market) if picked_market else None,
+                                   unit=sell_unit)
+    if ranked.empty:
+        st.warning("No markets with prices for this crop" + (f" within {search_radius} km." if search_radius else "."))
+    else:
+        best = ranked.iloc[0]
+        st.markdown(f"**Best net price: {best['market']} — ₹{best['net_price']:.2f} / {best['unit']}** "
+                    f"(₹{best['price']:.2f} minus ₹{best['transport_cost']:.2f} transport over {best['distance_km']:.0f} km)")
+        st.dataframe(ranked[["market","price","unit","distance_km","transport_cost","net_price"]].round(2), use_container_width=True)
+
 # --- Footer / tips ---
+mark("footer")
 st.markdown("---")
 st.caption("Notes: Data may be from a CSV snapshot or a live API (if configured). Automatic location detection is approximate (via IP). For accurate location-based results, enter GPS coordinates or select your market manually.")
 st.markdown("**How to use:** Use the sidebar to select a crop, apply market filters or price ranges, detect your location, and compare prices across markets. The system will highlight the highest price for a selected crop and show a table + map for easy comparison.")
+
+if perf_trace and not os.environ.get("EMBEDDED_STREAMLIT"):
+    perf_trace.finish()
@@ -0,0 +1,148 @@
+# arbitrage.py
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from utils import haversine_np, name_key
+
+# default transport cost: ₹ per unit of produce per km, plus a fixed ₹ per unit
+TRANSPORT_COST_PER_KM = 0.02
+TRANSPORT_COST_FIXED = 0.0
+# user locations are snapped to cells this size (about 1 km) for the distance cache
+USER_CELL_DEG = 0.01
+MAX_CACHED_CELLS = 1024
+
+def transport_cost(distance_km, per_km=TRANSPORT_COST_PER_KM, fixed=TRANSPORT_COST_FIXED):
+    """Cost of moving one unit of produce distance_km (array-friendly)."""
+    return fixed + per_km * np.asarray(distance_km)
+
+class NetPriceRanker:
+    """
+    Where to sell a crop, net of transport: price - transport_cost(distance)
+    for every market that trades the crop, ranked from the user's location.
+
+    Per crop and unit it keeps each market's current price (latest day's mean
+    from the price history, else the mean over all rows) as arrays aligned
+    with the market index. Markets are only ranked against others selling in
+    the same unit: ₹/kg and ₹/dozen prices are never mixed or compared.
+    Distances from a user to every market are computed once per USER_CELL_DEG
+    cell and kept in a small LRU, so repeated queries from the same area only
+    do an O(markets) subtraction and an argpartition.
+    Built once per data refresh; keep one instance per snapshot (e.g. in
+    st.cache_resource) so the cell cache is reused. Pickled copies start with
+    an empty cell cache.
+    """
+
+    def __init__(self, market_index, summary, history=None):
+        markets = market_index.markets
+        self.markets = markets["market"].astype(str).to_numpy()
+        self.lats = market_index.lats
+        self.lons = market_index.lons
+        positions = {name_key(m): i for i, m in enumerate(self.markets)}
+
+        groups = summary.groups.assign(unit=summary.groups["unit"].astype(str))
+        g = groups.groupby(["crop_key", "market_key", "unit"], sort=False)
+        current = (g["price_sum"].sum() / g["n"].sum()).rename("price").to_frame()
+        if history is not None and len(history.latest):
+            # the history's daily series is per (market, crop) across units, so it
+            # only stands for the current price of pairs that trade in one unit
+            latest = history.latest["price"].droplevel("date")
+            latest.index = latest.index.swaplevel()
+            latest.index.names = ["crop_key", "market_key"]
+            pairs = current.index.droplevel("unit")
+            override = latest.reindex(pairs).to_numpy()
+            single_unit = ~pairs.duplicated(keep=False)
+            use = single_unit & ~np.isnan(override)
+            current["price"] = np.where(use, override, current["price"].to_numpy())
+
+        current = current.reset_index()
+        current["pos"] = current["market_key"].map(positions)
+        current = current.dropna(subset=["pos", "price"])
+        self._crops = {}
+        for (key, unit), rows in current.groupby(["crop_key", "unit"], sort=False):
+            self._crops.setdefault(key, {})[unit] = (
+                rows["pos"].to_numpy(dtype=np.intp),
+                rows["price"].to_numpy(dtype=float),
+            )
+        self._init_cache()
+
+    def _init_cache(self):
+        self._cells = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"cell_hits": 0, "cell_misses": 0}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("_cells", "_lock", "stats"):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_cache()
+
+    def units(self, crop):
+        """Units crop is priced in, the one quoted by most markets first."""
+        by_unit = self._crops.get(name_key(crop), {})
+        return sorted(by_unit, key=lambda unit: -len(by_unit[unit][0]))
+
+    def distances(self, lat, lon):
+        """float32 km from the centre of (lat, lon)'s cell to every market, cached per cell."""
+        cell = (int(np.floor(lat / USER_CELL_DEG)), int(np.floor(lon / USER_CELL_DEG)))
+        with self._lock:
+            dist = self._cells.get(cell)
+            if dist is not None:
+                self._cells.move_to_end(cell)
+                self.stats["cell_hits"] += 1
+                return dist
+        clat, clon = (cell[0] + 0.5) * USER_CELL_DEG, (cell[1] + 0.5) * USER_CELL_DEG
+        dist = haversine_np(clat, clon, self.lats, self.lons).astype(np.float32)
+        with self._lock:
+            self._cells[cell] = dist
+            self.stats["cell_misses"] += 1
+            while len(self._cells) > MAX_CACHED_CELLS:
+                self._cells.popitem(last=False)
+        return dist
+
+    def rank(self, crop, lat, lon, k=10, per_km=TRANSPORT_COST_PER_KM, fixed=TRANSPORT_COST_FIXED, max_km=None,
+             distances=None, unit=None):
+        """
+        Top-k markets for crop by net price after transport from (lat, lon),
+        among markets pricing it in unit (default: the first of units(crop)).
+        distances, if given, replaces the per-cell vector: km to every market in
+        market index order, e.g. a MarketDistances row when selling from a market.
+        Returns DataFrame with market, price, unit, distance_km, transport_cost,
+        net_price, market_lat, market_lon sorted by net_price descending.
+        """
+        columns = ["market", "price", "unit", "distance_km", "transport_cost", "net_price", "market_lat", "market_lon"]
+        units = self.units(crop)
+        if unit is None and units:
+            unit = units[0]
+        entry = self._crops.get(name_key(crop), {}).get(unit)
+        if entry is None or k <= 0:
+            return pd.DataFrame(columns=columns)
+        pos, price = entry
+        if distances is None or len(distances) != len(self.markets):
+            distances = self.distances(lat, lon)
+        dist = np.asarray(distances)[pos]
+        cost = transport_cost(dist, per_km, fixed)
+        net = price - cost
+        if max_km is not None:
+            net = np.where(dist <= max_km, net, -np.inf)
+        candidates = np.flatnonzero(np.isfinite(net))
+        k = min(int(k), len(candidates))
+        if k < len(candidates):
+            # O(n) selection; only the k survivors get sorted
+            candidates = candidates[np.argpartition(-net[candidates], k - 1)[:k]]
+        top = candidates[np.argsort(-net[candidates], kind="stable")]
+        rows = pos[top]
+        return pd.DataFrame({
+            "market": self.markets[rows],
+            "price": price[top],
+            "unit": unit,
+            "distance_km": dist[top].astype(float),
+            "transport_cost": cost[top].astype(float),
+            "net_price": net[top].astype(float),
+            "market_lat": self.lats[rows],
+            "market_lon": self.lons[rows],
+        }, columns=columns)
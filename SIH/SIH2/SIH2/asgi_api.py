@@ -0,0 +1,91 @@
+# asgi_api.py
+"""
+Async serving mode for the /prices API (same contract as api.py).
+
+Run with any ASGI server, e.g.:
+    uvicorn asgi_api:app --workers 4 --port 8000
+
+A background task refreshes the upstream data (CSV or PRICES_LIVE_API)
+off the event loop and publishes it to a shared Arrow file; every worker
+memory-maps the latest file and swaps its snapshot atomically, so readers
+are never blocked by a refresh. Under a server without lifespan events the
+requests themselves check for a newer file every POLL_SECONDS.
+"""
+
+import asyncio
+import os
+from urllib.parse import parse_qsl
+from data_fetcher import SAMPLE_CSV_PATH
+from price_service import PublishedPriceService, POLL_SECONDS
+from price_store import PriceStore
+from prices_http import handle_prices
+from snapshot_cache import SNAPSHOT_DIR_NAME
+
+SNAPSHOT_PATH = os.environ.get(
+    "PRICES_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(SAMPLE_CSV_PATH), SNAPSHOT_DIR_NAME, "prices_published.arrow"),
+)
+
+price_service = PublishedPriceService(
+    SNAPSHOT_PATH, store=PriceStore(live_api=os.environ.get("PRICES_LIVE_API") or None)
+)
+
+async def refresh_loop():
+    while True:
+        try:
+            await asyncio.to_thread(price_service.tick)
+        except Exception as e:
+            print("Price refresh failed:", e)
+        await asyncio.sleep(POLL_SECONDS)
+
+async def lifespan(receive, send):
+    task = None
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await asyncio.to_thread(price_service.tick)
+            except Exception as e:
+                print("Initial price load failed:", e)
+            task = asyncio.create_task(refresh_loop())
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if task is not None:
+                task.cancel()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def send_response(send, status, headers, body):
+    raw_headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+    await send({"type": "http.response.start", "status": status, "headers": raw_headers})
+    if isinstance(body, (bytes, bytearray)):
+        await send({"type": "http.response.body", "body": bytes(body)})
+        return
+    # streamed body: encode each chunk off the event loop
+    chunks = iter(body)
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    if scope["path"] != "/prices":
+        await send_response(send, 404, {"Content-Type": "application/json"}, b'{"error": "not found"}')
+        return
+    if scope["method"] not in ("GET", "HEAD"):
+        await send_response(send, 405, {"Content-Type": "application/json", "Allow": "GET, HEAD"}, b'{"error": "method not allowed"}')
+        return
+    args = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+    headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+    # cache hits are cheap, but a miss encodes a body; keep that off the event loop too
+    status, out, body = await asyncio.to_thread(handle_prices, price_service, args, headers)
+    if scope["method"] == "HEAD":
+        body = b""
+    await send_response(send, status, out, body)
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark for find_nearest_markets.
+Compares the old row-wise df.apply path against the vectorized kernel in utils.py.
+
+Run: python bench_nearest.py [n_price_rows] [n_markets] [n_users]
+"""
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from data_fetcher import MOCK_CROPS, generate_mock_data
+from utils import haversine, find_nearest_markets
+
+def find_nearest_markets_apply(df_markets, user_lat, user_lon, top_n=5):
+    """The previous implementation: haversine per price row, dedupe afterwards."""
+    df = df_markets.copy()
+    if df["market_lat"].isna().all() or df["market_lon"].isna().all():
+        return pd.DataFrame()
+    df["distance_km"] = df.apply(
+        lambda row: haversine(user_lat, user_lon, float(row["market_lat"]), float(row["market_lon"])), axis=1
+    )
+    df_markets_unique = df[["market", "market_lat", "market_lon", "distance_km"]].drop_duplicates(subset=["market"])
+    return df_markets_unique.sort_values("distance_km").head(top_n)
+
+def make_prices(n_rows, n_markets, seed=0):
+    """Deterministic mock prices: n_markets markets x 8 crops, enough days to reach ~n_rows."""
+    days = max(1, n_rows // (n_markets * len(MOCK_CROPS)))
+    return generate_mock_data(n_markets=n_markets, days=days, seed=seed)
+
+def timeit(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    n_markets = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    n_users = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+    df = make_prices(n_rows, n_markets)
+    user_lat, user_lon = 9.9312, 76.2673
+
+    old = find_nearest_markets_apply(df, user_lat, user_lon)
+    new = find_nearest_markets(df, user_lat, user_lon)
+    assert old["market"].tolist() == new["market"].tolist(), "results differ"
+    assert np.allclose(old["distance_km"].to_numpy(), new["distance_km"].to_numpy())
+
+    t_old = timeit(lambda: find_nearest_markets_apply(df, user_lat, user_lon), repeat=1)
+    t_new = timeit(lambda: find_nearest_markets(df, user_lat, user_lon))
+    print(f"{len(df)} price rows, {n_markets} markets")
+    print(f"  apply path:      {t_old * 1000:9.2f} ms")
+    print(f"  vectorized path: {t_new * 1000:9.2f} ms  ({t_old / t_new:.0f}x)")
+
+    rng = np.random.default_rng(1)
+    users_lat = rng.uniform(8.2, 12.8, n_users)
+    users_lon = rng.uniform(74.8, 77.4, n_users)
+    t_batch = timeit(lambda: find_nearest_markets(df, users_lat, users_lon))
+    print(f"  batch of {n_users} users: {t_batch * 1000:9.2f} ms total, {t_batch / n_users * 1e6:.1f} us/user")
+
+if __name__ == "__main__":
+    main()
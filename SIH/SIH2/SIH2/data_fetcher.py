@@ -1,99 +1,340 @@
 # data_fetcher.py
+import functools
 import os
+import threading
+import time
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
 import requests
-from datetime import datetime
+from pandas.api.types import union_categoricals
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 SAMPLE_CSV_PATH = os.path.join("sample_data", "kerala_mandi.csv")
+PRICE_COLUMNS = ["market", "market_lat", "market_lon", "crop", "unit", "price", "timestamp"]
+REQUIRED_COLUMNS = {"market", "crop", "unit", "price"}
 
-def generate_mock_data():
-    """Return a mock DataFrame for Kerala mandi markets with lat/lon and prices."""
-    markets = [
-        ("Kozhikode Market", 11.2588, 75.7804),
-        ("Kochi Market", 9.9312, 76.2673),
-        ("Thiruvananthapuram Market", 8.5241, 76.9366),
-        ("Thrissur Market", 10.5276, 76.2144),
-        ("Alappuzha Market", 9.4981, 76.3388),
-        ("Kannur Market", 11.8745, 75.3704),
-        ("Palakkad Market", 10.7867, 76.6548),
-        ("Kollam Market", 8.8932, 76.6141)
-    ]
-    crops = [
-        ("Onion", "kg"),
-        ("Tomato", "kg"),
-        ("Potato", "kg"),
-        ("Coconut", "count"),
-        ("Banana", "dozen"),
-        ("Chilly", "kg"),
-        ("Turmeric", "kg"),
-        ("Green Gram", "kg"),
-    ]
-
-    rows = []
-    t = datetime.utcnow().isoformat()
-    rng = np.random.default_rng(seed=42)
-    for m_name, lat, lon in markets:
-        for crop, unit in crops:
-            # price variation by market & crop
-            base = {
-                "Onion": 20, "Tomato": 25, "Potato": 18, "Coconut": 28,
-                "Banana": 60, "Chilly": 120, "Turmeric": 200, "Green Gram": 110
-            }.get(crop, 50)
-            # add rng noise
-            price = round(base * rng.uniform(0.8, 1.3), 2)
-            rows.append({
-                "market": m_name,
-                "market_lat": lat + rng.normal(0, 0.01),
-                "market_lon": lon + rng.normal(0, 0.01),
-                "crop": crop,
-                "unit": unit,
-                "price": price,
-                "timestamp": t
-            })
-
-    df = pd.DataFrame(rows)
-    return df
+# shared HTTP client for live sources: pooled keep-alive connections, bounded retries
+HTTP_POOL_SIZE = 16
+HTTP_RETRY = Retry(
+    total=3, connect=3, read=2, backoff_factor=0.5,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset({"GET"}), respect_retry_after_header=True, raise_on_status=False,
+)
+# requests/bytes/latency counters for fetch_live_from_api, see http_stats()
+HTTP_STATS = {"requests": 0, "not_modified": 0, "errors": 0, "bytes_wire": 0, "bytes_decoded": 0, "latency_s": 0.0}
+_http_lock = threading.Lock()
+_session = None
+# (url, params) -> {"etag", "last_modified", "df"} for conditional GETs, least recently used first;
+# each entry holds a whole DataFrame, so only the most recent few are kept
+VALIDATOR_CACHE_SIZE = 32
+CONDITIONAL_HEADERS = ("if-none-match", "if-modified-since")
+_validators = OrderedDict()
+_validators_lock = threading.Lock()
+
+KERALA_MARKETS = [
+    ("Kozhikode Market", 11.2588, 75.7804),
+    ("Kochi Market", 9.9312, 76.2673),
+    ("Thiruvananthapuram Market", 8.5241, 76.9366),
+    ("Thrissur Market", 10.5276, 76.2144),
+    ("Alappuzha Market", 9.4981, 76.3388),
+    ("Kannur Market", 11.8745, 75.3704),
+    ("Palakkad Market", 10.7867, 76.6548),
+    ("Kollam Market", 8.8932, 76.6141)
+]
+# used to fill coordinates for sources that only carry market names
+MARKET_COORDS = {name: (lat, lon) for name, lat, lon in KERALA_MARKETS}
+
+# Known source layouts mapped onto PRICE_COLUMNS. A schema matches when all of
+# its "match" columns are present; "defaults" fill columns the source lacks.
+# "date_format", if set, is how the source writes dates; they are stored as
+# ISO dates so later pd.to_datetime calls never have to guess the day/month order.
+SOURCE_SCHEMAS = [
+    {
+        "name": "canonical",
+        "match": REQUIRED_COLUMNS,
+        "rename": {},
+        "defaults": {},
+    },
+    {
+        # Agmarknet-style daily export, e.g. sample_data/kerala_mandi.csv
+        "name": "agmarknet_csv",
+        "match": {"Date", "Market", "Commodity", "ModalPrice"},
+        "rename": {"Date": "timestamp", "Market": "market", "Commodity": "crop", "ModalPrice": "price"},
+        "defaults": {"unit": "kg"},
+    },
+    {
+        # data.gov.in Agmarknet API records (prices per quintal)
+        "name": "agmarknet_api",
+        "match": {"market", "commodity", "modal_price"},
+        "rename": {"arrival_date": "timestamp", "commodity": "crop", "modal_price": "price"},
+        "defaults": {"unit": "quintal"},
+        # arrival_date is dd/mm/yyyy
+        "date_format": "%d/%m/%Y",
+    },
+]
+
+MOCK_CROPS = [
+    # (crop, unit, base price)
+    ("Onion", "kg", 20),
+    ("Tomato", "kg", 25),
+    ("Potato", "kg", 18),
+    ("Coconut", "count", 28),
+    ("Banana", "dozen", 60),
+    ("Chilly", "kg", 120),
+    ("Turmeric", "kg", 200),
+    ("Green Gram", "kg", 110),
+]
+# fixed "today" for mock data, so every call with the same parameters is identical
+MOCK_END_DATE = "2025-09-22"
+# synthetic markets beyond KERALA_MARKETS are scattered over this lat/lon box (India)
+MOCK_BBOX = (8.0, 30.0, 70.0, 90.0)
+
+def generate_mock_data(n_markets=None, n_crops=None, days=1, seed=42, end_date=MOCK_END_DATE):
+    """
+    Return a mock DataFrame for Kerala mandi markets with lat/lon and prices.
+
+    Defaults give the 8 Kerala markets x 8 crops for one day. Larger values add
+    synthetic markets/crops, and days > 1 adds daily history (a per market/crop
+    random walk), so millions of rows can be produced for benchmarks. Output is
+    fully determined by the arguments and cached; callers get their own copy.
+    """
+    return _mock_frame(n_markets or len(KERALA_MARKETS), n_crops or len(MOCK_CROPS), days, seed, end_date).copy()
+
+@functools.lru_cache(maxsize=8)
+def _mock_frame(n_markets, n_crops, days, seed, end_date):
+    rng = np.random.default_rng(seed=seed)
+
+    names = [m[0] for m in KERALA_MARKETS[:n_markets]]
+    lats = np.array([m[1] for m in KERALA_MARKETS[:n_markets]], dtype=float)
+    lons = np.array([m[2] for m in KERALA_MARKETS[:n_markets]], dtype=float)
+    extra = n_markets - len(names)
+    if extra > 0:
+        lat0, lat1, lon0, lon1 = MOCK_BBOX
+        names += [f"Market {i:05d}" for i in range(len(names) + 1, n_markets + 1)]
+        lats = np.concatenate([lats, rng.uniform(lat0, lat1, extra)])
+        lons = np.concatenate([lons, rng.uniform(lon0, lon1, extra)])
+    # one small jitter per market, so every row of a market shares its coordinates
+    lats = lats + rng.normal(0, 0.01, n_markets)
+    lons = lons + rng.normal(0, 0.01, n_markets)
+
+    crops = MOCK_CROPS[:n_crops] + [(f"Crop {i}", "kg", 50) for i in range(len(MOCK_CROPS) + 1, n_crops + 1)]
+    crop_names = [c[0] for c in crops]
+    units = sorted({c[1] for c in crops})
+    unit_codes = np.array([units.index(c[1]) for c in crops])
+    base = np.array([c[2] for c in crops], dtype=float)
+
+    # rows ordered day, market, crop
+    n_pairs = n_markets * n_crops
+    market_idx = np.tile(np.repeat(np.arange(n_markets), n_crops), days)
+    crop_idx = np.tile(np.arange(n_crops), n_markets * days)
+    day_idx = np.repeat(np.arange(days), n_pairs)
+
+    # price variation by market & crop, then a multiplicative daily random walk
+    level = base[crop_idx[:n_pairs]] * rng.uniform(0.8, 1.3, n_pairs)
+    if days > 1:
+        steps = rng.normal(0, 0.02, (days, n_pairs))
+        steps[-1] = 0.0  # the last day keeps the base level
+        walk = np.exp(np.cumsum(steps[::-1], axis=0)[::-1])
+        price = (walk * level).ravel()
+    else:
+        price = level
+    dates = pd.date_range(end=end_date, periods=days, freq="D").strftime("%Y-%m-%d").to_numpy(dtype=object)
+
+    return pd.DataFrame({
+        "market": pd.Categorical.from_codes(market_idx, categories=names),
+        "market_lat": lats[market_idx],
+        "market_lon": lons[market_idx],
+        "crop": pd.Categorical.from_codes(crop_idx, categories=crop_names),
+        "unit": pd.Categorical.from_codes(unit_codes[crop_idx], categories=units),
+        "price": np.round(price, 2),
+        "timestamp": dates[day_idx],
+    })
 
 def load_csv(csv_path=SAMPLE_CSV_PATH):
-    """Load CSV if present and compatible. Return DataFrame or None."""
+    """
+    Load CSV if present and of a known schema (see SOURCE_SCHEMAS).
+    Returns a normalized DataFrame or None. Reuses the columnar snapshot
+    when it still matches the file, so only new rows are parsed.
+    """
     if not os.path.exists(csv_path):
         return None
+    # local import: price_store builds on this module
+    from price_store import PriceStore
     try:
-        df = pd.read_csv(csv_path)
-        # Expecting columns: market, market_lat, market_lon, crop, unit, price, timestamp
-        required = {"market", "crop", "unit", "price"}
-        if not required.issubset(set(df.columns)):
-            return None
-        # if lat/lon missing, attempt to fill NA with None
-        if "market_lat" not in df.columns or "market_lon" not in df.columns:
-            df["market_lat"] = pd.NA
-            df["market_lon"] = pd.NA
-        return df
+        store = PriceStore(csv_path)
+        store.refresh()
+        # the store falls back to mock data when the CSV layout is unknown
+        return store.frame() if store.source == "csv" else None
     except Exception as e:
         print("Failed to load CSV:", e)
         return None
 
+def get_session():
+    """Process-wide requests.Session with connection pooling and retry/backoff."""
+    global _session
+    with _http_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=HTTP_RETRY)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"Accept": "application/json", "Accept-Encoding": "gzip, deflate"})
+            _session = session
+        return _session
+
+def http_stats():
+    """Copy of the live-fetch counters."""
+    with _http_lock:
+        return dict(HTTP_STATS)
+
+def _count(**deltas):
+    with _http_lock:
+        for k, v in deltas.items():
+            HTTP_STATS[k] += v
+
+def fetch_json(url, params=None, headers=None, timeout=10):
+    """GET url with the shared session and return the decoded JSON; raises on HTTP errors."""
+    t0 = time.perf_counter()
+    try:
+        resp = get_session().get(url, params=params, headers=headers, timeout=timeout)
+        resp.raise_for_status()
+        body = resp.content
+    except Exception:
+        _count(requests=1, errors=1, latency_s=time.perf_counter() - t0)
+        raise
+    wire = int(resp.headers.get("Content-Length") or len(body))
+    _count(requests=1, bytes_wire=wire, bytes_decoded=len(body), latency_s=time.perf_counter() - t0)
+    return resp.json()
+
 def fetch_live_from_api(api_url, params=None, headers=None, timeout=10):
-    """Optional: fetch data from external API that returns JSON list of rows matching the schema."""
+    """
+    Optional: fetch data from external API that returns JSON list of rows matching the schema.
+    Sends If-None-Match / If-Modified-Since from the previous response; on 304 the
+    previously built DataFrame object is returned unchanged (no download, no rebuild).
+    """
+    key = (api_url, tuple(sorted((params or {}).items())))
+    with _validators_lock:
+        cached = _validators.get(key)
+        if cached:
+            _validators.move_to_end(key)
+    req_headers = dict(headers or {})
+    if cached:
+        if cached["etag"]:
+            req_headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            req_headers["If-Modified-Since"] = cached["last_modified"]
+    t0 = time.perf_counter()
     try:
-        resp = requests.get(api_url, params=params, headers=headers, timeout=timeout)
+        resp = get_session().get(api_url, params=params, headers=req_headers, timeout=timeout)
+        if resp.status_code == 304:
+            if cached:
+                _count(requests=1, not_modified=1, latency_s=time.perf_counter() - t0)
+                return cached["df"]
+            # nothing to reuse (e.g. the caller sent its own validators): ask for the full body
+            _count(requests=1, not_modified=1)
+            req_headers = {k: v for k, v in req_headers.items() if k.lower() not in CONDITIONAL_HEADERS}
+            resp = get_session().get(api_url, params=params, headers=req_headers, timeout=timeout)
         resp.raise_for_status()
-        data = resp.json()
-        df = pd.DataFrame(data)
+        if resp.status_code == 304:
+            raise ValueError("304 Not Modified for an unconditional request")
+        body = resp.content
+        wire = int(resp.headers.get("Content-Length") or len(body))
+        _count(requests=1, bytes_wire=wire, bytes_decoded=len(body), latency_s=time.perf_counter() - t0)
+        df = pd.DataFrame(resp.json())
+        if resp.headers.get("ETag") or resp.headers.get("Last-Modified"):
+            entry = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified"), "df": df}
+            with _validators_lock:
+                _validators[key] = entry
+                _validators.move_to_end(key)
+                while len(_validators) > VALIDATOR_CACHE_SIZE:
+                    _validators.popitem(last=False)
         return df
     except Exception as e:
+        _count(requests=1, errors=1, latency_s=time.perf_counter() - t0)
         print("API fetch failed:", e)
         return None
 
+def detect_schema(columns):
+    """Return the first SOURCE_SCHEMAS entry whose columns are all present, or None."""
+    columns = set(columns)
+    for schema in SOURCE_SCHEMAS:
+        if schema["match"].issubset(columns):
+            return schema
+    return None
+
+def map_schema(df):
+    """Rename a known source layout onto PRICE_COLUMNS and fill missing columns."""
+    schema = detect_schema(df.columns)
+    if schema is None:
+        return df.copy()
+    df = df.rename(columns=schema["rename"])
+    for col, value in schema["defaults"].items():
+        if col not in df.columns:
+            df[col] = value
+    if schema.get("date_format") and "timestamp" in df.columns:
+        parsed = pd.to_datetime(df["timestamp"], format=schema["date_format"], errors="coerce")
+        # values in another layout are kept as they are
+        df["timestamp"] = parsed.dt.strftime("%Y-%m-%d").astype(object).where(parsed.notna(), df["timestamp"])
+    if "market" in df.columns:
+        # object dtype: mapping a categorical onto tuples would build a MultiIndex
+        known = df["market"].astype(object).map(MARKET_COORDS)
+        for col, pos in (("market_lat", 0), ("market_lon", 1)):
+            fill = known.map(lambda c: c[pos] if isinstance(c, tuple) else np.nan)
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(fill) if col in df.columns else fill
+    return df
+
+def to_columnar(df):
+    """Typed layout: categorical market/crop/unit, float32 coordinates, float64 price, string timestamp."""
+    df = df.copy()
+    for col in ("market", "crop", "unit"):
+        df[col] = df[col].astype(str).astype("category")
+    for col in ("market_lat", "market_lon"):
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float32)
+    df["price"] = df["price"].astype(np.float64)
+    df["timestamp"] = df["timestamp"].astype("string")
+    return df
+
+def concat_prices(parts):
+    """Concatenate normalized frames, keeping categorical columns categorical."""
+    parts = [p for p in parts if p is not None and len(p)]
+    if not parts:
+        return to_columnar(pd.DataFrame(columns=PRICE_COLUMNS))
+    if len(parts) == 1:
+        return parts[0]
+    cats = {}
+    for col in ("market", "crop", "unit"):
+        cats[col] = union_categoricals([p[col] for p in parts]).categories
+    parts = [p.astype({col: pd.CategoricalDtype(c) for col, c in cats.items()}) for p in parts]
+    return pd.concat(parts, ignore_index=True)
+
+def normalize_prices(df):
+    """
+    Map a raw frame onto PRICE_COLUMNS, coerce price to numeric,
+    drop rows with no price, crop or market and apply the typed layout.
+    """
+    df = map_schema(df)
+    for c in PRICE_COLUMNS:
+        if c not in df.columns:
+            df[c] = pd.NA
+    df = df[PRICE_COLUMNS].copy()
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    df = df.dropna(subset=["price", "crop", "market"]).reset_index(drop=True)
+    return to_columnar(df)
+
 def get_data(csv_path=SAMPLE_CSV_PATH, live_api=None):
     """
     Returns a DataFrame with the needed columns:
     market, market_lat, market_lon, crop, unit, price, timestamp
     """
-    # 1) try live API if provided
+    # 1) try live API if provided (a URL, or a list of fetch_planner source configs)
     if live_api:
-        df_api = fetch_live_from_api(live_api)
+        if isinstance(live_api, str):
+            df_api = fetch_live_from_api(live_api)
+        else:
+            from fetch_planner import fetch_all
+            df_api = fetch_all(live_api)
         if df_api is not None and not df_api.empty:
             return df_api
 
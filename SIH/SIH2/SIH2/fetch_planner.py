@@ -0,0 +1,120 @@
+# fetch_planner.py
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from data_fetcher import concat_prices, fetch_json, normalize_prices
+
+# A source describes one paginated endpoint, e.g. the data.gov.in Agmarknet API:
+#
+# {
+#     "name": "agmarknet",
+#     "url": "https://api.data.gov.in/resource/<resource-id>",
+#     "params": {"api-key": "...", "format": "json", "filters[state]": "Kerala"},
+#     "partitions": {"filters[district]": ["Ernakulam", "Kollam"], "filters[commodity]": ["Rice"]},
+#     "page_param": "offset",      # query param carrying the page position
+#     "page_mode": "offset",       # "offset" (row offset) or "page" (1-based page number)
+#     "page_size_param": "limit",
+#     "page_size": 500,
+#     "max_pages": 100,
+#     "records_key": "records",    # where rows live in a dict payload; list payloads are used as-is
+#     "rate_per_sec": 5,           # per-source request rate limit
+#     "burst": 5,
+# }
+#
+# Every combination of partition values is fetched concurrently; pages of one
+# partition are fetched in order until a short or empty page.
+
+DEFAULT_MAX_WORKERS = 8
+
+class RateLimiter:
+    """Thread-safe token bucket: at most `burst` back-to-back calls, then `rate` per second."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def plan_requests(sources):
+    """One (source, partition params) task per combination of partition values."""
+    tasks = []
+    for source in sources:
+        partitions = source.get("partitions") or {}
+        keys = list(partitions)
+        for values in itertools.product(*(partitions[k] for k in keys)):
+            tasks.append((source, dict(zip(keys, values))))
+    return tasks
+
+def _records(payload, records_key):
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict):
+        return payload.get(records_key) or []
+    return []
+
+def _fetch_partition(source, partition, limiter):
+    """All pages of one partition, as a list of raw record dicts."""
+    page_size = source.get("page_size")
+    page_param = source.get("page_param")
+    mode = source.get("page_mode", "offset")
+    # offset paging needs a page size to advance; otherwise there is one page
+    paged = page_param and (page_size or mode == "page")
+    rows = []
+    for page in range(source.get("max_pages", 100) if paged else 1):
+        params = {**source.get("params", {}), **partition}
+        if paged:
+            params[page_param] = page * (page_size or 0) if mode == "offset" else page + 1
+        if page_size and source.get("page_size_param"):
+            params[source["page_size_param"]] = page_size
+        limiter.acquire()
+        batch = _records(fetch_json(source["url"], params=params, timeout=source.get("timeout", 10)),
+                         source.get("records_key", "records"))
+        rows.extend(batch)
+        if not batch or (page_size and len(batch) < page_size):
+            break
+    return rows
+
+def fetch_all(sources, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Fan out over every (source, partition) with a bounded thread pool, honouring
+    per-source rate limits, and merge the results into the canonical price schema.
+    Failed partitions are reported and skipped. Returns a normalized DataFrame.
+    """
+    limiters = {id(s): RateLimiter(s.get("rate_per_sec", 0), s.get("burst", 1)) for s in sources}
+    tasks = plan_requests(sources)
+    frames = [None] * len(tasks)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(_fetch_partition, source, partition, limiters[id(source)]): i
+            for i, (source, partition) in enumerate(tasks)
+        }
+        for fut in as_completed(futures):
+            i = futures[fut]
+            source, partition = tasks[i]
+            try:
+                rows = fut.result()
+            except Exception as e:
+                print(f"Fetch failed for {source.get('name', source['url'])} {partition}:", e)
+                continue
+            if rows:
+                # each source may use its own layout; map it before merging
+                frames[i] = normalize_prices(pd.DataFrame(rows))
+    # plan order, so the merged frame does not depend on completion order
+    return concat_prices(frames)
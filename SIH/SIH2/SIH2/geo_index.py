@@ -0,0 +1,214 @@
+# geo_index.py
+"""
+Offline reverse geocoding: (lat, lon) -> Kerala district (and taluk).
+
+Boundaries are stored as one compact .npz file: area names and levels, a
+bounding box per area, and every polygon ring as float32 lon/lat vertices.
+A lookup picks candidate areas from a bounding-box grid and runs an
+even-odd point-in-polygon test over their edges only (holes and
+multipolygons work without special cases). Build the file once from GeoJSON
+boundaries, e.g. the district and taluk layers published by Kerala's
+State Spatial Data Infrastructure or DataMeet:
+
+    python geo_index.py build kerala_districts.geojson DISTRICT district \
+        [kerala_taluks.geojson TALUK taluk]
+
+No boundary file ships with the repo, so out of the box the point-in-polygon
+path is inert: every locate() result comes from the nearest district
+headquarters for points inside Kerala's bounding box and has exact=False.
+Points near a district border can get the neighbouring district. Build the
+boundary file as above to get exact answers.
+"""
+
+import json
+import os
+import sys
+import threading
+import numpy as np
+
+GEO_INDEX_PATH = os.environ.get(
+    "GEO_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_data", "kerala_admin.npz")
+)
+# bounding-box grid cell size for candidate lookup
+GRID_DEG = 0.1
+# lat_min, lat_max, lon_min, lon_max
+KERALA_BBOX = (8.17, 12.80, 74.85, 77.42)
+
+# district headquarters
+KERALA_DISTRICTS = {
+    "Thiruvananthapuram": {"lat": 8.5241, "lon": 76.9366},
+    "Kollam": {"lat": 8.8932, "lon": 76.6141},
+    "Pathanamthitta": {"lat": 9.2662, "lon": 76.7870},
+    "Alappuzha": {"lat": 9.4981, "lon": 76.3388},
+    "Kottayam": {"lat": 9.5916, "lon": 76.5222},
+    "Idukki": {"lat": 9.8560, "lon": 77.1094},
+    "Ernakulam": {"lat": 9.9816, "lon": 76.2999},
+    "Thrissur": {"lat": 10.5276, "lon": 76.2144},
+    "Palakkad": {"lat": 10.7867, "lon": 76.6548},
+    "Malappuram": {"lat": 11.0510, "lon": 76.0711},
+    "Kozhikode": {"lat": 11.2588, "lon": 75.7804},
+    "Wayanad": {"lat": 11.6854, "lon": 76.1320},
+    "Kannur": {"lat": 11.8745, "lon": 75.3704},
+    "Kasaragod": {"lat": 12.4996, "lon": 74.9869},
+}
+
+def _rings(geometry):
+    """All rings (outer and holes) of a GeoJSON Polygon/MultiPolygon as (n, 2) lon/lat arrays."""
+    if geometry is None:
+        return []
+    if geometry["type"] == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geometry["type"] == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        return []
+    return [np.asarray(ring, dtype=np.float32)[:, :2] for poly in polygons for ring in poly if len(ring) >= 3]
+
+def build_geo_index(layers, out_path=GEO_INDEX_PATH):
+    """
+    layers: [(geojson_path, name_property, level), ...], e.g.
+    [("districts.geojson", "DISTRICT", "district"), ("taluks.geojson", "TALUK", "taluk")].
+    Writes the compact boundary file and returns the number of areas.
+    """
+    names, levels, bboxes, ring_start, vertices = [], [], [], [0], []
+    area_ring_start = [0]
+    n_vertices = 0
+    for path, name_property, level in layers:
+        with open(path, encoding="utf-8") as f:
+            features = json.load(f)["features"]
+        for feature in features:
+            rings = _rings(feature.get("geometry"))
+            if not rings:
+                continue
+            names.append(str(feature.get("properties", {}).get(name_property, "")).strip().title())
+            levels.append(level)
+            pts = np.concatenate(rings)
+            bboxes.append([pts[:, 1].min(), pts[:, 1].max(), pts[:, 0].min(), pts[:, 0].max()])
+            for ring in rings:
+                vertices.append(ring)
+                n_vertices += len(ring)
+                ring_start.append(n_vertices)
+            area_ring_start.append(len(ring_start) - 1)
+    tmp = f"{out_path}.{os.getpid()}.tmp.npz"
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    np.savez(
+        tmp,
+        names=np.array(json.dumps(names)),
+        levels=np.array(json.dumps(levels)),
+        bboxes=np.asarray(bboxes, dtype=np.float32).reshape(-1, 4),
+        area_ring_start=np.asarray(area_ring_start, dtype=np.int32),
+        ring_start=np.asarray(ring_start, dtype=np.int64),
+        vertices=np.concatenate(vertices) if vertices else np.empty((0, 2), dtype=np.float32),
+    )
+    os.replace(tmp, out_path)
+    return len(names)
+
+class GeoIndex:
+    """Point-in-polygon index over the areas of a build_geo_index() file."""
+
+    def __init__(self, path=GEO_INDEX_PATH, grid_deg=GRID_DEG):
+        with np.load(path) as data:
+            self.names = json.loads(str(data["names"]))
+            self.levels = json.loads(str(data["levels"]))
+            self.bboxes = data["bboxes"]
+            self.area_ring_start = data["area_ring_start"]
+            self.ring_start = data["ring_start"]
+            self.vertices = data["vertices"].astype(np.float64)
+        self.path = path
+        self.grid_deg = grid_deg
+        # every edge as (x1, y1, x2, y2) with its area id, closing each ring
+        nxt = np.arange(1, len(self.vertices) + 1)
+        nxt[self.ring_start[1:] - 1] = self.ring_start[:-1]
+        self._edges = np.column_stack([self.vertices, self.vertices[nxt % max(len(self.vertices), 1)]])
+        ring_area = np.repeat(np.arange(len(self.names)), np.diff(self.area_ring_start))
+        self._edge_area = np.repeat(ring_area, np.diff(self.ring_start))
+        order = np.argsort(self._edge_area, kind="stable")
+        self._edges, self._edge_area = self._edges[order], self._edge_area[order]
+        self._area_edges = np.searchsorted(self._edge_area, np.arange(len(self.names) + 1))
+        # grid cell -> areas whose bounding box touches it
+        self._cells = {}
+        for area, (lat0, lat1, lon0, lon1) in enumerate(self.bboxes):
+            for i in range(int(np.floor(lat0 / grid_deg)), int(np.floor(lat1 / grid_deg)) + 1):
+                for j in range(int(np.floor(lon0 / grid_deg)), int(np.floor(lon1 / grid_deg)) + 1):
+                    self._cells.setdefault((i, j), []).append(area)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _contains(self, area, lat, lon):
+        e = self._edges[self._area_edges[area]:self._area_edges[area + 1]]
+        x1, y1, x2, y2 = e[:, 0], e[:, 1], e[:, 2], e[:, 3]
+        straddles = (y1 > lat) != (y2 > lat)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = x1 + (lat - y1) * (x2 - x1) / (y2 - y1)
+        return bool(np.count_nonzero(straddles & (lon < x_cross)) % 2)
+
+    def areas(self, lat, lon):
+        """{level: area name} for every area containing the point."""
+        cell = (int(np.floor(lat / self.grid_deg)), int(np.floor(lon / self.grid_deg)))
+        found = {}
+        for area in self._cells.get(cell, ()):
+            lat0, lat1, lon0, lon1 = self.bboxes[area]
+            if lat0 <= lat <= lat1 and lon0 <= lon <= lon1 and self.levels[area] not in found:
+                if self._contains(area, lat, lon):
+                    found[self.levels[area]] = self.names[area]
+        return found
+
+def nearest_district(lat, lon):
+    """Nearest district headquarters to a point inside Kerala's bounding box, else None."""
+    lat0, lat1, lon0, lon1 = KERALA_BBOX
+    if not (lat0 <= lat <= lat1 and lon0 <= lon <= lon1):
+        return None
+    names = list(KERALA_DISTRICTS)
+    hq = np.array([[d["lat"], d["lon"]] for d in KERALA_DISTRICTS.values()])
+    # equirectangular distance is plenty for ranking points a few km apart
+    dx = (hq[:, 1] - lon) * np.cos(np.radians(lat))
+    dy = hq[:, 0] - lat
+    return names[int(np.argmin(dx * dx + dy * dy))]
+
+_index = None
+_index_lock = threading.Lock()
+_warned_missing = False
+
+def get_geo_index(path=GEO_INDEX_PATH):
+    """The shared GeoIndex for path, or None if no boundary file is available."""
+    global _index
+    with _index_lock:
+        if _index is None or _index.path != path:
+            if not os.path.exists(path):
+                return None
+            try:
+                _index = GeoIndex(path)
+            except Exception as e:
+                print("Boundary index unavailable:", e)
+                return None
+        return _index
+
+def locate(lat, lon, path=GEO_INDEX_PATH):
+    """
+    {"district": ..., "taluk": ... (when the file has taluks), "exact": bool}
+    for a point, or None outside the known areas. exact is False when the
+    district comes from the nearest-headquarters fallback.
+    """
+    global _warned_missing
+    index = get_geo_index(path)
+    if index is not None:
+        found = index.areas(lat, lon)
+        if found:
+            return {**found, "exact": True}
+        return None
+    if not _warned_missing:
+        _warned_missing = True
+        print(f"No district boundary file at {path}; districts are approximated by the nearest headquarters")
+    district = nearest_district(lat, lon)
+    return {"district": district, "exact": False} if district else None
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 5 and sys.argv[1] == "build" and len(sys.argv[2:]) % 3 == 0:
+        args = sys.argv[2:]
+        layers = [tuple(args[i:i + 3]) for i in range(0, len(args), 3)]
+        print(f"Wrote {build_geo_index(layers)} areas to {GEO_INDEX_PATH}")
+    elif len(sys.argv) == 3:
+        print(locate(float(sys.argv[1]), float(sys.argv[2])))
+    else:
+        print("usage: python geo_index.py build <layer.geojson> <name property> <level> [...] | python geo_index.py <lat> <lon>")
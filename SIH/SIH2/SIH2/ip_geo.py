@@ -0,0 +1,148 @@
+# ip_geo.py
+"""
+Offline IPv4 -> approximate coordinates lookup.
+
+The range table is a sorted .npy of (start, end, lat, lon) records that is
+memory-mapped and binary-searched, so a lookup touches a few pages of the
+file and takes microseconds. Build it once from any free "IP range to city"
+CSV, e.g. DB-IP Lite (dbip-city-lite-*.csv) or IP2Location LITE DB5:
+
+    python ip_geo.py build dbip-city-lite.csv sample_data/ip_ranges.npy
+
+Both dotted (1.2.3.0) and integer range bounds are accepted. IPv6 rows are
+skipped. Point IP_GEO_DB at the .npy file (default sample_data/ip_ranges.npy).
+"""
+
+import functools
+import ipaddress
+import os
+import sys
+import threading
+import numpy as np
+import pandas as pd
+
+IP_GEO_DB = os.environ.get("IP_GEO_DB", os.path.join("sample_data", "ip_ranges.npy"))
+RANGE_DTYPE = np.dtype([("start", "<u4"), ("end", "<u4"), ("lat", "<f4"), ("lon", "<f4")])
+LOOKUP_CACHE_SIZE = 4096
+
+def ip_to_int(ip):
+    """Dotted IPv4 string -> int, or None for IPv6/invalid."""
+    try:
+        addr = ipaddress.ip_address(str(ip).strip())
+    except ValueError:
+        return None
+    return int(addr) if addr.version == 4 else None
+
+def _bounds(col):
+    as_int = pd.to_numeric(col, errors="coerce")
+    if as_int.notna().all():
+        return as_int.to_numpy(dtype=np.int64)
+    parsed = (ip_to_int(v) for v in col)
+    return np.array([-1 if v is None else v for v in parsed], dtype=np.int64)
+
+def build_ip_table(csv_path, out_path=IP_GEO_DB):
+    """
+    Convert an IP range CSV into the sorted range table. The first two columns
+    are the range bounds; latitude/longitude are the columns named so, else
+    the last two columns. Returns the number of ranges written.
+    """
+    df = pd.read_csv(csv_path, header=None, dtype=str, keep_default_na=False)
+    if not str(df.iloc[0, 0])[:1].isdigit():
+        # header row
+        df.columns = [c.strip().lower() for c in df.iloc[0]]
+        df = df.iloc[1:]
+    cols = list(df.columns)
+    lat_col = "latitude" if "latitude" in cols else cols[-2]
+    lon_col = "longitude" if "longitude" in cols else cols[-1]
+    start, end = _bounds(df[cols[0]]), _bounds(df[cols[1]])
+    lat = pd.to_numeric(df[lat_col], errors="coerce").to_numpy()
+    lon = pd.to_numeric(df[lon_col], errors="coerce").to_numpy()
+    ok = (start >= 0) & (end >= start) & (end <= 0xFFFFFFFF) & np.isfinite(lat) & np.isfinite(lon)
+
+    table = np.empty(int(ok.sum()), dtype=RANGE_DTYPE)
+    table["start"], table["end"] = start[ok], end[ok]
+    table["lat"], table["lon"] = lat[ok], lon[ok]
+    table.sort(order="start")
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    with open(tmp, "wb") as f:
+        np.save(f, table)
+    os.replace(tmp, out_path)
+    return len(table)
+
+class IpGeoTable:
+    """Memory-mapped range table; lookup() is a binary search over the start column."""
+
+    def __init__(self, path=IP_GEO_DB):
+        self.path = path
+        self.table = np.load(path, mmap_mode="r")
+        if self.table.dtype != RANGE_DTYPE:
+            raise ValueError(f"{path} is not an IP range table")
+        self.starts = self.table["start"]
+
+    def __len__(self):
+        return len(self.table)
+
+    def lookup(self, ip):
+        """(lat, lon) for an IPv4 address (str or int), or None if it is in no range."""
+        n = ip if isinstance(ip, (int, np.integer)) else ip_to_int(ip)
+        if n is None or not 0 <= n <= 0xFFFFFFFF:
+            return None
+        i = int(np.searchsorted(self.starts, np.uint32(n), side="right")) - 1
+        if i < 0:
+            return None
+        row = self.table[i]
+        if n > int(row["end"]):
+            return None
+        return float(row["lat"]), float(row["lon"])
+
+_table = None
+_table_lock = threading.Lock()
+
+def get_table(path=IP_GEO_DB):
+    """The shared IpGeoTable for path, or None if the file is missing/invalid."""
+    global _table
+    with _table_lock:
+        if _table is None or _table.path != path:
+            if not os.path.exists(path):
+                return None
+            try:
+                _table = IpGeoTable(path)
+            except Exception as e:
+                print("IP geolocation table unavailable:", e)
+                return None
+        return _table
+
+@functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def lookup_ip(ip, path=IP_GEO_DB):
+    """Cached offline lookup: (lat, lon) or None. Private and reserved addresses give None."""
+    try:
+        addr = ipaddress.ip_address(str(ip).strip())
+    except ValueError:
+        return None
+    if not addr.is_global:
+        return None
+    table = get_table(path)
+    return table.lookup(int(addr)) if table is not None and addr.version == 4 else None
+
+def client_ip(headers):
+    """
+    The requesting client's IP from proxy headers (X-Forwarded-For first hop,
+    then X-Real-Ip), or None. Header names are matched case-insensitively.
+    """
+    if not headers:
+        return None
+    headers = {str(k).lower(): v for k, v in dict(headers).items()}
+    forwarded = headers.get("x-forwarded-for")
+    if forwarded:
+        return forwarded.split(",")[0].strip()
+    return headers.get("x-real-ip")
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "build":
+        out = sys.argv[3] if len(sys.argv) > 3 else IP_GEO_DB
+        print(f"Wrote {build_ip_table(sys.argv[2], out)} ranges to {out}")
+    elif len(sys.argv) == 2:
+        print(lookup_ip(sys.argv[1]))
+    else:
+        print("usage: python ip_geo.py build <ranges.csv> [out.npy] | python ip_geo.py <ip>")
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Load test for the /prices endpoint, in-process through Flask's test client.
+Compares the old per-request path (get_data + string scans + jsonify)
+against the cached PriceService behind api.py.
+
+Run from this folder: python loadtest_api.py [seconds_per_case]
+"""
+
+import sys
+import time
+from flask import Flask, jsonify, request
+from data_fetcher import get_data
+import api
+
+legacy_app = Flask("legacy")
+
+@legacy_app.route("/prices", methods=["GET"])
+def legacy_prices():
+    """The handler as it was before the cached service."""
+    df = get_data()
+    crop = request.args.get("crop")
+    market = request.args.get("market")
+    res = df.copy()
+    if crop:
+        res = res[res["crop"].str.lower() == crop.lower()]
+    if market:
+        res = res[res["market"].str.lower() == market.lower()]
+    return jsonify(res.to_dict(orient="records"))
+
+QUERIES = [
+    "/prices",
+    "/prices?crop=Rice",
+    "/prices?crop=onion",
+    "/prices?market=Kochi%20Market",
+    "/prices?crop=Coconut&market=kollam%20market",
+]
+
+def run(app, seconds):
+    client = app.test_client()
+    for q in QUERIES:  # warm up
+        assert client.get(q).status_code == 200
+    n = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        client.get(QUERIES[n % len(QUERIES)])
+        n += 1
+    return n / (time.perf_counter() - t0)
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    before = run(legacy_app, seconds)
+    after = run(api.app, seconds)
+    print(f"/prices mixed queries, {seconds:.0f}s each")
+    print(f"  before (get_data per request): {before:9.0f} req/s")
+    print(f"  after  (cached PriceService):  {after:9.0f} req/s  ({after / before:.1f}x)")
+    print(f"  service stats: {api.price_service.stats}")
+
+if __name__ == "__main__":
+    main()
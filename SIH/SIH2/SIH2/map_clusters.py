@@ -0,0 +1,106 @@
+# map_clusters.py
+import numpy as np
+import pandas as pd
+from utils import name_key
+
+# web map tiles are 256 px wide; a cluster cell is about CLUSTER_PX on screen
+TILE_PX = 256
+CLUSTER_PX = 64
+MIN_ZOOM = 4
+MAX_ZOOM = 12
+ALL_CROPS = ""
+
+def cell_degrees(zoom):
+    """Grid cell size in degrees that covers about CLUSTER_PX at this zoom."""
+    return 360.0 / (2 ** zoom) * CLUSTER_PX / TILE_PX
+
+def viewport_bounds(lat, lon, zoom, width_px=1000, height_px=600):
+    """(lat_min, lat_max, lon_min, lon_max) seen by a width_px x height_px map centred on lat/lon."""
+    deg_per_px = 360.0 / (TILE_PX * 2 ** zoom)
+    half_lon = width_px * deg_per_px / 2
+    # Mercator: a pixel covers fewer degrees of latitude away from the equator
+    half_lat = height_px * deg_per_px * np.cos(np.radians(lat)) / 2
+    return lat - half_lat, lat + half_lat, lon - half_lon, lon + half_lon
+
+def _cluster(points, zoom):
+    """
+    Grid-bin market points (categorical market and unit, market_lat, market_lon,
+    price_sum, n) at one zoom. Units are never mixed: a cell holding ₹/kg and
+    ₹/dozen prices gives one cluster per unit, like the per-(market, unit) plot.
+    """
+    deg = cell_degrees(zoom)
+    lat = points["market_lat"].to_numpy(dtype=float)
+    lon = points["market_lon"].to_numpy(dtype=float)
+    cells = pd.DataFrame({
+        "ci": np.floor(lat / deg).astype(np.int64),
+        "cj": np.floor(lon / deg).astype(np.int64),
+        "market_lat": lat,
+        "market_lon": lon,
+        # integer codes group much faster than names; names are put back below
+        "market": points["market"].cat.codes.to_numpy(),
+        "unit": points["unit"].cat.codes.to_numpy(),
+        "price_sum": points["price_sum"].to_numpy(dtype=float),
+        "n": points["n"].to_numpy(),
+    })
+    g = cells.groupby(["ci", "cj", "unit"], sort=False)
+    out = pd.DataFrame({
+        "market_lat": g["market_lat"].mean(),
+        "market_lon": g["market_lon"].mean(),
+        "markets": g["market"].nunique(),
+        "market": g["market"].first(),
+        "price_sum": g["price_sum"].sum(),
+        "n": g["n"].sum(),
+    }).reset_index(level="unit").reset_index(drop=True)
+    out["price"] = out["price_sum"] / out["n"]
+    out["market"] = points["market"].cat.categories.astype(str).to_numpy()[out["market"].to_numpy()]
+    out["unit"] = points["unit"].cat.categories.astype(str).to_numpy()[out["unit"].to_numpy()]
+    many = out["markets"].to_numpy() > 1
+    out.loc[many, "market"] = out.loc[many, "markets"].astype(str) + " markets"
+    out = out[["market", "unit", "market_lat", "market_lon", "price", "markets", "n"]]
+    # sorted by latitude so a viewport is a searchsorted slice plus a longitude mask
+    return out.sort_values("market_lat", kind="stable").reset_index(drop=True)
+
+class MapClusters:
+    """
+    Market map clusters precomputed per zoom level, for all crops and for each crop.
+
+    Markets are binned on a lat/lon grid whose cells are about CLUSTER_PX wide
+    on screen at that zoom, separately per unit; each cluster carries its
+    centroid, market count and average price in that unit. viewport() then returns only the clusters a map of the given
+    centre/zoom/size can show, so the browser gets a bounded number of markers.
+    Built once per data refresh from a PriceSummary.
+    """
+
+    def __init__(self, summary, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+        self.min_zoom, self.max_zoom = min_zoom, max_zoom
+        groups = summary.groups.dropna(subset=["market_lat", "market_lon"])
+        groups = groups[groups["n"].to_numpy() > 0]
+        point_cols = ["market", "unit", "market_lat", "market_lon"]
+        by_crop = {ALL_CROPS: groups.groupby(point_cols, observed=True, sort=False)[["price_sum", "n"]].sum().reset_index()}
+        for key, rows in groups.groupby("crop_key", sort=False):
+            by_crop[key] = rows[point_cols + ["price_sum", "n"]]
+        self._levels = {
+            (key, zoom): _cluster(points, zoom)
+            for key, points in by_crop.items()
+            for zoom in range(min_zoom, max_zoom + 1)
+        }
+
+    def clusters(self, crop=None, zoom=MIN_ZOOM):
+        """Every cluster for crop (None = all crops) at zoom (clamped to the precomputed range)."""
+        zoom = int(min(max(round(zoom), self.min_zoom), self.max_zoom))
+        levels = self._levels.get((name_key(crop) if crop else ALL_CROPS, zoom))
+        if levels is None:
+            return pd.DataFrame(columns=["market", "unit", "market_lat", "market_lon", "price", "markets", "n"])
+        return levels
+
+    def viewport(self, lat, lon, zoom, crop=None, width_px=1000, height_px=600, margin=0.25):
+        """
+        Clusters inside the map view centred on lat/lon at zoom, plus margin
+        (share of the view size) on every side so small pans stay populated.
+        """
+        levels = self.clusters(crop, zoom)
+        lat0, lat1, lon0, lon1 = viewport_bounds(lat, lon, zoom, width_px * (1 + 2 * margin), height_px * (1 + 2 * margin))
+        lats = levels["market_lat"].to_numpy()
+        rows = levels.iloc[np.searchsorted(lats, lat0, side="left"):np.searchsorted(lats, lat1, side="right")]
+        lons = rows["market_lon"].to_numpy()
+        return rows[(lons >= lon0) & (lons <= lon1)]
@@ -0,0 +1,95 @@
+# market_index.py
+import numpy as np
+import pandas as pd
+from utils import haversine_np, unique_markets
+
+KM_PER_DEG_LAT = 111.195
+
+class MarketIndex:
+    """
+    Fixed-size lat/lon grid over unique market coordinates.
+    Build once per data refresh, then answer k-nearest and radius queries
+    by visiting only nearby cells instead of scanning every market.
+    """
+
+    def __init__(self, df_markets, cell_deg=0.25):
+        self.markets = unique_markets(df_markets)
+        self.cell_deg = float(cell_deg)
+        self.lats = self.markets["market_lat"].to_numpy(dtype=float)
+        self.lons = self.markets["market_lon"].to_numpy(dtype=float)
+
+        ci = np.floor(self.lats / self.cell_deg).astype(np.int64)
+        cj = np.floor(self.lons / self.cell_deg).astype(np.int64)
+        # markets sorted by cell so every cell is a contiguous slice of self._order
+        self._order = np.lexsort((cj, ci))
+        cells, starts = np.unique(np.stack([ci[self._order], cj[self._order]], axis=1), axis=0, return_index=True)
+        self._cell_i = cells[:, 0] if len(cells) else np.empty(0, dtype=np.int64)
+        self._cell_j = cells[:, 1] if len(cells) else np.empty(0, dtype=np.int64)
+        self._cell_start = starts
+        self._cell_end = np.append(starts[1:], len(self._order)).astype(starts.dtype)
+        self._max_abs_lat = float(np.abs(self.lats).max()) if len(self.lats) else 0.0
+
+    def __len__(self):
+        return len(self.markets)
+
+    def _gather(self, cell_mask):
+        """Market row positions for the selected cells."""
+        starts = self._cell_start[cell_mask]
+        lengths = self._cell_end[cell_mask] - starts
+        # concatenated aranges [start, end) for every selected cell, without a Python loop
+        shift = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        return self._order[np.arange(lengths.sum()) + shift]
+
+    def _result(self, rows, dist):
+        out = self.markets.iloc[rows].reset_index(drop=True)
+        out["distance_km"] = dist
+        return out
+
+    def knn(self, lat, lon, k=5):
+        """
+        k nearest markets to (lat, lon).
+        Returns DataFrame with market, market_lat, market_lon, distance_km sorted ascending.
+        """
+        k = min(int(k), len(self))
+        if k <= 0:
+            return self._result(np.empty(0, dtype=np.intp), np.empty(0))
+        qi = int(np.floor(lat / self.cell_deg))
+        qj = int(np.floor(lon / self.cell_deg))
+        ring = np.maximum(np.abs(self._cell_i - qi), np.abs(self._cell_j - qj))
+        # smallest east-west width of a cell between the query and the data
+        cos_min = np.cos(np.radians(min(89.0, max(self._max_abs_lat, abs(lat)) + self.cell_deg)))
+        cell_km = self.cell_deg * KM_PER_DEG_LAT * cos_min
+
+        rows = dist = None
+        for r in np.unique(ring):
+            rows = self._gather(ring <= r)
+            if len(rows) < k:
+                continue
+            dist = haversine_np(lat, lon, self.lats[rows], self.lons[rows])
+            kth = np.partition(dist, k - 1)[k - 1]
+            # anything not yet visited is at least r cells away from the query
+            if kth <= r * cell_km:
+                break
+        top = np.argsort(dist, kind="stable")[:k]
+        return self._result(rows[top], dist[top])
+
+    def within(self, lat, lon, radius_km):
+        """All markets within radius_km of (lat, lon), sorted by distance."""
+        dlat = radius_km / KM_PER_DEG_LAT
+        cos_min = np.cos(np.radians(min(89.0, abs(lat) + dlat)))
+        dlon = radius_km / (KM_PER_DEG_LAT * max(cos_min, 1e-6))
+        lo_i, hi_i = np.floor((lat - dlat) / self.cell_deg), np.floor((lat + dlat) / self.cell_deg)
+        lo_j, hi_j = np.floor((lon - dlon) / self.cell_deg), np.floor((lon + dlon) / self.cell_deg)
+        mask = (self._cell_i >= lo_i) & (self._cell_i <= hi_i) & (self._cell_j >= lo_j) & (self._cell_j <= hi_j)
+        rows = self._gather(mask)
+        dist = haversine_np(lat, lon, self.lats[rows], self.lons[rows])
+        keep = dist <= radius_km
+        rows, dist = rows[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return self._result(rows[order], dist[order])
+
+def build_market_index(df_prices, cell_deg=0.25):
+    """Index over the unique markets in a price frame."""
+    if df_prices is None or df_prices.empty:
+        return MarketIndex(pd.DataFrame(columns=["market", "market_lat", "market_lon"]), cell_deg)
+    return MarketIndex(df_prices, cell_deg)
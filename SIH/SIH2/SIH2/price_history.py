@@ -0,0 +1,189 @@
+# price_history.py
+import numpy as np
+import pandas as pd
+from utils import name_key
+
+# rolling windows in calendar days
+WINDOWS = (7, 30)
+KEY_LEVELS = ["market", "crop"]
+DAY_COLUMNS = ["price_sum", "n", "price_min", "price_max"]
+
+def stat_columns(windows=WINDOWS):
+    """price (daily mean) plus mean/min/max/volatility per window, e.g. mean_7d."""
+    cols = ["price"]
+    for w in windows:
+        cols += [f"mean_{w}d", f"min_{w}d", f"max_{w}d", f"volatility_{w}d"]
+    return cols
+
+def daily_aggregates(df):
+    """
+    Raw price rows -> one row per (market, crop, day) with the day's price sum,
+    count, min and max, indexed by (market key, crop key, date).
+    Rows without a parseable timestamp are skipped.
+    """
+    dates = pd.to_datetime(df["timestamp"], errors="coerce", utc=True)
+    d = pd.DataFrame({
+        "market": df["market"].map(name_key).astype(str).to_numpy(),
+        "crop": df["crop"].map(name_key).astype(str).to_numpy(),
+        "date": dates.dt.tz_localize(None).dt.normalize().to_numpy(),
+        "price": df["price"].to_numpy(dtype=float),
+    }).dropna(subset=["date", "price"])
+    g = d.groupby(KEY_LEVELS + ["date"], sort=False)["price"]
+    return pd.DataFrame({
+        "price_sum": g.sum(),
+        "n": g.count(),
+        "price_min": g.min(),
+        "price_max": g.max(),
+    })
+
+def rolling_stats(days, windows=WINDOWS):
+    """
+    Rolling aggregates over daily rows (sorted by key, then date).
+    mean/volatility use the daily mean price; min/max use the daily extremes.
+    Volatility is the coefficient of variation (std / mean) of daily means.
+    """
+    days = days.reset_index()
+    days["price"] = days["price_sum"] / days["n"]
+    out = days[KEY_LEVELS + ["date"] + DAY_COLUMNS + ["price"]].copy()
+    if days.empty:
+        for w in windows:
+            for stat in ("mean", "min", "max", "volatility"):
+                out[f"{stat}_{w}d"] = np.empty(0)
+        return out.set_index(KEY_LEVELS + ["date"])
+
+    pair = days.groupby(KEY_LEVELS, sort=False).ngroup().to_numpy()
+    day = (days["date"].to_numpy() - days["date"].min().to_datetime64()) // np.timedelta64(1, "D")
+    price = days["price"].to_numpy()
+    lows = days["price_min"].to_numpy(dtype=float)
+    highs = days["price_max"].to_numpy(dtype=float)
+    pos = np.arange(len(days))
+    for w in windows:
+        # a window holds at most w daily rows, so look back at most w - 1 rows;
+        # a row counts if it is the same pair and within w calendar days
+        n = np.zeros(len(days))
+        total = np.zeros(len(days))
+        total_sq = np.zeros(len(days))
+        low = lows.copy()
+        high = highs.copy()
+        for back in range(w):
+            prev = pos - back
+            ok = prev >= 0
+            prev = np.where(ok, prev, 0)
+            ok &= (pair[prev] == pair) & (day - day[prev] < w)
+            # centred on the row's own price, which keeps the variance sum well conditioned
+            dev = np.where(ok, price[prev] - price, 0.0)
+            n += ok
+            total += dev
+            total_sq += dev * dev
+            if back:
+                low = np.where(ok, np.minimum(low, lows[prev]), low)
+                high = np.where(ok, np.maximum(high, highs[prev]), high)
+        mean = price + total / n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.maximum(total_sq - total * total / n, 0.0) / (n - 1))
+        std[n < 2] = np.nan
+        out[f"mean_{w}d"] = mean
+        out[f"min_{w}d"] = low
+        out[f"max_{w}d"] = high
+        out[f"volatility_{w}d"] = np.where(mean > 0, std / mean, np.nan)
+    return out.set_index(KEY_LEVELS + ["date"])
+
+class PriceHistory:
+    """
+    Daily price history per (market, crop) with precomputed rolling 7/30-day
+    mean, min, max and volatility.
+
+    add() takes newly arrived rows only: it merges them into the daily table
+    and recomputes the rolling stats of the touched (market, crop) pairs from
+    the earliest new day on (with a window's worth of earlier days as context).
+    Untouched pairs and older days are left as they are.
+
+    Tables are replaced, never modified in place, so copy() is cheap and a
+    copy stays consistent while the original keeps ingesting.
+    """
+
+    def __init__(self, df=None, windows=WINDOWS):
+        self.windows = tuple(windows)
+        self.days = rolling_stats(daily_aggregates(_empty_rows()), self.windows)
+        # latest day of every pair, for "current" summaries
+        self.latest = self.days
+        self.market_names = {}
+        self.crop_names = {}
+        if df is not None:
+            self.add(df)
+
+    def __len__(self):
+        return len(self.days)
+
+    def copy(self):
+        other = PriceHistory.__new__(PriceHistory)
+        other.__dict__.update(self.__dict__)
+        other.market_names = dict(self.market_names)
+        other.crop_names = dict(self.crop_names)
+        return other
+
+    def add(self, df):
+        """Merge newly arrived price rows. Returns the number of daily rows (re)computed."""
+        if df is None or df.empty:
+            return 0
+        for col, names in (("market", self.market_names), ("crop", self.crop_names)):
+            for name in pd.unique(df[col].dropna()):
+                names.setdefault(name_key(name), str(name))
+        new = daily_aggregates(df)
+        if new.empty:
+            return 0
+        start = new.index.get_level_values("date").min()
+        context_start = start - pd.Timedelta(days=max(self.windows) - 1)
+
+        pairs = new.index.droplevel("date").unique()
+        old = self.days
+        touched = old.index.droplevel("date").isin(pairs)
+        old_dates = old.index.get_level_values("date")
+        context = old.loc[touched & (old_dates >= context_start), DAY_COLUMNS]
+
+        merged = pd.concat([context, new]).groupby(level=KEY_LEVELS + ["date"], sort=True).agg(
+            {"price_sum": "sum", "n": "sum", "price_min": "min", "price_max": "max"}
+        )
+        stats = rolling_stats(merged, self.windows)
+        stats = stats[stats.index.get_level_values("date") >= start]
+
+        keep = old[~(touched & (old_dates >= start))]
+        self.days = pd.concat([keep, stats]).sort_index()
+        last = stats.reset_index().drop_duplicates(subset=KEY_LEVELS, keep="last").set_index(KEY_LEVELS + ["date"])
+        self.latest = pd.concat([
+            self.latest[~self.latest.index.droplevel("date").isin(pairs)], last
+        ]).sort_index()
+        return len(stats)
+
+    def trend(self, crop, market, days=None):
+        """
+        Daily price and rolling stats for crop at market (case-insensitive),
+        oldest first, indexed by date. days limits it to the last N calendar days.
+        """
+        key = (name_key(market), name_key(crop))
+        try:
+            rows = self.days.loc[key]
+        except KeyError:
+            return pd.DataFrame(columns=stat_columns(self.windows))
+        rows = rows[stat_columns(self.windows)]
+        if days:
+            rows = rows[rows.index > rows.index.max() - pd.Timedelta(days=days)]
+        return rows
+
+    def summary(self, crop=None, market=None):
+        """
+        Latest day's price and rolling stats for every (market, crop), optionally
+        narrowed to one crop and/or market, with display names and the date.
+        """
+        rows = self.latest
+        if crop:
+            rows = rows[rows.index.get_level_values("crop") == name_key(crop)]
+        if market:
+            rows = rows[rows.index.get_level_values("market") == name_key(market)]
+        out = rows[stat_columns(self.windows)].reset_index()
+        out["market"] = out["market"].map(self.market_names)
+        out["crop"] = out["crop"].map(self.crop_names)
+        return out
+
+def _empty_rows():
+    return pd.DataFrame({"market": [], "crop": [], "price": [], "timestamp": []})
@@ -0,0 +1,327 @@
+# price_service.py
+import base64
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Arrow/Parquet output is unavailable without pyarrow
+    pa = pq = None
+from price_store import PriceStore, build_lookup_snapshot
+from snapshot_cache import read_meta, read_table, write_table
+from utils import name_key
+
+try:
+    import fcntl
+except ImportError:  # no advisory locks (Windows): every worker refreshes and publishes on its own
+    fcntl = None
+
+REFRESH_SECONDS = float(os.environ.get("PRICES_REFRESH_SECONDS", "120"))
+POLL_SECONDS = float(os.environ.get("PRICES_POLL_SECONDS", "2"))
+MAX_CACHED_RESPONSES = 1024
+MAX_PAGE_SIZE = 10000
+NDJSON_CHUNK_ROWS = 1000
+
+class CursorError(ValueError):
+    """Raised for malformed cursors or cursors from a reloaded dataset."""
+
+def encode_cursor(generation, offset):
+    return base64.urlsafe_b64encode(f"{generation}:{offset}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Returns (generation, offset)."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        generation, offset = (int(x) for x in raw.split(":"))
+    except Exception:
+        raise CursorError("invalid cursor")
+    if offset < 0:
+        raise CursorError("invalid cursor")
+    return generation, offset
+
+def _to_json(df, lines=False):
+    # 6 digits: float32 coordinates would otherwise serialize with noise (9.9312000275)
+    return df.to_json(orient="records", lines=lines, force_ascii=False, double_precision=6).encode("utf-8")
+
+def _to_arrow_stream(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def _to_parquet(df):
+    buf = io.BytesIO()
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), buf, compression="zstd")
+    return buf.getvalue()
+
+def _to_csv_gzip(df):
+    return gzip.compress(df.to_csv(index=False, float_format="%.6g").encode("utf-8"), compresslevel=6)
+
+# format -> (mimetype, encoder); bodies are built straight from the cached frame
+EXPORT_FORMATS = {
+    "json": ("application/json", _to_json),
+    "arrow": ("application/vnd.apache.arrow.stream", _to_arrow_stream),
+    "parquet": ("application/vnd.apache.parquet", _to_parquet),
+    "csv": ("text/csv", _to_csv_gzip),
+}
+
+def available_formats():
+    """Export formats usable in this environment."""
+    return [f for f in EXPORT_FORMATS if pa is not None or f in ("json", "csv")]
+
+class PriceService:
+    """
+    Process-level price dataset for the API.
+
+    Holds one snapshot (frame + crop/market lookup, see build_lookup_snapshot)
+    and refreshes it from the incremental PriceStore at most every
+    refresh_seconds. Serialized
+    responses are cached per (format, normalized crop, market) and dropped
+    whenever the snapshot version changes.
+    """
+
+    def __init__(self, store=None, refresh_seconds=REFRESH_SECONDS, max_responses=MAX_CACHED_RESPONSES):
+        self.store = store if store is not None else PriceStore()
+        self.refresh_seconds = refresh_seconds
+        self.max_responses = max_responses
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._responses = OrderedDict()
+        self.stats = {"refreshes": 0, "response_hits": 0, "response_misses": 0}
+
+    def snapshot(self):
+        """Current snapshot, refreshed from the store when the refresh interval has passed."""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked_at < self.refresh_seconds:
+            return self._snapshot
+        with self._lock:
+            if self._snapshot is None or now - self._checked_at >= self.refresh_seconds:
+                self.store.refresh()
+                self.stats["refreshes"] += 1
+                if self._snapshot is None or self._snapshot["version"] != self.store.version:
+                    self._snapshot = build_lookup_snapshot(
+                        self.store.frame(), self.store.version, self.store.generation, self.store.fingerprint(),
+                    )
+                    self._responses.clear()
+                self._checked_at = now
+            return self._snapshot
+
+    def _swap(self, snap):
+        """Install a new immutable snapshot; readers holding the old one keep using it."""
+        with self._lock:
+            self._snapshot = snap
+            self._responses.clear()
+
+    def invalidate(self):
+        """Force a refresh check on the next request."""
+        self._checked_at = 0.0
+
+    def query(self, crop=None, market=None):
+        """Rows matching crop and/or market, via the prebuilt lookup."""
+        snap = self.snapshot()
+        return snap["lookup"].select(snap["prices"], crop=crop, market=market)
+
+    def etag(self, fmt="json", crop=None, market=None, *extra):
+        """Strong validator for a query on the current snapshot; changes whenever the data does."""
+        snap = self.snapshot()
+        parts = [snap["fingerprint"], fmt, name_key(crop) if crop else "", name_key(market) if market else ""]
+        parts += [str(x) for x in extra]
+        return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+
+    def export(self, fmt="json", crop=None, market=None):
+        """
+        Matching rows encoded as fmt (see EXPORT_FORMATS) as bytes,
+        served from the response cache while the snapshot is unchanged.
+        """
+        mimetype, encode = EXPORT_FORMATS[fmt]
+        if fmt not in available_formats():
+            raise ValueError(f"format {fmt!r} needs pyarrow")
+        snap = self.snapshot()
+        key = (snap["version"], fmt, name_key(crop) if crop else None, name_key(market) if market else None)
+        with self._lock:
+            body = self._responses.get(key)
+            if body is not None:
+                self._responses.move_to_end(key)
+                self.stats["response_hits"] += 1
+                return body
+        body = encode(snap["lookup"].select(snap["prices"], crop=crop, market=market))
+        with self._lock:
+            self.stats["response_misses"] += 1
+            if snap["version"] == (self._snapshot or {}).get("version"):
+                self._responses[key] = body
+                if len(self._responses) > self.max_responses:
+                    self._responses.popitem(last=False)
+        return body
+
+    def json_response(self, crop=None, market=None):
+        """JSON records for a (crop, market) query as UTF-8 bytes."""
+        return self.export("json", crop=crop, market=market)
+
+    def _page_bounds(self, snap, rows, limit, cursor):
+        start = 0
+        if cursor:
+            generation, start = decode_cursor(cursor)
+            if generation != snap["generation"]:
+                # rows were dropped since the cursor was issued; positions no longer line up
+                raise CursorError("cursor expired, restart without a cursor")
+        stop = len(rows) if limit is None else min(len(rows), start + limit)
+        next_cursor = encode_cursor(snap["generation"], stop) if stop < len(rows) else None
+        return start, stop, next_cursor
+
+    def page(self, crop=None, market=None, limit=100, cursor=None):
+        """
+        One page of matching rows as JSON bytes: {"items": [...], "next_cursor": str|null}.
+        Cursors stay valid while the store only appends; a reload expires them.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        snap = self.snapshot()
+        rows = snap["lookup"].rows(crop, market)
+        start, stop, next_cursor = self._page_bounds(snap, rows, limit, cursor)
+        items = _to_json(snap["prices"].take(rows[start:stop]))
+        return b'{"items":' + items + b',"next_cursor":' + json.dumps(next_cursor).encode() + b"}"
+
+    def ndjson_chunks(self, crop=None, market=None, limit=None, cursor=None, chunk_rows=NDJSON_CHUNK_ROWS):
+        """
+        Matching rows as newline-delimited JSON, yielded chunk_rows at a time so
+        only one chunk is materialized at once. Validates the cursor eagerly and
+        returns (generator, next_cursor).
+        """
+        if limit is not None:
+            limit = max(1, int(limit))
+        snap = self.snapshot()
+        rows = snap["lookup"].rows(crop, market)
+        start, stop, next_cursor = self._page_bounds(snap, rows, limit, cursor)
+        prices = snap["prices"]
+
+        def generate():
+            for lo in range(start, stop, chunk_rows):
+                chunk = _to_json(prices.take(rows[lo:min(stop, lo + chunk_rows)]), lines=True)
+                yield chunk if chunk.endswith(b"\n") else chunk + b"\n"
+
+        return generate(), next_cursor
+
+
+class PublishedPriceService(PriceService):
+    """
+    PriceService for several worker processes sharing one snapshot file.
+
+    One worker at a time (the holder of an exclusive lock on <path>.lock)
+    refreshes the PriceStore and publishes the frame to an uncompressed
+    Arrow file at path. Every worker memory-maps that file when it changes
+    and swaps in a new immutable snapshot, so numeric columns are shared
+    through the page cache instead of each worker holding its own copy.
+    Call tick() from a background task; snapshot() also ticks once
+    poll_seconds have passed, so a server without one still refreshes.
+    """
+
+    def __init__(self, path, store=None, refresh_seconds=REFRESH_SECONDS, max_responses=MAX_CACHED_RESPONSES,
+                 poll_seconds=POLL_SECONDS):
+        super().__init__(store, refresh_seconds, max_responses)
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._ticked_at = 0.0
+        self._tick_lock = threading.Lock()
+        self._lock_file = None
+        self._file_id = None
+        self._published_at = 0.0
+        self._published_store_version = None
+        self._published_store_generation = None
+        self.stats.update({"publishes": 0, "reloads": 0})
+
+    def snapshot(self):
+        if self._snapshot is None or time.monotonic() - self._ticked_at >= self.poll_seconds:
+            # stale: refresh from the request, without waiting if another thread already is
+            self.tick(wait=self._snapshot is None)
+        snap = self._snapshot
+        if snap is None:
+            # nothing published yet: serve a private snapshot until the first publish lands
+            snap = super().snapshot()
+        return snap
+
+    def is_leader(self):
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            f = open(self.path + ".lock", "a+")
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            self._lock_file = f  # held for the life of the process
+        return True
+
+    def _published_meta(self):
+        try:
+            return read_meta(self.path)
+        except Exception:
+            return {"version": 0, "generation": 0}
+
+    def publish(self, force=False):
+        """Leader only: refresh the store and publish a new file if the data changed."""
+        now = time.monotonic()
+        if not force and now - self._published_at < self.refresh_seconds:
+            return False
+        self._published_at = now
+        self.store.refresh()
+        self.stats["refreshes"] += 1
+        if self.store.version == self._published_store_version and os.path.exists(self.path):
+            return False
+        # versions continue from the file, so they stay monotonic when leadership moves
+        prev = self._published_meta()
+        generation = prev["generation"]
+        if self.store.generation != self._published_store_generation:
+            # rows were dropped (or a new leader started): existing cursors must expire
+            generation += 1
+        meta = {"version": prev["version"] + 1, "generation": generation, "fingerprint": self.store.fingerprint()}
+        if not write_table(self.path, self.store.frame(), meta):
+            return False
+        self._published_store_version = self.store.version
+        self._published_store_generation = self.store.generation
+        self.stats["publishes"] += 1
+        return True
+
+    def reload_if_changed(self):
+        """Memory-map the published file if it was replaced since the last load."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        file_id = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if file_id == self._file_id:
+            return False
+        try:
+            df, meta = read_table(self.path, split_blocks=True)
+        except Exception as e:
+            print("Failed to load published prices:", e)
+            return False
+        self._file_id = file_id
+        # only what the API serves from; no per-worker summaries, history or ranker
+        self._swap(build_lookup_snapshot(df, meta["version"], meta["generation"], meta["fingerprint"]))
+        self.stats["reloads"] += 1
+        return True
+
+    def tick(self, wait=True):
+        """
+        One refresh step: publish if leader and due, then pick up the latest file.
+        With wait=False it returns at once if another thread is mid-tick.
+        """
+        if not self._tick_lock.acquire(blocking=wait):
+            return
+        try:
+            self._ticked_at = time.monotonic()
+            if self.is_leader():
+                self.publish()
+            self.reload_if_changed()
+        finally:
+            self._tick_lock.release()
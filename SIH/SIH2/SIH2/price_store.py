@@ -0,0 +1,247 @@
+# price_store.py
+import hashlib
+import io
+import os
+import threading
+import pandas as pd
+from data_fetcher import (
+    SAMPLE_CSV_PATH,
+    concat_prices, detect_schema, fetch_live_from_api, generate_mock_data, normalize_prices,
+)
+from arbitrage import NetPriceRanker
+from market_index import build_market_index
+from price_history import PriceHistory
+from price_summary import PriceSummary
+from snapshot_cache import read_snapshot, write_snapshot
+from utils import PriceLookup
+
+# bytes just before the read offset that must stay unchanged for an append-only file
+TAIL_FINGERPRINT_BYTES = 256
+# rewrite the on-disk snapshot once unsnapshotted CSV bytes exceed this share of snapshotted ones
+SNAPSHOT_REWRITE_RATIO = 0.25
+
+class PriceStore:
+    """
+    Append-only, in-memory price store.
+
+    refresh() only parses what is new since the last call:
+      - CSV: the bytes appended after the last consumed offset
+      - live API: rows with a timestamp newer than the last ingested one
+    A CSV that was rewritten or truncated (different file, header or tail
+    bytes) is reloaded from scratch. Falls back to mock data like get_data().
+
+    Parsed CSV rows are also persisted as a columnar snapshot (see
+    snapshot_cache.py), so a cold start memory-maps the already-normalized
+    prefix and only parses bytes appended after it.
+    """
+
+    def __init__(self, csv_path=SAMPLE_CSV_PATH, live_api=None):
+        # live_api: one URL returning a JSON list of rows, or a list of
+        # fetch_planner source configs to fetch in parallel
+        self.csv_path = csv_path
+        self.live_api = live_api
+        self.version = 0
+        # bumped whenever rows are dropped; within one generation row positions only grow
+        self.generation = -1
+        self._lock = threading.RLock()
+        self._reset(None)
+
+    def _reset(self, source):
+        self.generation += 1
+        self.source = source
+        self._chunks = []
+        self._frame = concat_prices([])
+        self._header = None
+        self._columns = None
+        self._file_id = None
+        self._offset = 0
+        self._snap_offset = 0
+        self._tail = b""
+        self._open_row = False
+        self._last_ts = None
+        self._payload_hash = None
+        self._last_payload = None
+        # daily series and rolling stats per (market, crop), fed with every appended chunk
+        self.history = PriceHistory()
+
+    def __len__(self):
+        return len(self.frame())
+
+    def frame(self):
+        """All ingested rows as one DataFrame (shared, do not mutate)."""
+        with self._lock:
+            if self._chunks:
+                self._frame = concat_prices([self._frame] + self._chunks)
+                self._chunks = []
+            return self._frame
+
+    def fingerprint(self):
+        """
+        Identifies the ingested content independently of this process, so
+        validators (ETags) stay meaningful across restarts and workers.
+        """
+        with self._lock:
+            n_rows = len(self._frame) + sum(len(c) for c in self._chunks)
+            if self.source == "csv":
+                position = f"{os.path.abspath(self.csv_path)}:{self._file_id}:{self._offset}"
+            elif self.source == "api" and self._payload_hash is None:
+                position = f"{self.live_api}:{self._last_ts}"
+            else:
+                position = f"{self.live_api}:{self._payload_hash}"
+            return f"{self.source}|{position}|{n_rows}"
+
+    def _append(self, df):
+        if df is None or df.empty:
+            return 0
+        self._chunks.append(df)
+        self.history.add(df)
+        self.version += 1
+        return len(df)
+
+    def _append_payload(self, df):
+        """Append a full-state payload that has no offset or timestamp to identify it."""
+        self._payload_hash = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()
+        return self._append(df)
+
+    def refresh(self):
+        """Ingest new rows from the configured source. Returns the number of rows appended."""
+        with self._lock:
+            if self.live_api:
+                df_api = self._fetch_live()
+                if df_api is not None and not df_api.empty:
+                    return self._ingest_api(df_api)
+            if os.path.exists(self.csv_path):
+                added = self._ingest_csv()
+                if added is not None:
+                    return added
+            if self.source != "mock":
+                self._reset("mock")
+                self.version += 1
+                return self._append_payload(normalize_prices(generate_mock_data()))
+            return 0
+
+    def _fetch_live(self):
+        if isinstance(self.live_api, str):
+            return fetch_live_from_api(self.live_api)
+        # a list of source configs: fan out over them concurrently (see fetch_planner.py)
+        from fetch_planner import fetch_all
+        return fetch_all(self.live_api)
+
+    def _ingest_api(self, df_api):
+        if self.source == "api" and df_api is self._last_payload:
+            # 304 Not Modified: fetch_live_from_api handed back the frame we already ingested
+            return 0
+        if self.source != "api":
+            self._reset("api")
+        self._last_payload = df_api
+        df = normalize_prices(df_api)
+        ts = pd.to_datetime(df["timestamp"], errors="coerce", utc=True)
+        if ts.isna().all():
+            # no usable timestamps: the payload is the full current state
+            self._reset("api")
+            self._last_payload = df_api
+            self.version += 1
+            return self._append_payload(df)
+        if self._last_ts is not None:
+            newer = (ts > self._last_ts).to_numpy()
+            df, ts = df[newer].reset_index(drop=True), ts[newer]
+        if df.empty:
+            return 0
+        self._last_ts = ts.max()
+        return self._append(df)
+
+    def _ingest_csv(self):
+        """Append rows added to the CSV since the last call; None if the file is unusable."""
+        st = os.stat(self.csv_path)
+        file_id = (st.st_dev, st.st_ino)
+        with open(self.csv_path, "rb") as f:
+            header = f.readline()
+            resumed = 0
+            rewritten = (
+                self.source != "csv" or file_id != self._file_id or header != self._header
+                or st.st_size < self._offset
+            )
+            if not rewritten and self._tail:
+                f.seek(self._offset - len(self._tail))
+                rewritten = f.read(len(self._tail)) != self._tail
+            if not rewritten and self._open_row and st.st_size > self._offset:
+                # the last row had no newline; new bytes must start a new line, not extend it
+                rewritten = f.read(1) not in (b"\n", b"\r")
+            if rewritten:
+                columns = pd.read_csv(io.BytesIO(header)).columns.tolist()
+                if detect_schema(columns) is None:
+                    return None
+                self._reset("csv")
+                self.version += 1
+                self._header, self._columns, self._file_id = header, columns, file_id
+                self._offset = self._snap_offset = len(header)
+                resumed = self._resume_from_snapshot(f, st.st_size)
+            if st.st_size <= self._offset:
+                return resumed
+            f.seek(self._offset)
+            data = f.read(st.st_size - self._offset)
+        self._offset += len(data)
+        self._open_row = not data.endswith(b"\n")
+        self._tail = data[-TAIL_FINGERPRINT_BYTES:]
+        try:
+            df = pd.read_csv(io.BytesIO(data), header=None, names=self._columns)
+        except Exception as e:
+            print("Failed to parse CSV delta:", e)
+            return resumed
+        added = resumed + self._append(normalize_prices(df))
+        covered = self._snap_offset - len(self._header)
+        if self._offset - self._snap_offset > SNAPSHOT_REWRITE_RATIO * covered:
+            if write_snapshot(self.csv_path, self.frame(), self._offset, self._header, self._tail):
+                self._snap_offset = self._offset
+        return added
+
+    def _resume_from_snapshot(self, f, size):
+        """
+        Start from the persisted columnar snapshot if it is still a prefix of the file.
+        Returns the number of rows taken from it.
+        """
+        snap = read_snapshot(self.csv_path, f)
+        if snap is None:
+            return 0
+        df, offset, tail = snap
+        if not tail.endswith(b"\n") and size > offset:
+            # snapshot ended mid-row and the row may have been extended since
+            f.seek(offset)
+            if f.read(1) not in (b"\n", b"\r"):
+                return 0
+        self._offset = self._snap_offset = offset
+        self._tail = tail
+        self._open_row = not tail.endswith(b"\n")
+        return self._append(df)
+
+def build_lookup_snapshot(df, version=0, generation=0, fingerprint=""):
+    """
+    The part of a snapshot the /prices API serves from: the frame and its
+    crop/market row lookup, plus the version, cursor generation and fingerprint.
+    """
+    return {
+        "version": version,
+        "generation": generation,
+        "fingerprint": fingerprint,
+        "prices": df,
+        "lookup": PriceLookup(df),
+    }
+
+def build_snapshot(df, version=0, generation=0, fingerprint="", history=None):
+    """
+    Everything derived from one version of the price frame: the frame itself,
+    the spatial market index, the crop/market row lookup, the dashboard summary
+    tables, the price history (pass store.history.copy() to reuse the
+    incrementally maintained one) and the net-price ranker.
+    """
+    snap = build_lookup_snapshot(df, version, generation, fingerprint)
+    market_index = build_market_index(df)
+    summary = PriceSummary(df)
+    history = history if history is not None else PriceHistory(df)
+    snap.update({
+        "market_index": market_index,
+        "summary": summary,
+        "history": history,
+        "ranker": NetPriceRanker(market_index, summary, history),
+    })
+    return snap
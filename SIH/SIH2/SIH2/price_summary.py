@@ -0,0 +1,73 @@
+# price_summary.py
+import numpy as np
+import pandas as pd
+from utils import name_key
+
+GROUP_COLUMNS = ["crop", "market", "unit", "market_lat", "market_lon"]
+
+class PriceSummary:
+    """
+    Summary tables materialized once per price frame, so dashboard widgets
+    slice small tables instead of re-aggregating every price row:
+
+      groups       - price sum/count/min/max per (crop, market, unit, coordinates)
+      crop_stats   - per crop count/mean/min/quartiles/max (box plot data)
+      best         - the highest-price rows of every crop
+
+    Like PriceLookup, it is only valid for the frame it was built from.
+    """
+
+    def __init__(self, df_prices):
+        df = df_prices
+        g = df.groupby(GROUP_COLUMNS, observed=True, dropna=False, sort=False)["price"]
+        self.groups = pd.DataFrame({
+            "price_sum": g.sum(), "n": g.count(), "price_min": g.min(), "price_max": g.max(),
+        }).reset_index()
+        self.groups["crop_key"] = self.groups["crop"].map(name_key).astype(str)
+        self.groups["market_key"] = self.groups["market"].map(name_key).astype(str)
+
+        by_crop = df.groupby("crop", observed=True)["price"]
+        quartiles = by_crop.quantile([0.25, 0.5, 0.75]).unstack().reindex(columns=[0.25, 0.5, 0.75])
+        self.crop_stats = pd.DataFrame({
+            "n": by_crop.count(), "mean": by_crop.mean(), "min": by_crop.min(),
+            "q1": quartiles[0.25], "median": quartiles[0.5], "q3": quartiles[0.75], "max": by_crop.max(),
+        })
+        self.crop_stats.index = self.crop_stats.index.astype(str)
+        self._crop_names = {name_key(c): c for c in self.crop_stats.index}
+
+        crop_max = df.groupby("crop", observed=True)["price"].transform("max")
+        best = df[df["price"].to_numpy() == crop_max.to_numpy()]
+        best = best.assign(crop_key=best["crop"].map(name_key).astype(str).to_numpy())
+        self._best = {k: rows.drop(columns="crop_key").sort_values("market")
+                      for k, rows in best.groupby("crop_key", sort=False)}
+
+    def _groups(self, crop=None, markets=None):
+        rows = self.groups
+        if crop:
+            rows = rows[rows["crop_key"].to_numpy() == name_key(crop)]
+        if markets:
+            rows = rows[rows["market_key"].isin([name_key(m) for m in markets]).to_numpy()]
+        return rows
+
+    def best(self, crop):
+        """Highest-price row(s) for crop, like utils.best_price_for_crop; None if no rows."""
+        return self._best.get(name_key(crop))
+
+    def crop_averages(self, markets=None):
+        """Average price per crop over all rows (or only rows of markets), highest first."""
+        rows = self._groups(markets=markets)
+        g = rows.groupby("crop", observed=True)[["price_sum", "n"]].sum()
+        out = (g["price_sum"] / g["n"]).rename("price").reset_index()
+        return out.sort_values("price", ascending=False)
+
+    def crop_distribution(self, crop):
+        """count/mean/min/q1/median/q3/max of crop's prices, or None."""
+        key = self._crop_names.get(name_key(crop))
+        return None if key is None else self.crop_stats.loc[key]
+
+    def map_points(self, crop=None, markets=None):
+        """Mean price per (market, unit, coordinates), for markets with coordinates."""
+        rows = self._groups(crop, markets).dropna(subset=["market_lat", "market_lon"])
+        g = rows.groupby(["market", "unit", "market_lat", "market_lon"], observed=True, sort=False)[["price_sum", "n"]].sum()
+        out = (g["price_sum"] / g["n"]).rename("price").reset_index()
+        return out[np.isfinite(out["price"].to_numpy())]
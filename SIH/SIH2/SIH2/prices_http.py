@@ -0,0 +1,110 @@
+# prices_http.py
+import gzip
+import json
+from price_service import CursorError, EXPORT_FORMATS, MAX_PAGE_SIZE, available_formats
+
+# Framework-neutral /prices contract, shared by the Flask app (api.py)
+# and the ASGI app (asgi_api.py).
+
+ACCEPT_FORMATS = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "text/csv": "csv",
+}
+
+def parse_accept(header):
+    """Accept header -> best format name; plain JSON wins ties and wildcards."""
+    best, best_q = "json", -1.0
+    for rank, item in enumerate((header or "").split(",")):
+        parts = [p.strip() for p in item.split(";")]
+        q = 1.0
+        for p in parts[1:]:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        fmt = ACCEPT_FORMATS.get(parts[0].lower())
+        if fmt and q > best_q and q > 0:
+            best, best_q = fmt, q
+        elif parts[0] in ("*/*", "application/*") and q > best_q:
+            best, best_q = "json", q
+    return best
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or f'"{etag}"' in tags or f'W/"{etag}"' in tags
+
+def _error(status, message, **extra):
+    body = json.dumps({"error": message, **extra}).encode("utf-8")
+    return status, {"Content-Type": "application/json"}, body
+
+def handle_prices(service, args, headers):
+    """
+    /prices for a PriceService. args: query parameters (str -> str),
+    headers: request headers with lower-case names. Returns
+    (status, response headers, body) where body is bytes or an iterator of bytes.
+    """
+    crop = args.get("crop")
+    market = args.get("market")
+    cursor = args.get("cursor")
+    limit = args.get("limit")
+    try:
+        if limit is not None:
+            limit = int(limit)
+            if not 1 <= limit <= MAX_PAGE_SIZE:
+                raise ValueError
+    except ValueError:
+        return _error(400, f"limit must be an integer between 1 and {MAX_PAGE_SIZE}")
+
+    fmt = args.get("format") or parse_accept(headers.get("accept"))
+    # request headers that chose this representation, for shared caches
+    vary = [] if args.get("format") else ["Accept"]
+    if fmt == "csv":
+        vary.append("Accept-Encoding")
+    if fmt != "ndjson" and fmt not in available_formats():
+        status = 406 if fmt in EXPORT_FORMATS else 400
+        status, out, body = _error(status, f"format {fmt!r} is not available", formats=["ndjson"] + available_formats())
+        if vary:
+            out["Vary"] = ", ".join(vary)
+        return status, out, body
+    if fmt not in ("json", "ndjson") and (limit is not None or cursor):
+        return _error(400, "limit/cursor are only supported for json and ndjson")
+
+    gzip_csv = fmt == "csv" and "gzip" in (headers.get("accept-encoding") or "")
+    etag = service.etag(fmt, crop, market, limit, cursor)
+    if gzip_csv:
+        # gzip and identity bodies differ byte for byte, so they need different strong validators
+        etag += "-gzip"
+    out = {"ETag": f'"{etag}"'}
+    if vary:
+        out["Vary"] = ", ".join(vary)
+    if etag_matches(headers.get("if-none-match"), etag):
+        return 304, out, b""
+
+    try:
+        if fmt == "ndjson":
+            body, next_cursor = service.ndjson_chunks(crop=crop, market=market, limit=limit, cursor=cursor)
+            out["Content-Type"] = "application/x-ndjson"
+            if next_cursor:
+                out["X-Next-Cursor"] = next_cursor
+        elif limit is not None or cursor:
+            body = service.page(crop=crop, market=market, limit=limit or 100, cursor=cursor)
+            out["Content-Type"] = "application/json"
+        else:
+            body = service.export(fmt, crop=crop, market=market)
+            out["Content-Type"] = EXPORT_FORMATS[fmt][0]
+            if fmt == "csv":
+                # the cached body is gzip; hand it over as-is when the client accepts that
+                if gzip_csv:
+                    out["Content-Encoding"] = "gzip"
+                else:
+                    body = gzip.decompress(body)
+    except CursorError as e:
+        return _error(400, str(e))
+    return 200, out, body
@@ -0,0 +1,101 @@
+# snapshot_cache.py
+import json
+import os
+
+try:
+    import pyarrow as pa
+except ImportError:  # snapshots are an optimization; without pyarrow we just parse the CSV
+    pa = None
+
+SNAPSHOT_DIR_NAME = ".snapshots"
+META_KEY = b"kerala_mandi_snapshot"
+
+def snapshot_path(csv_path):
+    """<csv dir>/.snapshots/<csv name>.arrow"""
+    folder = os.path.join(os.path.dirname(os.path.abspath(csv_path)), SNAPSHOT_DIR_NAME)
+    return os.path.join(folder, os.path.basename(csv_path) + ".arrow")
+
+def write_table(path, df, meta):
+    """
+    Atomically write df plus a JSON-able meta dict as an uncompressed Arrow IPC
+    file (uncompressed so readers can memory-map it). Returns True on success.
+    """
+    if pa is None:
+        return False
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), META_KEY: json.dumps(meta).encode()})
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+        return True
+    except Exception as e:
+        print("Failed to write price snapshot:", e)
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return False
+
+def read_table(path, split_blocks=False):
+    """
+    Memory-map an Arrow file written by write_table. Returns (df, meta).
+    With split_blocks=True, numeric columns without nulls stay zero-copy
+    views of the mapped file instead of being consolidated into new blocks.
+    """
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    meta = json.loads(table.schema.metadata[META_KEY])
+    return table.to_pandas(split_blocks=split_blocks), meta
+
+def read_meta(path):
+    """Only the meta dict of an Arrow file written by write_table (no column data is read)."""
+    with pa.memory_map(path, "r") as source:
+        return json.loads(pa.ipc.open_file(source).schema.metadata[META_KEY])
+
+def write_snapshot(csv_path, df, offset, header, tail):
+    """
+    Persist normalized rows parsed from csv_path[:offset] as an uncompressed
+    Arrow IPC file, so later loads can memory-map it instead of parsing CSV.
+    Returns True on success.
+    """
+    if pa is None:
+        return False
+    st = os.stat(csv_path)
+    meta = {
+        "offset": int(offset),
+        "header": header.hex(),
+        "tail": tail.hex(),
+        "file_id": [st.st_dev, st.st_ino],
+    }
+    return write_table(snapshot_path(csv_path), df, meta)
+
+def read_snapshot(csv_path, f):
+    """
+    Memory-map the snapshot for csv_path if it is still a valid prefix of the
+    open CSV file f (same file, header and bytes just before the offset).
+    Returns (df, offset, tail) or None.
+    """
+    if pa is None:
+        return None
+    path = snapshot_path(csv_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        df, meta = read_table(path)
+        header, tail, offset = bytes.fromhex(meta["header"]), bytes.fromhex(meta["tail"]), meta["offset"]
+        st = os.fstat(f.fileno())
+        if [st.st_dev, st.st_ino] != meta["file_id"] or st.st_size < offset:
+            return None
+        f.seek(0)
+        if f.readline() != header:
+            return None
+        f.seek(offset - len(tail))
+        if f.read(len(tail)) != tail:
+            return None
+        return df, offset, tail
+    except Exception as e:
+        print("Ignoring unreadable price snapshot:", e)
+        return None
@@ -0,0 +1,93 @@
+# test_arbitrage.py
+import pickle
+import numpy as np
+import pandas as pd
+from arbitrage import NetPriceRanker, transport_cost
+from data_fetcher import generate_mock_data, normalize_prices
+from market_index import MarketIndex
+from price_history import PriceHistory
+from price_store import build_snapshot
+from price_summary import PriceSummary
+from utils import haversine_np
+
+def prices(rows):
+    return normalize_prices(pd.DataFrame(
+        rows, columns=["market", "market_lat", "market_lon", "crop", "unit", "price", "timestamp"]
+    ))
+
+def make_ranker(df, history=True):
+    return NetPriceRanker(MarketIndex(df), PriceSummary(df), PriceHistory(df) if history else None)
+
+def test_rank_matches_brute_force():
+    df = normalize_prices(generate_mock_data(n_markets=60, n_crops=3, days=1))
+    ranker = make_ranker(df)
+    crop = df["crop"].iloc[0]
+    lat, lon = 10.0, 76.3
+    ranked = ranker.rank(crop, lat, lon, k=5, per_km=0.5)
+
+    # brute force from the user's cell centre, which is where the ranker measures from
+    clat, clon = (np.floor(lat / 0.01) + 0.5) * 0.01, (np.floor(lon / 0.01) + 0.5) * 0.01
+    rows = df[df["crop"] == crop]
+    mean = rows.groupby("market", observed=True).agg(price=("price", "mean"), lat=("market_lat", "first"),
+                                                     lon=("market_lon", "first"))
+    dist = haversine_np(clat, clon, mean["lat"].to_numpy(dtype=float), mean["lon"].to_numpy(dtype=float))
+    net = mean["price"].to_numpy() - transport_cost(dist, per_km=0.5)
+    expected = mean.index.astype(str).to_numpy()[np.argsort(-net, kind="stable")[:5]]
+    assert list(ranked["market"]) == list(expected)
+    np.testing.assert_allclose(ranked["net_price"], np.sort(net)[::-1][:5], rtol=1e-5)
+    assert ranked["net_price"].is_monotonic_decreasing
+
+def test_max_km_and_unknown_crop():
+    df = normalize_prices(generate_mock_data(n_markets=40, n_crops=2, days=1))
+    ranker = make_ranker(df)
+    crop = df["crop"].iloc[0]
+    ranked = ranker.rank(crop, 10.0, 76.3, k=50, max_km=40)
+    assert (ranked["distance_km"] <= 40).all()
+    assert ranker.rank("no such crop", 10.0, 76.3).empty
+    assert ranker.rank(crop, 10.0, 76.3, k=0).empty
+
+def test_units_are_ranked_separately():
+    df = prices([
+        ("Kochi Market", 9.9312, 76.2673, "Banana", "kg", 40.0, "2025-09-22"),
+        ("Kochi Market", 9.9312, 76.2673, "Banana", "dozen", 60.0, "2025-09-22"),
+        ("Thrissur Market", 10.5276, 76.2144, "Banana", "kg", 45.0, "2025-09-22"),
+    ])
+    for history in (True, False):
+        ranker = make_ranker(df, history=history)
+        # two markets quote by the kg, one by the dozen
+        assert ranker.units("banana") == ["kg", "dozen"]
+        by_kg = ranker.rank("Banana", 9.93, 76.27, k=5, per_km=0.0)
+        assert list(by_kg["market"]) == ["Thrissur Market", "Kochi Market"]
+        assert list(by_kg["price"]) == [45.0, 40.0]
+        assert set(by_kg["unit"]) == {"kg"}
+        by_dozen = ranker.rank("Banana", 9.93, 76.27, k=5, per_km=0.0, unit="dozen")
+        assert list(by_dozen["market"]) == ["Kochi Market"] and list(by_dozen["price"]) == [60.0]
+        assert ranker.rank("Banana", 9.93, 76.27, unit="bunch").empty
+
+def test_latest_day_price_used_for_single_unit_pairs():
+    df = prices([
+        ("Kochi Market", 9.9312, 76.2673, "Banana", "kg", 30.0, "2025-09-20"),
+        ("Kochi Market", 9.9312, 76.2673, "Banana", "kg", 40.0, "2025-09-22"),
+    ])
+    assert list(make_ranker(df).rank("Banana", 9.93, 76.27)["price"]) == [40.0]
+    assert list(make_ranker(df, history=False).rank("Banana", 9.93, 76.27)["price"]) == [35.0]
+
+def test_cell_cache_is_reused():
+    df = normalize_prices(generate_mock_data(n_markets=30, n_crops=2, days=1))
+    ranker = make_ranker(df)
+    crop = df["crop"].iloc[0]
+    first = ranker.rank(crop, 10.001, 76.301)
+    # same ~1 km cell: distances come from the cache
+    second = ranker.rank(crop, 10.004, 76.306)
+    pd.testing.assert_frame_equal(first, second)
+    assert ranker.stats == {"cell_hits": 1, "cell_misses": 1}
+
+def test_snapshot_pickles():
+    df = normalize_prices(generate_mock_data(n_markets=20, n_crops=3, days=2))
+    snap = build_snapshot(df)
+    crop = df["crop"].iloc[0]
+    before = snap["ranker"].rank(crop, 10.0, 76.3)
+    copy = pickle.loads(pickle.dumps(snap))
+    # a copy starts with an empty cell cache but ranks the same
+    assert copy["ranker"].stats == {"cell_hits": 0, "cell_misses": 0}
+    pd.testing.assert_frame_equal(copy["ranker"].rank(crop, 10.0, 76.3), before)
@@ -0,0 +1,134 @@
+# test_data_fetcher.py
+import json
+import threading
+import pandas as pd
+import data_fetcher
+import price_store
+from data_fetcher import KERALA_MARKETS, MOCK_END_DATE, fetch_live_from_api, generate_mock_data, normalize_prices
+from price_store import PriceStore
+
+ROWS = [{"market": "Kochi Market", "crop": "Tomato", "unit": "kg", "price": 30.0}]
+
+class FakeResponse:
+    def __init__(self, status, rows=None, headers=None):
+        self.status_code = status
+        self.content = json.dumps(rows).encode() if rows is not None else b""
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+    def json(self):
+        return json.loads(self.content)
+
+class FakeSession:
+    """Serves ROWS with an ETag and answers 304 whenever any If-None-Match is sent."""
+
+    def __init__(self):
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        with self.lock:
+            self.requests.append(dict(headers or {}))
+        if "If-None-Match" in (headers or {}):
+            return FakeResponse(304)
+        return FakeResponse(200, ROWS, {"ETag": f'"{url}"'})
+
+def use_fake_session(monkeypatch, size=None):
+    session = FakeSession()
+    monkeypatch.setattr(data_fetcher, "_session", session)
+    monkeypatch.setattr(data_fetcher, "_validators", data_fetcher.OrderedDict())
+    if size is not None:
+        monkeypatch.setattr(data_fetcher, "VALIDATOR_CACHE_SIZE", size)
+    return session
+
+def test_304_reuses_cached_frame(monkeypatch):
+    session = use_fake_session(monkeypatch)
+    first = fetch_live_from_api("http://api/prices")
+    assert fetch_live_from_api("http://api/prices") is first
+    assert session.requests[1]["If-None-Match"] == '"http://api/prices"'
+
+def test_304_without_cached_entry_retries_unconditionally(monkeypatch):
+    session = use_fake_session(monkeypatch)
+    # the caller's own validator gets a 304 we have no body for
+    df = fetch_live_from_api("http://api/prices", headers={"If-None-Match": '"stale"'})
+    assert df is not None and list(df["crop"]) == ["Tomato"]
+    assert len(session.requests) == 2 and "If-None-Match" not in session.requests[1]
+
+def test_validator_cache_is_bounded_lru(monkeypatch):
+    use_fake_session(monkeypatch, size=3)
+    for i in range(5):
+        fetch_live_from_api(f"http://api/{i}")
+    fetch_live_from_api("http://api/2")  # touch: now most recent
+    fetch_live_from_api("http://api/5")
+    assert [key[0] for key in data_fetcher._validators] == ["http://api/4", "http://api/2", "http://api/5"]
+
+def test_concurrent_fetches(monkeypatch):
+    use_fake_session(monkeypatch, size=8)
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(50):
+                assert fetch_live_from_api(f"http://api/{(n + i) % 12}") is not None
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors and len(data_fetcher._validators) <= 8
+
+def agmarknet_records(*days):
+    """data.gov.in style records, arrival_date written dd/mm/yyyy."""
+    return pd.DataFrame([
+        {"market": "Kochi Market", "commodity": "Tomato", "modal_price": 2000 + i, "arrival_date": day}
+        for i, day in enumerate(days)
+    ])
+
+def test_agmarknet_dates_are_day_first():
+    # one day above 12 (unambiguous) and one at or below 12 (would read as 9 May month-first)
+    df = normalize_prices(agmarknet_records("25/09/2025", "05/09/2025"))
+    assert list(df["timestamp"]) == ["2025-09-25", "2025-09-05"]
+    assert list(df["unit"]) == ["quintal", "quintal"]
+
+def test_store_ingests_agmarknet_days_in_order(monkeypatch):
+    payloads = [agmarknet_records("25/08/2025", "05/09/2025"), agmarknet_records("05/09/2025", "08/09/2025")]
+    monkeypatch.setattr(price_store, "fetch_live_from_api", lambda url: payloads.pop(0))
+    store = PriceStore(csv_path="missing.csv", live_api="http://api/agmarknet")
+    assert store.refresh() == 2
+    # only 8 September is newer than the 5 September already ingested
+    assert store.refresh() == 1
+    assert list(store.frame()["timestamp"]) == ["2025-08-25", "2025-09-05", "2025-09-08"]
+    dates = store.history.trend("Tomato", "Kochi Market").index
+    assert list(dates.strftime("%Y-%m-%d")) == ["2025-08-25", "2025-09-05", "2025-09-08"]
+
+def test_mock_data_is_deterministic_per_seed():
+    a = generate_mock_data(n_markets=30, n_crops=10, days=5, seed=7)
+    pd.testing.assert_frame_equal(a, generate_mock_data(n_markets=30, n_crops=10, days=5, seed=7))
+    assert not a["price"].equals(generate_mock_data(n_markets=30, n_crops=10, days=5, seed=8)["price"])
+    # the default frame no longer depends on the clock
+    assert set(generate_mock_data()["timestamp"]) == {MOCK_END_DATE}
+
+def test_mock_data_shape_and_history():
+    df = generate_mock_data(n_markets=12, n_crops=9, days=4)
+    assert len(df) == 12 * 9 * 4
+    assert list(df["market"].cat.categories[:len(KERALA_MARKETS)]) == [m[0] for m in KERALA_MARKETS]
+    assert df["timestamp"].iloc[0] == "2025-09-19" and df["timestamp"].iloc[-1] == MOCK_END_DATE
+    assert (df.groupby(["market", "crop"], observed=True).size() == 4).all()
+    # every row of a market carries the same coordinates
+    assert (df.groupby("market", observed=True)["market_lat"].nunique() == 1).all()
+    # the last day keeps each pair's base level, so one day of history matches days=1
+    last = df[df["timestamp"] == MOCK_END_DATE].reset_index(drop=True)
+    one_day = generate_mock_data(n_markets=12, n_crops=9, days=1)
+    pd.testing.assert_frame_equal(last, one_day)
+    assert (df["price"] > 0).all()
+
+def test_mock_data_copies_do_not_share_the_cache():
+    df = generate_mock_data(days=2)
+    df.loc[0, "price"] = -1.0
+    assert generate_mock_data(days=2).loc[0, "price"] != -1.0
@@ -0,0 +1,108 @@
+# test_fetch_planner.py
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import pytest
+from fetch_planner import RateLimiter, fetch_all, plan_requests
+
+# records per district, in data.gov.in Agmarknet layout
+DISTRICT_ROWS = {"Ernakulam": 7, "Kollam": 3, "Thrissur": 0}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """/records?district=..&offset=..&limit=.. pages; /pages?district=..&page=N (5 rows a page); 'Broken' fails."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(url.query).items()}
+        self.server.requests.append((url.path, q))
+        district = q.get("district", "")
+        if district == "Broken":
+            # not a retried status, so the failure surfaces at once
+            self.send_response(404)
+            self.end_headers()
+            return
+        rows = [
+            {"market": f"{district} Market", "commodity": q.get("commodity", "Rice"), "modal_price": 2000 + i,
+             "arrival_date": "05/09/2025"}
+            for i in range(DISTRICT_ROWS.get(district, 0))
+        ]
+        if url.path == "/records":
+            start = int(q.get("offset", 0))
+            body = {"records": rows[start:start + int(q.get("limit", len(rows) or 1))]}
+        else:
+            page = int(q["page"])
+            body = rows[(page - 1) * 5:page * 5]
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+def test_plan_covers_every_partition_combination():
+    sources = [
+        {"url": "a", "partitions": {"district": ["Ernakulam", "Kollam"], "commodity": ["Rice", "Banana"]}},
+        {"url": "b"},
+    ]
+    tasks = plan_requests(sources)
+    assert [(s["url"], p) for s, p in tasks] == [
+        ("a", {"district": "Ernakulam", "commodity": "Rice"}),
+        ("a", {"district": "Ernakulam", "commodity": "Banana"}),
+        ("a", {"district": "Kollam", "commodity": "Rice"}),
+        ("a", {"district": "Kollam", "commodity": "Banana"}),
+        ("b", {}),
+    ]
+
+def test_offset_pages_are_merged_in_plan_order(stub_server):
+    source = {
+        "name": "agmarknet", "url": base_url(stub_server) + "/records",
+        "partitions": {"district": ["Ernakulam", "Broken", "Kollam", "Thrissur"]},
+        "page_param": "offset", "page_size_param": "limit", "page_size": 3,
+    }
+    df = fetch_all([source], max_workers=4)
+    # Broken fails and is skipped; Thrissur is empty
+    assert list(df["market"]) == ["Ernakulam Market"] * 7 + ["Kollam Market"] * 3
+    assert list(df["price"]) == [2000 + i for i in range(7)] + [2000, 2001, 2002]
+    assert set(df["timestamp"]) == {"2025-09-05"} and set(df["unit"]) == {"quintal"}
+    offsets = sorted(int(q["offset"]) for path, q in stub_server.requests if q["district"] == "Ernakulam")
+    # 3 + 3 + 1 rows: the short third page ends the partition
+    assert offsets == [0, 3, 6]
+
+def test_page_numbers_and_list_payloads(stub_server):
+    source = {
+        "url": base_url(stub_server) + "/pages", "partitions": {"district": ["Ernakulam"]},
+        "page_param": "page", "page_mode": "page",
+    }
+    df = fetch_all([source])
+    assert len(df) == 7
+    # without a page size, paging stops at the first empty page
+    assert [int(q["page"]) for _, q in stub_server.requests] == [1, 2, 3]
+
+def test_rate_limiter_allows_burst_then_rate():
+    limiter = RateLimiter(rate=50, burst=3)
+    t0 = time.monotonic()
+    for _ in range(3):
+        limiter.acquire()
+    assert time.monotonic() - t0 < 0.05
+    for _ in range(5):
+        limiter.acquire()
+    # five more tokens at 50 per second
+    assert time.monotonic() - t0 >= 0.09
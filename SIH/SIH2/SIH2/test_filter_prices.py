@@ -0,0 +1,43 @@
+# test_filter_prices.py
+import numpy as np
+import pandas as pd
+from data_fetcher import generate_mock_data
+from utils import PriceLookup, filter_prices, name_key
+
+def naive_filter(df, crop=None, market=None):
+    mask = np.ones(len(df), dtype=bool)
+    if crop:
+        mask &= df["crop"].astype(str).map(name_key).to_numpy() == name_key(crop)
+    if market:
+        wanted = {name_key(m) for m in ([market] if isinstance(market, str) else market)}
+        mask &= df["market"].astype(str).map(name_key).isin(wanted).to_numpy()
+    return df[mask]
+
+def check(df, crop=None, market=None):
+    expected = naive_filter(df, crop, market)
+    lookup = PriceLookup(df)
+    for got in (filter_prices(df, crop, market), filter_prices(df, crop, market, lookup=lookup)):
+        pd.testing.assert_frame_equal(got, expected)
+
+def test_filter_matches_naive_scan():
+    df = generate_mock_data(n_markets=20, n_crops=5, days=3)
+    crop, market = str(df["crop"].iloc[0]), str(df["market"].iloc[0])
+    other = str(df["market"].iloc[-1])
+    check(df)
+    check(df, crop=crop)
+    check(df, crop=crop.upper())
+    check(df, market=f"  {market.lower()} ")
+    check(df, crop=crop, market=market)
+    check(df, crop=crop, market=[market, other])
+    check(df, crop="No such crop")
+    check(df, crop=crop, market=["No such market"])
+
+def test_duplicate_market_names_select_rows_once():
+    df = generate_mock_data(n_markets=10, n_crops=4, days=2)
+    crop, market = str(df["crop"].iloc[0]), str(df["market"].iloc[0])
+    # the same market twice and in another spelling
+    markets = [market, market, market.upper()]
+    check(df, market=markets)
+    check(df, crop=crop, market=markets)
+    rows = PriceLookup(df).rows(crop=crop, market=markets)
+    assert len(rows) == len(np.unique(rows))
@@ -0,0 +1,44 @@
+# test_find_nearest_markets.py
+import numpy as np
+import pandas as pd
+from bench_nearest import find_nearest_markets_apply
+from data_fetcher import generate_mock_data
+from utils import find_nearest_markets
+
+def users(n=40, seed=5):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(8.0, 13.0, n), rng.uniform(74.5, 77.5, n)
+
+def assert_same_nearest(got, expected):
+    assert list(got["market"].astype(str)) == list(expected["market"].astype(str))
+    np.testing.assert_allclose(got["distance_km"].to_numpy(), expected["distance_km"].to_numpy(dtype=float))
+    np.testing.assert_allclose(got["market_lat"].to_numpy(dtype=float), expected["market_lat"].to_numpy(dtype=float))
+
+def test_matches_row_wise_apply():
+    # several days per market: the old path measured every price row, then deduped
+    df = generate_mock_data(n_markets=80, n_crops=3, days=3)
+    for lat, lon in zip(*users()):
+        for top_n in (1, 5, 200):
+            assert_same_nearest(find_nearest_markets(df, lat, lon, top_n=top_n),
+                                find_nearest_markets_apply(df, lat, lon, top_n=top_n))
+
+def test_batch_matches_single_calls():
+    df = generate_mock_data(n_markets=50, n_crops=2)
+    lats, lons = users(n=25)
+    batch = find_nearest_markets(df, lats, lons, top_n=7)
+    assert len(batch) == 25
+    for got, lat, lon in zip(batch, lats, lons):
+        pd.testing.assert_frame_equal(got, find_nearest_markets(df, lat, lon, top_n=7))
+        assert_same_nearest(got, find_nearest_markets_apply(df, lat, lon, top_n=7))
+
+def test_markets_without_coordinates():
+    df = pd.DataFrame({
+        "market": ["A", "A", "B", "C"],
+        "market_lat": [10.0, 10.0, np.nan, 10.2],
+        "market_lon": [76.0, 76.0, np.nan, 76.2],
+    })
+    # B has no coordinates and A appears once despite two rows
+    assert list(find_nearest_markets(df, 10.21, 76.21)["market"]) == ["C", "A"]
+    empty = df.assign(market_lat=np.nan, market_lon=np.nan)
+    assert find_nearest_markets(empty, 10.0, 76.0).empty
+    assert [r.empty for r in find_nearest_markets(empty, [10.0, 11.0], [76.0, 76.5])] == [True, True]
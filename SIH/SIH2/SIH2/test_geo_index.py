@@ -0,0 +1,34 @@
+# test_geo_index.py
+import json
+from geo_index import build_geo_index, locate
+
+def square(lat0, lon0, size):
+    return [[lon0, lat0], [lon0 + size, lat0], [lon0 + size, lat0 + size], [lon0, lat0 + size], [lon0, lat0]]
+
+def write_layer(path, features):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "features": features}, f)
+
+def test_boundary_file_gives_exact_districts(tmp_path):
+    layer = tmp_path / "districts.geojson"
+    write_layer(layer, [
+        # Ernakulam with a hole, Idukki as a two-part multipolygon that includes the hole
+        {"properties": {"DISTRICT": "ERNAKULAM"},
+         "geometry": {"type": "Polygon", "coordinates": [square(9.8, 76.1, 0.4), square(9.95, 76.25, 0.1)]}},
+        {"properties": {"DISTRICT": "IDUKKI"},
+         "geometry": {"type": "MultiPolygon", "coordinates": [[square(9.8, 76.5, 0.4)], [square(9.95, 76.25, 0.1)]]}},
+    ])
+    out = str(tmp_path / "admin.npz")
+    assert build_geo_index([(str(layer), "DISTRICT", "district")], out) == 2
+
+    assert locate(9.85, 76.15, path=out) == {"district": "Ernakulam", "exact": True}
+    assert locate(10.0, 76.3, path=out) == {"district": "Idukki", "exact": True}
+    assert locate(9.9, 76.7, path=out) == {"district": "Idukki", "exact": True}
+    # with a boundary file, a point in no polygon is unknown (no nearest-HQ guess)
+    assert locate(11.5, 75.5, path=out) is None
+
+def test_without_boundary_file_falls_back_to_nearest_headquarters(tmp_path):
+    missing = str(tmp_path / "missing.npz")
+    assert locate(9.98, 76.30, path=missing) == {"district": "Ernakulam", "exact": False}
+    assert locate(11.26, 75.79, path=missing) == {"district": "Kozhikode", "exact": False}
+    assert locate(28.6, 77.2, path=missing) is None
@@ -0,0 +1,69 @@
+# test_ip_geo.py
+import functools
+import numpy as np
+import pytest
+import utils
+from ip_geo import IpGeoTable, build_ip_table, client_ip, ip_to_int, lookup_ip
+
+# DB-IP Lite style rows (dotted bounds, city columns between) plus an IPv6 row to skip
+RANGES_CSV = """\
+ip_start,ip_end,continent,country,region,city,latitude,longitude
+1.0.0.0,1.0.0.255,AS,IN,Kerala,Kochi,9.9312,76.2673
+8.8.8.0,8.8.8.255,NA,US,California,Mountain View,37.386,-122.0838
+2001:db8::,2001:db8::ffff,AS,IN,Kerala,Kochi,9.9,76.2
+1.0.1.0,1.0.3.255,AS,IN,Kerala,Thrissur,10.5276,76.2144
+"""
+
+def make_table(tmp_path, text=RANGES_CSV):
+    csv_path = tmp_path / "ranges.csv"
+    csv_path.write_text(text)
+    out = str(tmp_path / "ip_ranges.npy")
+    return build_ip_table(str(csv_path), out), out
+
+def test_build_sorts_ranges_and_skips_ipv6(tmp_path):
+    n, path = make_table(tmp_path)
+    assert n == 3
+    table = IpGeoTable(path)
+    assert list(table.starts) == sorted(table.starts)
+
+def test_lookup_range_bounds(tmp_path):
+    _, path = make_table(tmp_path)
+    table = IpGeoTable(path)
+    assert table.lookup("1.0.0.0") == pytest.approx((9.9312, 76.2673), abs=1e-4)
+    assert table.lookup("1.0.0.255") == pytest.approx((9.9312, 76.2673), abs=1e-4)
+    assert table.lookup("1.0.2.17") == pytest.approx((10.5276, 76.2144), abs=1e-4)
+    assert table.lookup(ip_to_int("1.0.3.255")) == pytest.approx((10.5276, 76.2144), abs=1e-4)
+    # gaps, before the first range and after the last
+    for ip in ("1.0.4.0", "0.255.255.255", "8.8.9.0", "255.255.255.255", "not an ip", "2001:db8::1"):
+        assert table.lookup(ip) is None
+
+def test_integer_bounds_without_header(tmp_path):
+    n, path = make_table(tmp_path, "16777216,16777471,9.9312,76.2673\n134744064,134744319,37.386,-122.0838\n")
+    assert n == 2
+    assert IpGeoTable(path).lookup("8.8.8.8") == pytest.approx((37.386, -122.0838), abs=1e-4)
+
+def test_lookup_ip_skips_private_addresses(tmp_path):
+    _, path = make_table(tmp_path)
+    assert lookup_ip("8.8.8.8", path) == pytest.approx((37.386, -122.0838), abs=1e-4)
+    for ip in ("10.1.2.3", "192.168.0.5", "127.0.0.1", ""):
+        assert lookup_ip(ip, path) is None
+
+def test_client_ip_from_proxy_headers():
+    assert client_ip({"X-Forwarded-For": "8.8.8.8, 10.0.0.1"}) == "8.8.8.8"
+    assert client_ip({"x-real-ip": "1.0.0.7"}) == "1.0.0.7"
+    assert client_ip({"Host": "localhost"}) is None and client_ip(None) is None
+
+def test_user_location_is_offline_with_a_table(tmp_path, monkeypatch):
+    _, path = make_table(tmp_path)
+    table = IpGeoTable(path)
+    monkeypatch.setattr(utils, "get_ip_table", lambda: table)
+    monkeypatch.setattr(utils, "lookup_ip", functools.partial(lookup_ip, path=path))
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("ipinfo.io must not be called when a range table exists")
+
+    monkeypatch.setattr(utils.requests, "get", no_network)
+    loc = utils.get_user_location_by_ip(headers={"X-Forwarded-For": "1.0.0.9"})
+    assert np.allclose(loc, (9.9312, 76.2673), atol=1e-4)
+    # no client address: no guess from the server's own IP
+    assert utils.get_user_location_by_ip(headers={}) is None
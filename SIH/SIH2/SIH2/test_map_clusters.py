@@ -0,0 +1,43 @@
+# test_map_clusters.py
+import numpy as np
+import pandas as pd
+from data_fetcher import normalize_prices
+from map_clusters import MAX_ZOOM, MIN_ZOOM, MapClusters
+from price_summary import PriceSummary
+
+def prices(rows):
+    return normalize_prices(pd.DataFrame(
+        rows, columns=["market", "market_lat", "market_lon", "crop", "unit", "price", "timestamp"]
+    ))
+
+# two markets about 150 m apart (one cell at every precomputed zoom),
+# one selling by the kg, the other by the kg and by the dozen
+TWO_UNITS = prices([
+    ("Kochi Market", 9.9000, 76.2600, "Banana", "kg", 40.0, "2025-09-22"),
+    ("Kochi Market", 9.9000, 76.2600, "Banana", "dozen", 60.0, "2025-09-22"),
+    ("Ernakulam Market", 9.9010, 76.2610, "Banana", "kg", 44.0, "2025-09-22"),
+    ("Ernakulam Market", 9.9010, 76.2610, "Banana", "kg", 46.0, "2025-09-21"),
+])
+
+def test_units_are_never_averaged_together():
+    clusters = MapClusters(PriceSummary(TWO_UNITS))
+    for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+        for crop in (None, "banana"):
+            levels = clusters.clusters(crop, zoom).set_index("unit")
+            assert sorted(levels.index) == ["dozen", "kg"]
+            assert levels.loc["dozen", "price"] == 60.0
+            # kg mean over all kg rows of both markets, never mixed with the dozen price
+            assert np.isclose(levels.loc["kg", "price"], (40.0 + 44.0 + 46.0) / 3)
+            assert levels.loc["kg", "market"] == "2 markets"
+            assert levels.loc["dozen", "market"] == "Kochi Market"
+
+def test_markets_split_when_zoomed_in():
+    far = prices([
+        ("Kochi Market", 9.9312, 76.2673, "Banana", "kg", 40.0, "2025-09-22"),
+        ("Thrissur Market", 10.5276, 76.2144, "Banana", "kg", 50.0, "2025-09-22"),
+    ])
+    clusters = MapClusters(PriceSummary(far))
+    assert len(clusters.clusters(None, MIN_ZOOM)) == 1
+    assert sorted(clusters.clusters(None, MAX_ZOOM)["market"]) == ["Kochi Market", "Thrissur Market"]
+    view = clusters.viewport(9.93, 76.27, MAX_ZOOM)
+    assert list(view["market"]) == ["Kochi Market"]
@@ -0,0 +1,61 @@
+# test_market_distances.py
+import os
+import numpy as np
+import pytest
+import utils
+from test_market_index import random_markets
+from utils import coords_key, haversine_np, market_distances, unique_markets
+
+@pytest.fixture(autouse=True)
+def fresh_memo():
+    utils._distance_cache.clear()
+    yield
+    utils._distance_cache.clear()
+
+def matrix_path(cache_dir, markets):
+    return os.path.join(cache_dir, f"market_distances_{coords_key(unique_markets(markets))}.npy")
+
+def test_matrix_matches_haversine_and_knn(tmp_path):
+    markets = random_markets(n=60)
+    dist = market_distances(markets, cache_dir=str(tmp_path))
+    lats, lons = markets["market_lat"].to_numpy(), markets["market_lon"].to_numpy()
+    np.testing.assert_allclose(dist.matrix, haversine_np(lats[:, None], lons[:, None], lats, lons), rtol=1e-5, atol=1e-3)
+    nearest = dist.nearest("Market 0", k=5)
+    expected = np.sort(dist.matrix[0][1:])[:5]
+    np.testing.assert_allclose(nearest["distance_km"].to_numpy(), expected)
+    assert os.listdir(tmp_path) == [os.path.basename(matrix_path(tmp_path, markets))]
+
+def test_wrong_shape_cache_is_replaced(tmp_path):
+    markets = random_markets(n=20)
+    path = matrix_path(tmp_path, markets)
+    np.save(path, np.zeros((3, 3), dtype=np.float32))
+    dist = market_distances(markets, cache_dir=str(tmp_path))
+    assert dist.matrix.shape == (20, 20)
+    # the bad file was rewritten, not just worked around
+    assert np.load(path, mmap_mode="r").shape == (20, 20)
+
+def test_corrupt_cache_is_replaced(tmp_path):
+    markets = random_markets(n=10)
+    path = matrix_path(tmp_path, markets)
+    with open(path, "wb") as f:
+        f.write(b"not a npy file")
+    assert market_distances(markets, cache_dir=str(tmp_path)).matrix.shape == (10, 10)
+    assert np.load(path).shape == (10, 10)
+
+def test_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    markets = random_markets(n=10)
+
+    def broken(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(utils, "haversine_np", broken)
+    with pytest.raises(OSError):
+        utils._write_distance_matrix(matrix_path(tmp_path, markets), np.zeros(10), np.zeros(10))
+    assert os.listdir(tmp_path) == []
+
+def test_matrix_stays_memory_mapped_and_shared(tmp_path):
+    markets = random_markets(n=30)
+    dist = market_distances(markets, cache_dir=str(tmp_path))
+    assert isinstance(dist.matrix, np.memmap)
+    # the same market list (e.g. from the market index) gets the same open matrix back
+    assert market_distances(unique_markets(markets), cache_dir=str(tmp_path)) is dist
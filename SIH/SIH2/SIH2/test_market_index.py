@@ -0,0 +1,59 @@
+# test_market_index.py
+import numpy as np
+import pandas as pd
+from market_index import MarketIndex, build_market_index
+from utils import haversine_np
+
+def random_markets(n=400, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "market": [f"Market {i}" for i in range(n)],
+        "market_lat": rng.uniform(8.2, 12.8, n),
+        "market_lon": rng.uniform(74.9, 77.4, n),
+    })
+
+def brute_knn(markets, lat, lon, k):
+    dist = haversine_np(lat, lon, markets["market_lat"].to_numpy(), markets["market_lon"].to_numpy())
+    return np.sort(dist)[:k]
+
+def test_knn_matches_brute_force():
+    markets = random_markets()
+    index = MarketIndex(markets)
+    rng = np.random.default_rng(11)
+    queries = np.column_stack([rng.uniform(7.5, 13.5, 200), rng.uniform(74.0, 78.0, 200)])
+    # points exactly on cell corners and edges
+    queries = np.vstack([queries, [[10.0, 76.0], [10.25, 76.25], [9.75, 75.999999]]])
+    for lat, lon in queries:
+        for k in (1, 5, 25):
+            got = index.knn(lat, lon, k)
+            np.testing.assert_allclose(got["distance_km"].to_numpy(), brute_knn(markets, lat, lon, k))
+            expected = haversine_np(lat, lon, got["market_lat"].to_numpy(), got["market_lon"].to_numpy())
+            np.testing.assert_allclose(got["distance_km"].to_numpy(), expected)
+
+def test_knn_finds_nearest_in_neighbouring_cell():
+    # the query's own 0.25 degree cell holds only a far market; the nearest is just across the edge
+    markets = pd.DataFrame({
+        "market": ["same cell, far", "next cell, near", "two cells away"],
+        "market_lat": [10.01, 10.251, 10.76],
+        "market_lon": [76.01, 76.2, 76.2],
+    })
+    index = MarketIndex(markets)
+    got = index.knn(10.249, 76.2, k=2)
+    assert list(got["market"]) == ["next cell, near", "same cell, far"]
+    assert got["distance_km"].iloc[0] < 1.0
+
+def test_knn_more_than_available_and_empty():
+    markets = random_markets(n=3)
+    assert len(MarketIndex(markets).knn(10.0, 76.0, k=10)) == 3
+    empty = build_market_index(pd.DataFrame())
+    assert len(empty) == 0 and empty.knn(10.0, 76.0, k=5).empty
+
+def test_within_matches_brute_force():
+    markets = random_markets()
+    index = MarketIndex(markets)
+    for lat, lon, radius in [(10.0, 76.2, 25.0), (8.3, 77.3, 60.0), (12.7, 75.0, 5.0)]:
+        got = index.within(lat, lon, radius)
+        dist = haversine_np(lat, lon, markets["market_lat"].to_numpy(), markets["market_lon"].to_numpy())
+        expected = markets.loc[dist <= radius, "market"]
+        assert sorted(got["market"]) == sorted(expected)
+        assert got["distance_km"].is_monotonic_increasing
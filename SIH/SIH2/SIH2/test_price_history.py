@@ -0,0 +1,87 @@
+# test_price_history.py
+import numpy as np
+import pandas as pd
+from data_fetcher import generate_mock_data
+from price_history import KEY_LEVELS, WINDOWS, PriceHistory, daily_aggregates, rolling_stats
+
+def reference_rolling_stats(days, windows=WINDOWS):
+    """The original groupby-rolling implementation, kept as the reference."""
+    days = days.reset_index()
+    days["price"] = days["price_sum"] / days["n"]
+    out = days.copy()
+    grouped = days.groupby(KEY_LEVELS, sort=False)
+    for w in windows:
+        r = grouped.rolling(f"{w}D", on="date")
+        mean = r["price"].mean().to_numpy()
+        std = r["price"].std().to_numpy()
+        out[f"mean_{w}d"] = mean
+        out[f"min_{w}d"] = r["price_min"].min().to_numpy()
+        out[f"max_{w}d"] = r["price_max"].max().to_numpy()
+        out[f"volatility_{w}d"] = np.where(mean > 0, std / mean, np.nan)
+    return out.set_index(KEY_LEVELS + ["date"])
+
+def gappy_prices(days=45, drop=0.3, seed=7):
+    """Mock rows over days with a random share dropped, so windows span calendar gaps."""
+    df = generate_mock_data(n_markets=12, n_crops=4, days=days)
+    keep = np.random.default_rng(seed).random(len(df)) >= drop
+    return df[keep].reset_index(drop=True)
+
+def assert_stats_equal(got, expected):
+    assert list(got.index) == list(expected.index)
+    for col in expected.columns:
+        if col in got.columns:
+            np.testing.assert_allclose(
+                got[col].to_numpy(dtype=float), expected[col].to_numpy(dtype=float),
+                rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=col,
+            )
+
+def test_rolling_stats_matches_groupby_rolling():
+    days = daily_aggregates(gappy_prices()).sort_index()
+    assert_stats_equal(rolling_stats(days), reference_rolling_stats(days))
+
+def test_rolling_stats_single_rows_and_empty():
+    days = daily_aggregates(generate_mock_data(n_markets=3, n_crops=2, days=1)).sort_index()
+    stats = rolling_stats(days)
+    assert_stats_equal(stats, reference_rolling_stats(days))
+    # one day per pair: no volatility yet
+    assert stats["volatility_7d"].isna().all()
+    empty = rolling_stats(days.iloc[:0])
+    assert empty.empty and "mean_30d" in empty.columns
+
+def test_incremental_add_matches_full_rebuild():
+    df = gappy_prices(days=45)
+    dates = pd.to_datetime(df["timestamp"])
+    first = dates.min()
+    cut1, cut2 = first + pd.Timedelta(days=20), first + pd.Timedelta(days=35)
+    old_day = first + pd.Timedelta(days=10)
+
+    # half of an old day's rows arrive late, with the last batch
+    late = (dates == old_day) & (df.index % 2 == 0)
+    batches = [
+        df[(dates < cut1) & ~late],
+        df[(dates >= cut1) & (dates < cut2)],
+        # 30-day windows of these rows reach back across both earlier batches
+        df[(dates >= cut2) | late],
+    ]
+    assert sum(len(b) for b in batches) == len(df)
+
+    history = PriceHistory()
+    for batch in batches:
+        history.add(batch)
+    full = PriceHistory(df)
+
+    assert_stats_equal(history.days, full.days)
+    assert_stats_equal(history.latest, full.latest)
+    crop, market = df["crop"].iloc[0], df["market"].iloc[0]
+    pd.testing.assert_frame_equal(history.trend(crop, market), full.trend(crop, market))
+
+def test_copy_is_unaffected_by_later_adds():
+    df = gappy_prices(days=20)
+    dates = pd.to_datetime(df["timestamp"])
+    cut = dates.min() + pd.Timedelta(days=10)
+    history = PriceHistory(df[dates < cut])
+    before = history.days.copy()
+    snapshot = history.copy()
+    history.add(df[dates >= cut])
+    pd.testing.assert_frame_equal(snapshot.days, before)
+    assert len(history) > len(snapshot)
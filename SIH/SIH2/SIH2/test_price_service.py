@@ -0,0 +1,105 @@
+# test_price_service.py
+import json
+import pytest
+from data_fetcher import generate_mock_data
+from price_service import CursorError, PriceService, PublishedPriceService, decode_cursor, encode_cursor
+from price_store import PriceStore
+
+def make_service(tmp_path, days=3):
+    csv_path = tmp_path / "prices.csv"
+    generate_mock_data(n_markets=15, n_crops=4, days=days).to_csv(csv_path, index=False)
+    # refresh_seconds=0: every call checks the store, so appends show up at once
+    return PriceService(PriceStore(csv_path=str(csv_path)), refresh_seconds=0), csv_path
+
+def all_records(service, crop=None):
+    return json.loads(service.json_response(crop=crop))
+
+def test_cursor_round_trip():
+    for generation, offset in [(0, 0), (3, 150), (12, 10 ** 9)]:
+        assert decode_cursor(encode_cursor(generation, offset)) == (generation, offset)
+    for bad in ["", "not a cursor", encode_cursor(0, 5)[:-2] + "!!", "MTotMQ"]:
+        with pytest.raises(CursorError):
+            decode_cursor(bad)
+
+def test_pages_cover_every_row_once(tmp_path):
+    service, _ = make_service(tmp_path)
+    crop = all_records(service)[0]["crop"]
+    for query in ({}, {"crop": crop}):
+        expected = all_records(service, **query)
+        items, cursor, pages = [], None, 0
+        while True:
+            page = json.loads(service.page(limit=7, cursor=cursor, **query))
+            items += page["items"]
+            pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert items == expected
+        assert pages == -(-len(expected) // 7)
+
+def test_ndjson_pages_match_json(tmp_path):
+    service, _ = make_service(tmp_path)
+    expected = all_records(service)
+
+    # whole result, streamed in small chunks
+    chunks, next_cursor = service.ndjson_chunks(chunk_rows=4)
+    lines = b"".join(chunks).decode("utf-8").splitlines()
+    assert next_cursor is None
+    assert [json.loads(line) for line in lines] == expected
+
+    # paged with limit + cursor
+    items, cursor = [], None
+    while True:
+        chunks, cursor = service.ndjson_chunks(limit=10, cursor=cursor, chunk_rows=3)
+        items += [json.loads(line) for line in b"".join(chunks).decode("utf-8").splitlines()]
+        if cursor is None:
+            break
+    assert items == expected
+
+def test_cursor_survives_appends_and_expires_on_reload(tmp_path):
+    service, csv_path = make_service(tmp_path, days=1)
+    first = json.loads(service.page(limit=5))
+    before = all_records(service)
+
+    # appended rows keep existing positions, so the cursor continues where it left off
+    with open(csv_path, "a", encoding="utf-8") as f:
+        generate_mock_data(n_markets=2, n_crops=1, days=1, seed=9).to_csv(f, index=False, header=False)
+    second = json.loads(service.page(limit=5, cursor=first["next_cursor"]))
+    assert second["items"] == before[5:10]
+
+    # a rewritten file starts a new generation; old cursors must be rejected
+    generate_mock_data(n_markets=4, n_crops=2, days=1, seed=5).to_csv(csv_path, index=False)
+    with pytest.raises(CursorError):
+        service.page(limit=5, cursor=second["next_cursor"])
+
+def test_published_service_refreshes_from_requests_without_a_background_task(tmp_path):
+    csv_path = tmp_path / "prices.csv"
+    generate_mock_data(n_markets=5, n_crops=2, days=1).to_csv(csv_path, index=False)
+    service = PublishedPriceService(
+        str(tmp_path / "published.arrow"), PriceStore(csv_path=str(csv_path)), refresh_seconds=0, poll_seconds=0,
+    )
+    # no tick() calls: the first request publishes and loads the shared file
+    first = all_records(service)
+    assert len(first) == 10 and service.stats["publishes"] == 1 and service.stats["reloads"] == 1
+    # the API snapshot is only the frame and its lookup, not the dashboard's derived tables
+    assert set(service.snapshot()) == {"version", "generation", "fingerprint", "prices", "lookup"}
+
+    with open(csv_path, "a", encoding="utf-8") as f:
+        generate_mock_data(n_markets=2, n_crops=1, days=1, seed=9).to_csv(f, index=False, header=False)
+    assert all_records(service)[:10] == first
+    assert len(all_records(service)) == 12
+    assert service.stats["publishes"] == 2
+
+def test_published_service_waits_for_poll_interval(tmp_path):
+    csv_path = tmp_path / "prices.csv"
+    generate_mock_data(n_markets=3, n_crops=2, days=1).to_csv(csv_path, index=False)
+    service = PublishedPriceService(
+        str(tmp_path / "published.arrow"), PriceStore(csv_path=str(csv_path)), refresh_seconds=0, poll_seconds=3600,
+    )
+    assert len(all_records(service)) == 6
+    with open(csv_path, "a", encoding="utf-8") as f:
+        generate_mock_data(n_markets=1, n_crops=1, days=1, seed=9).to_csv(f, index=False, header=False)
+    # still within the poll interval: the loaded snapshot keeps serving
+    assert len(all_records(service)) == 6
+    service.tick()
+    assert len(all_records(service)) == 7
@@ -0,0 +1,76 @@
+# test_price_summary.py
+import numpy as np
+import pandas as pd
+from data_fetcher import generate_mock_data, normalize_prices
+from price_summary import PriceSummary
+from utils import best_price_for_crop
+
+def sample_prices():
+    """Mock history with two markets tied on a best price and one market without coordinates."""
+    # a synthetic market: normalize_prices only fills in coordinates of known Kerala markets
+    df = generate_mock_data(n_markets=10, n_crops=5, days=6)
+    df["market_lat"] = df["market_lat"].where(df["market"] != "Market 00010")
+    onion = (df["crop"] == "Onion").to_numpy()
+    df.loc[onion & (df["market"] == "Kollam Market").to_numpy(), "price"] = 999.0
+    df.loc[onion & (df["market"] == "Kochi Market").to_numpy(), "price"] = 999.0
+    return normalize_prices(df)
+
+def old_map_points(df):
+    return df.groupby(["market", "unit", "market_lat", "market_lon"], as_index=False, observed=True).agg({
+        "price": "mean"
+    }).dropna(subset=["market_lat", "market_lon"])
+
+def assert_same_rows(got, expected, keys):
+    got = got.assign(**{k: got[k].astype(str) for k in keys}).sort_values(keys).reset_index(drop=True)
+    expected = expected.assign(**{k: expected[k].astype(str) for k in keys}).sort_values(keys).reset_index(drop=True)
+    assert list(got[keys].itertuples(index=False)) == list(expected[keys].itertuples(index=False))
+    np.testing.assert_allclose(got["price"].to_numpy(dtype=float), expected["price"].to_numpy(dtype=float))
+
+def test_best_matches_best_price_for_crop():
+    df = sample_prices()
+    summary = PriceSummary(df)
+    for crop in list(df["crop"].cat.categories) + ["onion", "no such crop"]:
+        expected = best_price_for_crop(df, crop)
+        got = summary.best(crop)
+        if expected is None:
+            assert got is None
+        else:
+            pd.testing.assert_frame_equal(got.reset_index(drop=True), expected.reset_index(drop=True))
+    assert list(summary.best("Onion")["market"].unique()) == ["Kochi Market", "Kollam Market"]
+
+def test_crop_averages_match_groupby():
+    df = sample_prices()
+    summary = PriceSummary(df)
+    for markets in (None, ["Kochi Market", "kollam market"]):
+        rows = df if markets is None else df[df["market"].astype(str).str.lower().isin([m.lower() for m in markets])]
+        expected = rows.groupby("crop", observed=True).price.mean().reset_index().sort_values("price", ascending=False)
+        got = summary.crop_averages(markets)
+        assert list(got["crop"].astype(str)) == list(expected["crop"].astype(str))
+        np.testing.assert_allclose(got["price"].to_numpy(), expected["price"].to_numpy())
+
+def test_crop_distribution_matches_quantiles():
+    df = sample_prices()
+    summary = PriceSummary(df)
+    for crop in df["crop"].cat.categories:
+        prices = df.loc[df["crop"] == crop, "price"].to_numpy()
+        dist = summary.crop_distribution(crop.upper())
+        assert dist["n"] == len(prices)
+        np.testing.assert_allclose(
+            [dist["min"], dist["q1"], dist["median"], dist["q3"], dist["max"], dist["mean"]],
+            list(np.quantile(prices, [0, 0.25, 0.5, 0.75, 1])) + [prices.mean()],
+        )
+    assert summary.crop_distribution("no such crop") is None
+
+def test_map_points_match_groupby():
+    df = sample_prices()
+    summary = PriceSummary(df)
+    keys = ["market", "unit", "market_lat", "market_lon"]
+    assert_same_rows(summary.map_points(), old_map_points(df), keys)
+    crop_rows = df[df["crop"] == "Tomato"]
+    assert_same_rows(summary.map_points("tomato"), old_map_points(crop_rows), keys)
+    markets = ["Kochi Market", "Market 00010"]
+    market_rows = crop_rows[crop_rows["market"].isin(markets)]
+    got = summary.map_points("Tomato", markets)
+    # Market 00010 has no coordinates, so only Kochi is drawn
+    assert list(got["market"]) == ["Kochi Market"]
+    assert_same_rows(got, old_map_points(market_rows), keys)
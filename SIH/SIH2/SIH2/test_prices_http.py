@@ -0,0 +1,45 @@
+# test_prices_http.py
+import gzip
+from test_price_service import make_service
+from prices_http import handle_prices
+
+def test_csv_etag_differs_per_content_encoding(tmp_path):
+    service, _ = make_service(tmp_path)
+    args = {"format": "csv"}
+    status, gz_headers, gz_body = handle_prices(service, args, {"accept-encoding": "gzip, deflate"})
+    assert status == 200 and gz_headers["Content-Encoding"] == "gzip"
+    status, plain_headers, plain_body = handle_prices(service, args, {})
+    assert status == 200 and "Content-Encoding" not in plain_headers
+    assert gzip.decompress(gz_body) == plain_body
+
+    assert gz_headers["ETag"] != plain_headers["ETag"]
+    for out in (gz_headers, plain_headers):
+        assert "Accept-Encoding" in out["Vary"]
+
+    # each validator only revalidates its own representation
+    status, out, _ = handle_prices(service, args, {"accept-encoding": "gzip", "if-none-match": gz_headers["ETag"]})
+    assert status == 304 and "Accept-Encoding" in out["Vary"]
+    status, _, _ = handle_prices(service, args, {"if-none-match": gz_headers["ETag"]})
+    assert status == 200
+    status, _, _ = handle_prices(service, args, {"if-none-match": plain_headers["ETag"]})
+    assert status == 304
+
+def test_negotiated_responses_vary_on_accept(tmp_path):
+    service, _ = make_service(tmp_path)
+    for accept in ["application/json", "application/x-ndjson", "application/vnd.apache.arrow.stream",
+                   "application/vnd.apache.parquet", "text/csv", "*/*", ""]:
+        status, out, _ = handle_prices(service, {}, {"accept": accept, "accept-encoding": "gzip"})
+        assert status == 200
+        vary = [v.strip() for v in out["Vary"].split(",")]
+        assert "Accept" in vary
+        assert ("Accept-Encoding" in vary) == (accept == "text/csv")
+        # a revalidation answers with the same Vary
+        status, revalidated, _ = handle_prices(service, {}, {"accept": accept, "accept-encoding": "gzip",
+                                                             "if-none-match": out["ETag"]})
+        assert status == 304 and revalidated["Vary"] == out["Vary"]
+
+    # ?format= pins the representation in the URL; only the encoding still varies
+    status, out, _ = handle_prices(service, {"format": "json"}, {"accept": "text/csv"})
+    assert status == 200 and "Vary" not in out
+    status, out, _ = handle_prices(service, {"format": "csv"}, {"accept": "application/json"})
+    assert status == 200 and out["Vary"] == "Accept-Encoding"
@@ -1,7 +1,14 @@
 # utils.py
+import functools
+import hashlib
 import math
+import os
+import threading
+import numpy as np
 import pandas as pd
 import requests
+from geo_index import locate
+from ip_geo import client_ip, get_table as get_ip_table, lookup_ip
 
 def haversine(lat1, lon1, lat2, lon2):
     """
@@ -15,30 +22,241 @@ def haversine(lat1, lon1, lat2, lon2):
     a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dlambda/2)**2
     return 2 * R * math.asin(math.sqrt(a))
 
+def haversine_np(lat1, lon1, lat2, lon2):
+    """
+    Vectorized great circle distance in kilometers. Inputs broadcast like NumPy
+    arrays, so a (n_users, 1) column against (n_markets,) rows gives a
+    (n_users, n_markets) distance matrix.
+    """
+    R = 6371.0
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lon2, dtype=float) - np.asarray(lon1, dtype=float))
+    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
+    return 2 * R * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def unique_markets(df_markets):
+    """
+    One row per market (first occurrence wins) with numeric coordinates.
+    Markets without coordinates are dropped.
+    """
+    markets = df_markets[["market", "market_lat", "market_lon"]].drop_duplicates(subset=["market"])
+    markets = markets.assign(
+        market_lat=pd.to_numeric(markets["market_lat"], errors="coerce"),
+        market_lon=pd.to_numeric(markets["market_lon"], errors="coerce"),
+    )
+    return markets.dropna(subset=["market_lat", "market_lon"]).reset_index(drop=True)
+
+def nearest_indices(market_lats, market_lons, user_lats, user_lons, top_n=5):
+    """
+    Top-N nearest markets for a batch of users.
+    Returns (indices, distances), both shaped (n_users, k) with k = min(top_n, n_markets),
+    each row sorted by ascending distance.
+    """
+    user_lats = np.atleast_1d(np.asarray(user_lats, dtype=float))[:, None]
+    user_lons = np.atleast_1d(np.asarray(user_lons, dtype=float))[:, None]
+    dist = haversine_np(user_lats, user_lons, market_lats, market_lons)
+    k = min(top_n, dist.shape[1])
+    if k <= 0:
+        empty = np.empty((dist.shape[0], 0))
+        return empty.astype(np.intp), empty
+    if k < dist.shape[1]:
+        # argpartition is O(n) per user; only the k survivors get sorted
+        idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+    else:
+        idx = np.broadcast_to(np.arange(dist.shape[1]), dist.shape).copy()
+    part = np.take_along_axis(dist, idx, axis=1)
+    order = np.argsort(part, axis=1, kind="stable")
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
 def find_nearest_markets(df_markets, user_lat, user_lon, top_n=5):
     """
     df_markets must have columns market, market_lat, market_lon.
     Returns DataFrame with extra 'distance_km' column sorted ascending.
+    If user_lat/user_lon are sequences, returns a list with one DataFrame per user.
     """
-    df = df_markets.copy()
-    # If lat/lon missing, return empty
-    if df["market_lat"].isna().all() or df["market_lon"].isna().all():
-        return pd.DataFrame()
-    df["distance_km"] = df.apply(
-        lambda row: haversine(user_lat, user_lon, float(row["market_lat"]), float(row["market_lon"])), axis=1
+    batch = np.ndim(user_lat) > 0
+    markets = unique_markets(df_markets)
+    if markets.empty:
+        return [pd.DataFrame() for _ in np.atleast_1d(user_lat)] if batch else pd.DataFrame()
+    idx, dist = nearest_indices(
+        markets["market_lat"].to_numpy(dtype=float), markets["market_lon"].to_numpy(dtype=float),
+        user_lat, user_lon, top_n=top_n,
     )
-    # aggregate unique markets and their lat/lon (take first)
-    df_markets_unique = df[["market", "market_lat", "market_lon", "distance_km"]].drop_duplicates(subset=["market"])
-    return df_markets_unique.sort_values("distance_km").head(top_n)
+    results = []
+    for row_idx, row_dist in zip(idx, dist):
+        nearest = markets.iloc[row_idx].reset_index(drop=True)
+        nearest["distance_km"] = row_dist
+        results.append(nearest)
+    return results if batch else results[0]
+
+# market x market distance matrices live here, one .npy per set of market coordinates
+DISTANCE_CACHE_DIR = os.environ.get(
+    "MARKET_DISTANCE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".snapshots")
+)
+# rows of the matrix computed per step, to bound temporary memory
+DISTANCE_BLOCK_ROWS = 512
+
+def coords_key(markets):
+    """Stable hash of the market names and coordinates (in order) of a unique_markets() frame."""
+    h = hashlib.sha1()
+    h.update("\0".join(markets["market"].astype(str)).encode("utf-8"))
+    h.update(np.ascontiguousarray(markets["market_lat"].to_numpy(dtype=np.float64)).tobytes())
+    h.update(np.ascontiguousarray(markets["market_lon"].to_numpy(dtype=np.float64)).tobytes())
+    return h.hexdigest()[:20]
+
+def _write_distance_matrix(path, lats, lons):
+    """Compute the float32 haversine matrix block by block straight into a .npy file."""
+    n = len(lats)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(n, n))
+        for start in range(0, n, DISTANCE_BLOCK_ROWS):
+            stop = min(start + DISTANCE_BLOCK_ROWS, n)
+            out[start:stop] = haversine_np(lats[start:stop, None], lons[start:stop, None], lats, lons)
+        out.flush()
+        del out
+        os.replace(tmp, path)
+    finally:
+        # a failed write (disk full, interrupted) must not leave a partial file behind
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _load_distance_matrix(path, n):
+    """
+    The memory-mapped (n, n) float32 matrix at path, or None if there is none.
+    A file that cannot be read or has the wrong shape is deleted, so it is
+    rebuilt instead of being rejected again on every call.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        matrix = np.load(path, mmap_mode="r")
+        if matrix.shape == (n, n) and matrix.dtype == np.float32:
+            return matrix
+        del matrix
+    except Exception as e:
+        print("Discarding unreadable market distance cache:", e)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return None
+
+class MarketDistances:
+    """
+    Dense float32 market x market distance matrix (km), memory-mapped from a
+    .npy file keyed by coords_key(), so it is computed once per market list
+    and shared by every process that opens it. Lookups by market name
+    (case-insensitive) are a dict lookup plus an array index.
+    """
+
+    def __init__(self, markets, matrix):
+        self.markets = markets
+        self.names = markets["market"].astype(str).to_numpy()
+        self.positions = {name_key(m): i for i, m in enumerate(self.names)}
+        self.matrix = matrix
 
-def get_user_location_by_ip():
+    def __len__(self):
+        return len(self.names)
+
+    def position(self, market):
+        return self.positions.get(name_key(market))
+
+    def distance(self, market_a, market_b):
+        """km between two markets, or None if either is unknown."""
+        i, j = self.position(market_a), self.position(market_b)
+        if i is None or j is None:
+            return None
+        return float(self.matrix[i, j])
+
+    def row(self, market):
+        """Distances from market to every market (in self.names order), or None."""
+        i = self.position(market)
+        return None if i is None else self.matrix[i]
+
+    def nearest(self, market, k=5, radius_km=None, include_self=False):
+        """
+        Markets nearest to market as market, market_lat, market_lon, distance_km
+        sorted ascending: the k nearest, or all within radius_km if given.
+        """
+        i = self.position(market)
+        if i is None:
+            return pd.DataFrame(columns=["market", "market_lat", "market_lon", "distance_km"])
+        dist = np.asarray(self.matrix[i], dtype=float).copy()
+        if not include_self:
+            dist[i] = np.inf
+        candidates = np.flatnonzero(dist <= (np.inf if radius_km is None else radius_km))
+        if radius_km is None and 0 <= k < len(candidates):
+            # O(n) selection; only the k survivors get sorted
+            candidates = candidates[np.argpartition(dist[candidates], k - 1)[:k]] if k else candidates[:0]
+        rows = candidates[np.argsort(dist[candidates], kind="stable")]
+        out = self.markets.iloc[rows].reset_index(drop=True)
+        out["distance_km"] = dist[rows]
+        return out
+
+_distance_lock = threading.Lock()
+_distance_cache = {}
+
+def market_distances(df_markets, cache_dir=None):
+    """
+    MarketDistances for the unique markets of df_markets. Reuses the open
+    matrix for the same coordinates, else memory-maps <cache_dir>/<key>.npy,
+    else computes and persists it. Falls back to an in-memory matrix if the
+    cache directory is not writable.
     """
-    Attempt to get approximate user location via public IP geolocation.
-    Uses ipinfo.io as a simple free endpoint; this may be rate-limited.
-    Returns (lat, lon) or None.
+    markets = unique_markets(df_markets)
+    key = coords_key(markets)
+    with _distance_lock:
+        cached = _distance_cache.get(key)
+        if cached is not None:
+            return cached
+        lats = markets["market_lat"].to_numpy(dtype=float)
+        lons = markets["market_lon"].to_numpy(dtype=float)
+        path = os.path.join(cache_dir or DISTANCE_CACHE_DIR, f"market_distances_{key}.npy")
+        matrix = None
+        try:
+            matrix = _load_distance_matrix(path, len(markets))
+            if matrix is None:
+                _write_distance_matrix(path, lats, lons)
+                matrix = _load_distance_matrix(path, len(markets))
+        except Exception as e:
+            print("Market distance cache unavailable:", e)
+        if matrix is None:
+            matrix = haversine_np(lats[:, None], lons[:, None], lats, lons).astype(np.float32)
+        # one matrix per process; a new market list replaces the old one
+        _distance_cache.clear()
+        _distance_cache[key] = MarketDistances(markets, matrix)
+        return _distance_cache[key]
+
+@functools.lru_cache(maxsize=4096)
+def _reverse_geocode(lat, lon):
+    return locate(lat, lon)
+
+def reverse_geocode(lat, lon):
     """
+    Kerala district (and taluk, if the boundary file has them) for a point:
+    {"district": ..., "exact": bool} or None. Offline; see geo_index.py.
+    Points are rounded to ~10 m so nearby repeats hit the cache.
+    """
+    result = _reverse_geocode(round(float(lat), 4), round(float(lon), 4))
+    return dict(result) if result else None
+
+def get_user_location_by_ip(ip=None, headers=None):
+    """
+    Approximate (lat, lon) of the user's IP address, or None.
+    ip defaults to the client address in the request headers (X-Forwarded-For).
+    With an offline range table (see ip_geo.py) this is a memory-mapped binary
+    search; without one it falls back to ipinfo.io, which is slow, rate-limited
+    and, when no client IP is known, locates this server instead of the user.
+    """
+    ip = ip or client_ip(headers)
+    if get_ip_table() is not None:
+        return lookup_ip(ip) if ip else None
     try:
-        resp = requests.get("https://ipinfo.io/json", timeout=5)
+        resp = requests.get(f"https://ipinfo.io/{ip}/json" if ip else "https://ipinfo.io/json", timeout=5)
         resp.raise_for_status()
         data = resp.json()
         if "loc" in data:
@@ -48,11 +266,80 @@ def get_user_location_by_ip():
         print("IP geolocation failed:", e)
     return None
 
-def best_price_for_crop(df_prices, crop):
+def name_key(name):
+    """Normalized lookup key for crop/market names."""
+    return str(name).strip().lower()
+
+def _column_keys(col):
+    """
+    Per-row integer key codes for a crop/market column plus the key for each code.
+    Categorical columns only normalize their categories, not every row.
+    """
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype("category")
+    key_codes, keys = pd.factorize(pd.Index(col.cat.categories).map(name_key))
+    # code -1 (missing) picks the appended -1
+    row_keys = np.append(key_codes, -1)[col.cat.codes.to_numpy()]
+    return row_keys, list(keys)
+
+def _rows_by_key(col):
+    """{normalized name: sorted row positions} for a crop/market column."""
+    row_keys, keys = _column_keys(col)
+    order = np.argsort(row_keys, kind="stable")
+    bounds = np.searchsorted(row_keys[order], np.arange(len(keys) + 1))
+    return {k: order[bounds[i]:bounds[i + 1]] for i, k in enumerate(keys)}
+
+class PriceLookup:
+    """
+    Precomputed crop -> rows and market -> rows positions for one price frame.
+    Filtering becomes a dict lookup plus a take instead of a string scan.
+    Build it once per data refresh; it is only valid for the frame it was built from.
+    """
+
+    def __init__(self, df_prices):
+        self.n_rows = len(df_prices)
+        self.crop_rows = _rows_by_key(df_prices["crop"])
+        self.market_rows = _rows_by_key(df_prices["market"])
+
+    def rows(self, crop=None, market=None):
+        """Row positions matching crop and/or market (case-insensitive), sorted ascending."""
+        empty = np.empty(0, dtype=np.intp)
+        rows = None
+        if crop:
+            rows = self.crop_rows.get(name_key(crop), empty)
+        if market:
+            markets = [market] if isinstance(market, str) else list(market)
+            market_rows = [self.market_rows.get(name_key(m), empty) for m in markets]
+            # the same market can be listed twice (or in two spellings); keep each row once
+            market_rows = np.unique(np.concatenate(market_rows)) if market_rows else empty
+            rows = market_rows if rows is None else np.intersect1d(rows, market_rows)
+        return np.arange(self.n_rows) if rows is None else rows
+
+    def select(self, df_prices, crop=None, market=None):
+        """Rows of df_prices for crop and/or market (one name or a list of market names)."""
+        return df_prices.take(self.rows(crop, market))
+
+def filter_prices(df_prices, crop=None, market=None, lookup=None):
+    """
+    Case-insensitive crop/market filter. Uses lookup when given; otherwise
+    compares integer key codes so names are normalized once per category.
+    """
+    if lookup is not None:
+        return lookup.select(df_prices, crop, market)
+    mask = np.ones(len(df_prices), dtype=bool)
+    for col, value in (("crop", crop), ("market", market)):
+        if value:
+            row_keys, keys = _column_keys(df_prices[col])
+            wanted = [name_key(v) for v in ([value] if isinstance(value, str) else value)]
+            codes = [keys.index(w) for w in wanted if w in keys]
+            mask &= np.isin(row_keys, codes)
+    return df_prices[mask]
+
+def best_price_for_crop(df_prices, crop, lookup=None):
     """
     Returns best (highest) price row(s) for crop across markets.
     """
-    crop_df = df_prices[df_prices["crop"].str.lower() == crop.lower()]
+    crop_df = filter_prices(df_prices, crop=crop, lookup=lookup)
     if crop_df.empty:
         return None
     max_price = crop_df["price"].max()
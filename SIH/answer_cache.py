@@ -0,0 +1,190 @@
+"""
+Answer cache for the agricultural chatbot.
+
+Farmers ask the same questions over and over, so answers are cached by
+normalized question text. A question that is not an exact repeat can
+still hit if it is close enough to a cached one: every question is turned
+into a hashed vector of character n-grams (which works for Malayalam as
+well as English without a tokenizer or model), and the nearest cached
+question by cosine similarity is used when it clears ANSWER_CACHE_SIMILARITY.
+A similar question only counts if its key terms match exactly: the same
+numbers ("2 kg" vs "5 kg") and the same English words outside a short
+stopword list, which is how crop and disease names reach the chatbot
+("Tomato Late Blight" vs "Tomato Early Blight"). Malayalam wording is left to
+the n-gram similarity, since its spelling varies most between keyboards.
+Callers whose question is a fixed template around such a name can pass
+fuzzy=False to get() to skip the similarity lookup altogether.
+
+Entries expire after ANSWER_CACHE_TTL seconds and the least recently used
+are evicted beyond ANSWER_CACHE_SIZE entries. metrics() reports hit rates.
+"""
+
+import os
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import OrderedDict
+from typing import Dict, Optional
+import numpy as np
+
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '2000'))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', str(24 * 3600)))
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', '0.9'))
+# hashed n-gram vector width and n-gram lengths
+VECTOR_DIM = 2048
+NGRAM_SIZES = (2, 3, 4)
+
+# atomic Malayalam chillu letters -> consonant + virama, the older encoding
+_CHILLU = {
+    'ൺ': 'ണ്', 'ൻ': 'ന്', 'ർ': 'ര്',
+    'ൽ': 'ല്', 'ൾ': 'ള്', 'ൿ': 'ക്',
+    'ൔ': 'മ്', 'ൕ': 'യ്', 'ൖ': 'ഴ്',
+}
+# zero-width joiners are used inconsistently by Malayalam keyboards
+_INVISIBLE = dict.fromkeys(map(ord, '​‌‍﻿'))
+_DIGITS = re.compile(r'\d+(?:\.\d+)?')
+_LATIN_WORDS = re.compile(r'[a-z]+')
+# English words that may differ between two questions with the same answer
+_STOPWORDS = frozenset(
+    'a an and are about can do does for how i in is it me my of on or please '
+    'should the this to what when which why with'.split()
+)
+
+def normalize_query(text: str) -> str:
+    """Case-folded NFC text with unified chillus, no punctuation and single spaces."""
+    text = unicodedata.normalize('NFC', str(text)).translate(_INVISIBLE).casefold()
+    text = ''.join(_CHILLU.get(ch, ch) for ch in text)
+    # keep letters, combining vowel signs/virama (categories M*) and digits
+    kept = ''.join(ch if unicodedata.category(ch)[0] in 'LMN' else ' ' for ch in text)
+    return ' '.join(kept.split())
+
+def key_terms(normalized: str):
+    """Numbers (in order) and English non-stopwords that must match for a similar hit."""
+    words = frozenset(_LATIN_WORDS.findall(normalized)) - _STOPWORDS
+    return _DIGITS.findall(normalized), words
+
+def query_vector(normalized: str, dim: int = VECTOR_DIM) -> np.ndarray:
+    """L2-normalized float32 vector of hashed character n-gram counts."""
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in normalized.split():
+        padded = f' {word} '
+        for n in NGRAM_SIZES:
+            for i in range(max(len(padded) - n + 1, 1)):
+                vec[zlib.crc32(padded[i:i + n].encode('utf-8')) % dim] += 1.0
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+class AnswerCache:
+    """
+    Thread-safe TTL/LRU cache of chatbot answers with a nearest-neighbour
+    fallback. Vectors live in one preallocated matrix (a row per slot), so a
+    fuzzy lookup is a single matrix-vector product over the cached questions.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 similarity: float = ANSWER_CACHE_SIMILARITY, dim: int = VECTOR_DIM):
+        self.max_entries = max(int(max_entries), 1)
+        self.ttl = ttl
+        self.similarity = similarity
+        self.dim = dim
+        # normalized question -> (slot, answer, expires_at), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._slot_key = [None] * self.max_entries
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.stats = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, key: str):
+        slot, _, _ = self._entries.pop(key)
+        self._vectors[slot] = 0.0
+        self._slot_key[slot] = None
+        self._free.append(slot)
+
+    def _alive(self, key: str, now: float) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        if entry[2] <= now:
+            self._drop(key)
+            self.stats['expired'] += 1
+            return False
+        return True
+
+    def get(self, query: str, fuzzy: bool = True) -> Optional[str]:
+        """Cached answer for query (exact, or similar enough if fuzzy), else None."""
+        key = normalize_query(query)
+        if not key:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._alive(key, now):
+                self._entries.move_to_end(key)
+                self.stats['exact_hits'] += 1
+                return self._entries[key][1]
+            match = self._nearest(key, now) if fuzzy else None
+            if match is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(match)
+            self.stats['similar_hits'] += 1
+            return self._entries[match][1]
+
+    def _nearest(self, key: str, now: float) -> Optional[str]:
+        if not self._entries:
+            return None
+        scores = self._vectors @ query_vector(key, self.dim)
+        terms = key_terms(key)
+        # best candidates first; stop at the first live one with the same key terms
+        for slot in np.argsort(-scores)[:8]:
+            if scores[slot] < self.similarity:
+                break
+            other = self._slot_key[slot]
+            if other is not None and key_terms(other) == terms and self._alive(other, now):
+                return other
+        return None
+
+    def put(self, query: str, answer: str):
+        key = normalize_query(query)
+        if not key or not answer:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            while not self._free:
+                self._drop(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+            slot = self._free.pop()
+            self._vectors[slot] = query_vector(key, self.dim)
+            self._slot_key[slot] = key
+            self._entries[key] = (slot, answer, time.monotonic() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def metrics(self) -> Dict[str, float]:
+        """Counters plus entries and hit_rate (exact + similar hits over lookups)."""
+        with self._lock:
+            out = dict(self.stats)
+            out['entries'] = len(self._entries)
+        lookups = out['exact_hits'] + out['similar_hits'] + out['misses']
+        out['hit_rate'] = (out['exact_hits'] + out['similar_hits']) / lookups if lookups else 0.0
+        return out
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_answer_cache() -> AnswerCache:
+    """The process-wide answer cache shared by every chat session."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnswerCache()
+        return _cache
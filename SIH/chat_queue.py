@@ -0,0 +1,195 @@
+"""
+Background execution of chatbot requests.
+
+A Gemini call takes seconds; run inline it blocks the whole page rerun for
+that user. Requests are instead submitted to a small process-wide worker
+pool and the page polls for them by request id. Running requests expose the
+text streamed so far, so the chat can show partial answers while the rest
+of the page stays interactive.
+
+Limits (environment variables):
+    CHAT_WORKERS          concurrent Gemini calls per process (default 4)
+    CHAT_MAX_PENDING      queued + running requests per process (default 32)
+    CHAT_MAX_PER_SESSION  queued + running requests per session (default 2)
+    CHAT_TIMEOUT          seconds before a request is given up (default 60)
+
+A request counts against the limits until its worker returns, not just
+until it is marked timed out or cancelled: a Gemini call stuck in the RPC
+still holds a worker, and the queue must not keep accepting work behind it.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+CHAT_WORKERS = int(os.getenv('CHAT_WORKERS', '4'))
+CHAT_MAX_PENDING = int(os.getenv('CHAT_MAX_PENDING', '32'))
+CHAT_MAX_PER_SESSION = int(os.getenv('CHAT_MAX_PER_SESSION', '2'))
+CHAT_TIMEOUT = float(os.getenv('CHAT_TIMEOUT', '60'))
+# finished requests nobody collected (closed tabs) are dropped after this long
+RESULT_TTL = 600
+
+QUEUED, RUNNING, DONE = 'queued', 'running', 'done'
+CANCELLED, TIMED_OUT, FAILED = 'cancelled', 'timeout', 'error'
+FINISHED = (DONE, CANCELLED, TIMED_OUT, FAILED)
+
+class QueueFull(Exception):
+    """Raised by ChatQueue.submit when the process or session limit is reached."""
+
+class ChatRequest:
+    """One question in flight; workers update it, the page reads it."""
+
+    def __init__(self, session_id: str, question: str, timeout: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.question = question
+        self.status = QUEUED
+        self.partial = ""
+        self.answer: Optional[str] = None
+        self.created = time.monotonic()
+        self.deadline = self.created + timeout
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        # status changes come from the worker, cancel() and timeouts
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def _start(self) -> bool:
+        with self._lock:
+            if self.status != QUEUED:
+                return False
+            self.status = RUNNING
+            return True
+
+    def _finish(self, status: str, answer: Optional[str] = None):
+        with self._lock:
+            if not self.finished:
+                self.status = status
+                self.answer = answer
+                self.finished_at = time.monotonic()
+
+class ChatQueue:
+    """
+    Bounded worker pool for AgriculturalChatbot requests, tracked per session.
+    submit() returns a request id immediately; poll() reports progress,
+    collect() hands over finished requests once, cancel() stops one.
+    A timed-out or cancelled call cannot be interrupted mid-RPC: the worker
+    stops reading the stream at its next chunk and the result is discarded.
+    """
+
+    def __init__(self, workers: int = CHAT_WORKERS, max_pending: int = CHAT_MAX_PENDING,
+                 max_per_session: int = CHAT_MAX_PER_SESSION, timeout: float = CHAT_TIMEOUT):
+        self.max_pending = max_pending
+        self.max_per_session = max_per_session
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chatbot")
+        self._requests: Dict[str, ChatRequest] = {}
+        # submitted requests whose _run has not returned yet, collected or not
+        self._in_flight: Dict[str, ChatRequest] = {}
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        for request_id, request in list(self._requests.items()):
+            if not request.finished and now >= request.deadline:
+                request.cancel_event.set()
+                request._finish(TIMED_OUT)
+            elif request.finished and now - request.finished_at > RESULT_TTL:
+                del self._requests[request_id]
+
+    def submit(self, session_id: str, chatbot, question: str) -> str:
+        """Queue question for chatbot; returns the request id or raises QueueFull."""
+        with self._lock:
+            self._expire(time.monotonic())
+            active = list(self._in_flight.values())
+            if len(active) >= self.max_pending:
+                raise QueueFull("The assistant is busy. Please try again in a moment.")
+            if sum(r.session_id == session_id for r in active) >= self.max_per_session:
+                raise QueueFull("Please wait for your previous question to be answered.")
+            request = ChatRequest(session_id, question, self.timeout)
+            self._requests[request.id] = request
+            self._in_flight[request.id] = request
+        self._pool.submit(self._run, request, chatbot)
+        return request.id
+
+    def _run(self, request: ChatRequest, chatbot):
+        try:
+            self._answer(request, chatbot)
+        finally:
+            with self._lock:
+                self._in_flight.pop(request.id, None)
+
+    def _answer(self, request: ChatRequest, chatbot):
+        if time.monotonic() >= request.deadline:
+            request._finish(TIMED_OUT)
+        if not request._start():
+            # cancelled or timed out while queued
+            return
+        try:
+            for chunk in chatbot.stream_text_query(request.question):
+                if request.cancel_event.is_set():
+                    break
+                if time.monotonic() >= request.deadline:
+                    request._finish(TIMED_OUT)
+                    break
+                request.partial += chunk
+            else:
+                request._finish(DONE, request.partial)
+                return
+            request._finish(CANCELLED)
+        except Exception as e:
+            request._finish(FAILED, f"Error occurred: {str(e)}")
+
+    def get(self, request_id: str) -> Optional[ChatRequest]:
+        return self._requests.get(request_id)
+
+    def poll(self, session_id: str) -> List[ChatRequest]:
+        """The session's requests (pending and uncollected finished), oldest first."""
+        with self._lock:
+            self._expire(time.monotonic())
+            requests = [r for r in self._requests.values() if r.session_id == session_id]
+        return sorted(requests, key=lambda r: r.created)
+
+    def collect(self, session_id: str) -> List[ChatRequest]:
+        """Remove and return the session's finished requests, oldest first."""
+        with self._lock:
+            self._expire(time.monotonic())
+            done = [r for r in self._requests.values() if r.session_id == session_id and r.finished]
+            for request in done:
+                del self._requests[request.id]
+        return sorted(done, key=lambda r: r.created)
+
+    def cancel(self, request_id: str, session_id: Optional[str] = None) -> bool:
+        """Cancel a queued or running request (only the session's own, if given)."""
+        with self._lock:
+            request = self._requests.get(request_id)
+            if request is None or request.finished or (session_id and request.session_id != session_id):
+                return False
+            request.cancel_event.set()
+            request._finish(CANCELLED)
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            out = {status: 0 for status in (QUEUED, RUNNING) + FINISHED}
+            for request in self._requests.values():
+                out[request.status] += 1
+            # includes timed-out and cancelled calls still holding a worker
+            out['in_flight'] = len(self._in_flight)
+        return out
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_chat_queue() -> ChatQueue:
+    """The process-wide chat queue shared by every session."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ChatQueue()
+        return _queue
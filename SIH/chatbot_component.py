@@ -1,34 +1,105 @@
+import os
+import time
+import uuid
 import streamlit as st
 import google.generativeai as genai
 from chatbot_config import ChatbotConfig
-from typing import Optional, Dict, Any
+from answer_cache import get_answer_cache
+from chat_queue import CANCELLED, TIMED_OUT, QueueFull, get_chat_queue
+from typing import Optional, Dict, Any, Iterator
 import base64
 from PIL import Image
 import io
 
+# render answers chunk by chunk as Gemini streams them; set CHATBOT_STREAMING=0 to wait for the full answer
+STREAM_RESPONSES = os.getenv('CHATBOT_STREAMING', '1') != '0'
+# minimum seconds between redraws of a streaming answer
+STREAM_REDRAW_SECONDS = 0.05
+# answer in the background worker pool so a pending question never blocks the page; CHATBOT_BACKGROUND=0 answers inline
+BACKGROUND_RESPONSES = os.getenv('CHATBOT_BACKGROUND', '1') != '0'
+# how often the chat polls for pending answers (only while some are pending)
+CHAT_POLL_SECONDS = 1.0
+# st.fragment reruns just the chat while polling; older Streamlit versions fall back to a refresh button
+_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+NOT_CONFIGURED_MESSAGE = "Sorry, Gemini API key is not configured. Please set GEMINI_API_KEY environment variable."
+
 class AgriculturalChatbot:
     def __init__(self):
+        # per-session handle; the Gemini clients are shared process-wide (see ClientRegistry)
         self.config = ChatbotConfig()
-        self.text_model = self.config.get_text_model()
-        self.vision_model = self.config.get_vision_model()
+        # answers are shared across sessions too, so repeat questions skip the API
+        self.answer_cache = get_answer_cache()
+
+    @property
+    def text_model(self):
+        return self.config.get_text_model()
+
+    @property
+    def vision_model(self):
+        return self.config.get_vision_model()
         
     def is_configured(self) -> bool:
         return self.config.is_configured()
     
-    def process_text_query(self, user_input: str) -> str:
-        """Process text-based queries - let the model decide how to respond"""
+    def _build_prompt(self, user_input: str) -> str:
+        # Combine system prompt with user input
+        return f"{self.config.get_system_prompt()}\n\nUser: {user_input}\n\nExpert:"
+
+    def process_text_query(self, user_input: str, fuzzy: bool = True) -> str:
+        """
+        Process text-based queries - let the model decide how to respond.
+        fuzzy=False only reuses answers to exactly this question; use it for
+        fixed prompts where only a name changes.
+        """
         if not self.is_configured():
-            return "Sorry, Gemini API key is not configured. Please set GEMINI_API_KEY environment variable."
+            return NOT_CONFIGURED_MESSAGE
         
+        cached = self.answer_cache.get(user_input, fuzzy=fuzzy)
+        if cached is not None:
+            return cached
+
         try:
-            # Combine system prompt with user input
-            full_prompt = f"{self.config.get_system_prompt()}\n\nUser: {user_input}\n\nExpert:"
+            full_prompt = self._build_prompt(user_input)
             
             response = self.text_model.generate_content(full_prompt)
+            # only real answers are cached, never the error messages below
+            self.answer_cache.put(user_input, response.text)
             return response.text
         except Exception as e:
             return f"Error occurred: {str(e)}"
     
+    def stream_text_query(self, user_input: str) -> Iterator[str]:
+        """
+        Like process_text_query, but yields the answer in chunks as Gemini
+        streams them. A cached answer is yielded whole; the answer is cached
+        only if the stream completes.
+        """
+        if not self.is_configured():
+            yield NOT_CONFIGURED_MESSAGE
+            return
+
+        cached = self.answer_cache.get(user_input)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        try:
+            response = self.text_model.generate_content(self._build_prompt(user_input), stream=True)
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # chunks without text parts (e.g. only safety ratings)
+                    continue
+                if text:
+                    parts.append(text)
+                    yield text
+        except Exception as e:
+            yield f"\n\nError occurred: {str(e)}"
+            return
+        self.answer_cache.put(user_input, "".join(parts))
+
     def process_image_query(self, image: Image.Image, user_question: str = "") -> str:
         """Process image-based queries for analysis (disabled - text only)"""
         return "Image analysis is not available. Please ask text-based questions about agriculture."
@@ -37,6 +108,52 @@ class AgriculturalChatbot:
         """Always return True - let the model decide how to respond to any input"""
         return True
 
+def render_streamed_answer(chatbot: AgriculturalChatbot, user_input: str) -> str:
+    """
+    Show the question and stream the answer into a chat bubble as chunks
+    arrive, so the first words appear after the first chunk rather than the
+    whole answer. Returns the full answer text.
+    """
+    st.markdown(f'<div class="chat-message user-message">{user_input}</div>', unsafe_allow_html=True)
+    bubble = st.empty()
+    bubble.markdown('<div class="chat-message bot-message">…</div>', unsafe_allow_html=True)
+    answer = ""
+    last_draw = 0.0
+    for chunk in chatbot.stream_text_query(user_input):
+        answer += chunk
+        now = time.monotonic()
+        if now - last_draw >= STREAM_REDRAW_SECONDS:
+            bubble.markdown(f'<div class="chat-message bot-message">{answer}▌</div>', unsafe_allow_html=True)
+            last_draw = now
+    bubble.markdown(f'<div class="chat-message bot-message">{answer}</div>', unsafe_allow_html=True)
+    return answer
+
+def _finished_answer(request) -> str:
+    if request.status == CANCELLED:
+        return request.partial + " (cancelled)" if request.partial else "(cancelled)"
+    if request.status == TIMED_OUT:
+        return "Sorry, the answer took too long. Please try again."
+    return request.answer or ""
+
+def _render_pending_chats(session_id: str, page_name: str):
+    """Move finished background answers into chat_history and show the pending ones."""
+    queue = get_chat_queue()
+    finished = queue.collect(session_id)
+    for request in finished:
+        st.session_state.chat_history.append((request.question, _finished_answer(request)))
+    pending = queue.poll(session_id)
+    if finished and not pending:
+        # redraw the history with the new answers; polling stops with this rerun
+        st.rerun()
+    for request in pending:
+        st.markdown(f'<div class="chat-message user-message">{request.question}</div>', unsafe_allow_html=True)
+        text = f"{request.partial}▌" if request.partial else "…"
+        st.markdown(f'<div class="chat-message bot-message">{text}</div>', unsafe_allow_html=True)
+        if st.button("Cancel", key=f"chatbot_cancel_{page_name}_{request.id}"):
+            queue.cancel(request.id, session_id)
+    if pending and _fragment is None:
+        st.button("🔄 Check for answer", key=f"chatbot_refresh_{page_name}")
+
 def render_chatbot_right():
     """Render the chatbot as a clean floating widget in bottom right corner"""
     # Get the current page name for unique keys
@@ -62,6 +179,9 @@ def render_chatbot_right():
 
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
+    if 'chat_session_id' not in st.session_state:
+        st.session_state.chat_session_id = uuid.uuid4().hex
+    session_id = st.session_state.chat_session_id
 
     # Custom CSS for floating widget
     st.markdown("""
@@ -216,6 +336,13 @@ def render_chatbot_right():
                 <div class="chat-message bot-message">{bot_msg}</div>
                 """, unsafe_allow_html=True)
 
+        # Questions still being answered in the background
+        if BACKGROUND_RESPONSES:
+            if _fragment is not None and get_chat_queue().poll(session_id):
+                _fragment(run_every=CHAT_POLL_SECONDS)(_render_pending_chats)(session_id, page_name)
+            else:
+                _render_pending_chats(session_id, page_name)
+
         st.markdown("</div>", unsafe_allow_html=True)
 
         # Input area
@@ -236,10 +363,22 @@ def render_chatbot_right():
 
         # Handle input
         if send_clicked and user_input:
-            with st.spinner("Thinking..."):
-                response = chatbot.process_text_query(user_input)
+            if BACKGROUND_RESPONSES:
+                try:
+                    get_chat_queue().submit(session_id, chatbot, user_input)
+                except QueueFull as e:
+                    st.warning(str(e))
+                else:
+                    # rerun so the pending question shows up and polling starts
+                    st.rerun()
+            else:
+                if STREAM_RESPONSES:
+                    response = render_streamed_answer(chatbot, user_input)
+                else:
+                    with st.spinner("Thinking..."):
+                        response = chatbot.process_text_query(user_input)
                 st.session_state.chat_history.append((user_input, response))
-            st.rerun()
+                st.rerun()
 
         # Check for redirect from other pages
         if st.session_state.get('redirect_to_chatbot', False):
@@ -1,37 +1,29 @@
 # Chatbot Configuration for Gemini API
+import hashlib
+import json
 import os
+import threading
+import time
 import google.generativeai as genai
 from typing import Optional, Dict, Any, Tuple
 import base64
 from PIL import Image
 import io
 
-class ChatbotConfig:
-    def __init__(self):
-        # Try environment variable first
-        self.api_key = os.getenv('GEMINI_API_KEY')
-        
-        # If not found, try to import from config file
-        if not self.api_key:
-            try:
-                from api_key_config import GEMINI_API_KEY
-                self.api_key = GEMINI_API_KEY
-            except ImportError:
-                pass
-        
-        # If still not found, use placeholder
-        if not self.api_key:
-            self.api_key = "your_gemini_api_key_here"
-        
-        # Configure Gemini and select supported models dynamically
-        genai.configure(api_key=self.api_key)
-        self.text_model_name, self.vision_model_name = self._select_models()
-        self.text_model = genai.GenerativeModel(self.text_model_name)
-        # vision model may equal text model (if flash supports images)
-        self.vision_model = genai.GenerativeModel(self.vision_model_name)
-        
-        # System prompt for brief Malayalam responses
-        self.system_prompt = """
+PLACEHOLDER_API_KEY = "your_gemini_api_key_here"
+DEFAULT_MODEL = 'gemini-1.5-flash'
+# how long resolved model names are trusted before they are listed again;
+# model availability changes over weeks, so a day is plenty fresh
+MODEL_TTL_SECONDS = int(os.getenv('GEMINI_MODEL_TTL', str(24 * 3600)))
+# after a failed model listing, retry sooner than the full TTL
+MODEL_RETRY_SECONDS = 60
+# resolved model names survive restarts here (keyed by a hash of the API key, never the key itself)
+MODEL_CACHE_PATH = os.getenv(
+    'GEMINI_MODEL_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'gemini_models.json')
+)
+
+# System prompt for brief Malayalam responses
+SYSTEM_PROMPT = """
         നിങ്ങൾ ഒരു കാർഷിക വിദഗ്ധനാണ്. ഇനിപ്പറയുന്ന നിയമങ്ങൾ പാലിക്കുക:
 
         1. എല്ലായ്പ്പോഴും മലയാളത്തിൽ മാത്രം മറുപടി നൽകുക
@@ -47,68 +39,289 @@ class ChatbotConfig:
         - "എന്റെ നെല്ലിന് എന്ത് രോഗമാണ്?" → ചുരുക്കമായ രോഗ നിർണയവും ചികിത്സയും
         - "ഇന്നത്തെ കാലാവസ്ഥ എങ്ങനെയാണ്?" → കൃഷി സംബന്ധിച്ച ചോദ്യമല്ല, മറ്റ് വിഷയങ്ങളിൽ മാത്രം ശ്രദ്ധ കേന്ദ്രീകരിക്കുക
         """
-    
-    def _select_models(self) -> Tuple[str, str]:
-        """
-        Dynamically list available models and select the first one that supports generateContent.
-        Returns (text_model_name, vision_model_name).
-        """
+
+def resolve_api_key() -> str:
+    # Try environment variable first
+    api_key = os.getenv('GEMINI_API_KEY')
+
+    # If not found, try to import from config file
+    if not api_key:
         try:
-            # List all available models and find ones that support generateContent
-            models = genai.list_models()
-            text_candidates = []
-            vision_candidates = []
-            
+            from api_key_config import GEMINI_API_KEY
+            api_key = GEMINI_API_KEY
+        except ImportError:
+            pass
+
+    # If still not found, use placeholder
+    return api_key or PLACEHOLDER_API_KEY
+
+class StubModel:
+    """Stand-in for a genai model listing entry."""
+
+    def __init__(self, name: str, supported_generation_methods=('generateContent',)):
+        self.name = name if name.startswith('models/') else f'models/{name}'
+        self.supported_generation_methods = list(supported_generation_methods)
+
+def stub_model_source(*names: str):
+    """
+    A list_models replacement that returns the given model names offline, e.g.
+    ClientRegistry(list_models=stub_model_source("gemini-1.5-flash")).
+    """
+    return lambda: [StubModel(name) for name in names]
+
+def select_models(list_models=None) -> Tuple[str, str, bool]:
+    """
+    List available models and select the first stable ones that support generateContent.
+    list_models defaults to genai.list_models. Returns (text_model_name,
+    vision_model_name, listed); listed is False when the listing failed and
+    the defaults were used.
+    """
+    try:
+        # list_models() is a generator; keep the results for the fallback pass
+        models = list((list_models or genai.list_models)())
+        text_candidates = []
+        vision_candidates = []
+
+        for model in models:
+            model_name = getattr(model, 'name', '')
+            if not model_name:
+                continue
+
+            # Extract clean model name (remove 'models/' prefix)
+            clean_name = model_name.split('/')[-1] if '/' in model_name else model_name
+
+            # Check if model supports generateContent
+            supported_methods = getattr(model, 'supported_generation_methods', [])
+
+            if 'generateContent' in supported_methods:
+                # Prefer stable models over preview/experimental ones
+                if 'preview' not in clean_name.lower() and 'exp' not in clean_name.lower():
+                    if 'vision' in clean_name.lower() or 'multimodal' in clean_name.lower():
+                        vision_candidates.append(clean_name)
+                    else:
+                        text_candidates.append(clean_name)
+
+        # Select the first stable model for each type, fallback to any available
+        if not text_candidates:
+            # Fallback to any model with generateContent support
             for model in models:
                 model_name = getattr(model, 'name', '')
                 if not model_name:
                     continue
-                    
-                # Extract clean model name (remove 'models/' prefix)
                 clean_name = model_name.split('/')[-1] if '/' in model_name else model_name
-                
-                # Check if model supports generateContent
                 supported_methods = getattr(model, 'supported_generation_methods', [])
-                
-                if 'generateContent' in supported_methods:
-                    # Prefer stable models over preview/experimental ones
-                    if 'preview' not in clean_name.lower() and 'exp' not in clean_name.lower():
-                        if 'vision' in clean_name.lower() or 'multimodal' in clean_name.lower():
-                            vision_candidates.append(clean_name)
-                        else:
-                            text_candidates.append(clean_name)
-            
-            # Select the first stable model for each type, fallback to any available
-            if not text_candidates:
-                # Fallback to any model with generateContent support
-                for model in models:
-                    model_name = getattr(model, 'name', '')
-                    if not model_name:
-                        continue
-                    clean_name = model_name.split('/')[-1] if '/' in model_name else model_name
-                    supported_methods = getattr(model, 'supported_generation_methods', [])
-                    if 'generateContent' in supported_methods and 'vision' not in clean_name.lower():
-                        text_candidates.append(clean_name)
-                        break
-            
-            text_model = text_candidates[0] if text_candidates else 'gemini-1.5-flash'
-            vision_model = vision_candidates[0] if vision_candidates else text_candidates[0] if text_candidates else 'gemini-1.5-flash'
-            
-            return text_model, vision_model
-            
-        except Exception as e:
-            print(f"Error listing models: {e}")
-            # Fallback to safe defaults
-            return 'gemini-1.5-flash', 'gemini-1.5-flash'
+                if 'generateContent' in supported_methods and 'vision' not in clean_name.lower():
+                    text_candidates.append(clean_name)
+                    break
+
+        text_model = text_candidates[0] if text_candidates else DEFAULT_MODEL
+        vision_model = vision_candidates[0] if vision_candidates else text_candidates[0] if text_candidates else DEFAULT_MODEL
+
+        return text_model, vision_model, True
+
+    except Exception as e:
+        print(f"Error listing models: {e}")
+        # Fallback to safe defaults
+        return DEFAULT_MODEL, DEFAULT_MODEL, False
+
+def _key_id(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+class ModelCache:
+    """
+    Resolved (text, vision) model names per API key in a small JSON file,
+    so a restarted process starts with the last known models instead of
+    listing them before its first chat.
+    """
+
+    def __init__(self, path: Optional[str] = MODEL_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def load(self, api_key: str) -> Optional[Tuple[str, str, float]]:
+        """(text_model_name, vision_model_name, resolved_at epoch seconds) or None."""
+        if not self.path:
+            return None
+        with self._lock:
+            entry = self._read().get(_key_id(api_key))
+        try:
+            return str(entry['text']), str(entry['vision']), float(entry['resolved_at'])
+        except (TypeError, KeyError, ValueError):
+            return None
+
+    def save(self, api_key: str, text_model_name: str, vision_model_name: str):
+        if not self.path:
+            return
+        with self._lock:
+            data = self._read()
+            data[_key_id(api_key)] = {'text': text_model_name, 'vision': vision_model_name, 'resolved_at': time.time()}
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"Could not write model cache: {e}")
+
+class GeminiClients:
+    """Resolved model names and their GenerativeModel clients for one API key."""
+
+    def __init__(self, api_key: str, text_model_name: str, vision_model_name: str, ttl: float, age: float = 0.0):
+        self.api_key = api_key
+        self.text_model_name = text_model_name
+        self.vision_model_name = vision_model_name
+        self.text_model = genai.GenerativeModel(text_model_name)
+        # vision model may equal text model (if flash supports images)
+        self.vision_model = (self.text_model if vision_model_name == text_model_name
+                             else genai.GenerativeModel(vision_model_name))
+        # age: how old the model names already are, e.g. when loaded from the disk cache
+        self.expires_at = time.monotonic() + ttl - age
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+class ClientRegistry:
+    """
+    Process-wide Gemini clients shared by every chat session.
+
+    genai.configure() runs once per API key and the model names come from
+    memory, else the disk cache, else the defaults, so getting clients never
+    waits on a model-listing RPC. Names that are missing or older than the
+    TTL are re-listed in one background thread per key; sessions keep the
+    current clients until the refreshed ones are swapped in.
+    list_models replaces genai.list_models, e.g. with stub_model_source().
+    """
+
+    def __init__(self, ttl: float = MODEL_TTL_SECONDS, cache: Optional[ModelCache] = None, list_models=None,
+                 background: bool = True):
+        self.ttl = ttl
+        self.cache = cache if cache is not None else ModelCache()
+        self.list_models = list_models
+        self.background = background
+        self._clients: Dict[str, GeminiClients] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._configured_key: Optional[str] = None
+
+    def get(self, api_key: str) -> GeminiClients:
+        clients = self._clients.get(api_key)
+        if clients is not None and not clients.expired():
+            return clients
+        with self._lock:
+            # another thread may have set it up while we waited
+            clients = self._clients.get(api_key)
+            if clients is None:
+                clients = self._initial(api_key)
+                self._clients[api_key] = clients
+        if clients.expired():
+            self._schedule_refresh(api_key)
+        return clients
+
+    def _configure(self, api_key: str):
+        if self._configured_key != api_key:
+            genai.configure(api_key=api_key)
+            self._configured_key = api_key
+
+    def _initial(self, api_key: str) -> GeminiClients:
+        self._configure(api_key)
+        if api_key == PLACEHOLDER_API_KEY:
+            # no point listing models without a key
+            return GeminiClients(api_key, DEFAULT_MODEL, DEFAULT_MODEL, float('inf'))
+        cached = self.cache.load(api_key)
+        if cached is not None:
+            text_name, vision_name, resolved_at = cached
+            return GeminiClients(api_key, text_name, vision_name, self.ttl, age=max(time.time() - resolved_at, 0.0))
+        # expired right away, so the first get() starts a refresh
+        return GeminiClients(api_key, DEFAULT_MODEL, DEFAULT_MODEL, 0)
+
+    def _schedule_refresh(self, api_key: str):
+        with self._lock:
+            if api_key in self._refreshing:
+                return
+            self._refreshing.add(api_key)
+        if self.background:
+            threading.Thread(target=self._refresh, args=(api_key,), name="gemini-model-refresh", daemon=True).start()
+        else:
+            self._refresh(api_key)
+
+    def _refresh(self, api_key: str):
+        try:
+            self.refresh(api_key)
+        finally:
+            with self._lock:
+                self._refreshing.discard(api_key)
+
+    def refresh(self, api_key: str) -> GeminiClients:
+        """List models now and swap in the new clients; keeps the current ones on failure."""
+        with self._lock:
+            self._configure(api_key)
+        text_name, vision_name, listed = select_models(self.list_models)
+        with self._lock:
+            current = self._clients.get(api_key)
+            if listed:
+                self.cache.save(api_key, text_name, vision_name)
+                clients = GeminiClients(api_key, text_name, vision_name, self.ttl)
+            elif current is not None:
+                # keep serving the last known models; try again soon
+                current.expires_at = time.monotonic() + min(self.ttl, MODEL_RETRY_SECONDS)
+                clients = current
+            else:
+                clients = GeminiClients(api_key, text_name, vision_name, min(self.ttl, MODEL_RETRY_SECONDS))
+            self._clients[api_key] = clients
+            return clients
+
+    def invalidate(self, api_key: Optional[str] = None):
+        """Mark cached clients (all, or one key's) stale so the next get() refreshes them."""
+        with self._lock:
+            for key, clients in self._clients.items():
+                if api_key is None or key == api_key:
+                    clients.expires_at = 0
+
+_registry = ClientRegistry()
+
+def get_client_registry() -> ClientRegistry:
+    return _registry
+
+class ChatbotConfig:
+    """
+    Lightweight per-session handle: holds the API key and looks the models
+    up in the shared ClientRegistry, so creating one costs no network calls.
+    """
+
+    def __init__(self, registry: Optional[ClientRegistry] = None):
+        self.api_key = resolve_api_key()
+        self.registry = registry or _registry
+        self.system_prompt = SYSTEM_PROMPT
+
+    @property
+    def clients(self) -> GeminiClients:
+        return self.registry.get(self.api_key)
+
+    @property
+    def text_model_name(self) -> str:
+        return self.clients.text_model_name
+
+    @property
+    def vision_model_name(self) -> str:
+        return self.clients.vision_model_name
 
     def get_text_model(self):
-        return self.text_model
+        return self.clients.text_model
 
     def get_vision_model(self):
-        return self.vision_model
+        return self.clients.vision_model
     
     def is_configured(self) -> bool:
-        return self.api_key and self.api_key != "your_gemini_api_key_here"
+        return self.api_key and self.api_key != PLACEHOLDER_API_KEY
     
     def get_system_prompt(self) -> str:
         return self.system_prompt
@@ -4,8 +4,12 @@ import pandas as pd
 from datetime import datetime, date, timedelta
 from typing import Dict, List, Optional
 import os
+import sys
 from chatbot_component import render_chatbot_sidebar
+import perf_trace
 
+perf_trace.start("Weather Advisory")
+perf_trace.mark("setup")
 st.title("☀️ Weather Advisory")
 
 BASE_URL = "https://api.open-meteo.com/v1/forecast"
@@ -13,24 +17,22 @@ BASE_URL = "https://api.open-meteo.com/v1/forecast"
 PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
 CALENDAR_FILE = os.path.join(PROJECT_ROOT, "sih4", "crop_calendars_kerala_ml.csv")
 
-KERALA_DISTRICTS = {
-    "Thiruvananthapuram": {"lat": 8.5241, "lon": 76.9366},
-    "Kollam": {"lat": 8.8932, "lon": 76.6141},
-    "Pathanamthitta": {"lat": 9.2662, "lon": 76.7870},
-    "Alappuzha": {"lat": 9.4981, "lon": 76.3388},
-    "Kottayam": {"lat": 9.5916, "lon": 76.5222},
-    "Idukki": {"lat": 9.8560, "lon": 77.1094},
-    "Ernakulam": {"lat": 9.9816, "lon": 76.2999},
-    "Thrissur": {"lat": 10.5276, "lon": 76.2144},
-    "Palakkad": {"lat": 10.7867, "lon": 76.6548},
-    "Malappuram": {"lat": 11.0510, "lon": 76.0711},
-    "Kozhikode": {"lat": 11.2588, "lon": 75.7804},
-    "Wayanad": {"lat": 11.6854, "lon": 76.1320},
-    "Kannur": {"lat": 11.8745, "lon": 75.3704},
-    "Kasaragod": {"lat": 12.4996, "lon": 74.9869},
-}
-
-@st.cache_data(ttl=1800)
+# district list and offline coordinates -> district lookup live with the market tracker;
+# the path is only added for this import so its utils/app/api modules cannot shadow others
+GEO_DIR = os.path.join(PROJECT_ROOT, "SIH2", "SIH2")
+added_geo_dir = GEO_DIR not in sys.path
+if added_geo_dir:
+    sys.path.insert(0, GEO_DIR)
+try:
+    from geo_index import KERALA_DISTRICTS, locate
+finally:
+    if added_geo_dir:
+        try:
+            sys.path.remove(GEO_DIR)
+        except ValueError:
+            pass
+
+@perf_trace.cache_data(ttl=1800)
 def get_weather_data(lat: float, lon: float) -> Optional[Dict]:
     params = {"latitude": lat, "longitude": lon, "current": "temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,wind_speed_10m,weather_code", "hourly": "temperature_2m,relative_humidity_2m,precipitation,wind_speed_10m,soil_temperature_0_to_7cm", "daily": "weather_code,temperature_2m_max,temperature_2m_min,precipitation_sum,wind_gusts_10m_max", "timezone": "auto", "forecast_days": 7}
     try:
@@ -41,7 +43,7 @@ def get_weather_data(lat: float, lon: float) -> Optional[Dict]:
         st.error(f"Weather API Error: {e}")
         return None
 
-@st.cache_data
+@perf_trace.cache_data
 def load_crop_calendars() -> pd.DataFrame:
     try:
         df = pd.read_csv(CALENDAR_FILE)
@@ -142,6 +144,7 @@ def display_forecast(daily_data: pd.DataFrame):
         with cols[i]:
             st.markdown(f"""<div class="forecast-card"> <div class="forecast-date">{day['time'].strftime('%a')}</div> <div style="font-size: 2rem;">{get_weather_icon(day['weather_code'])}</div> <div class="forecast-temp"> <span style="color: #e74c3c;">{day['temperature_2m_max']:.0f}°</span> / <span style="color: #3498db;">{day['temperature_2m_min']:.0f}°</span> </div> <div class="forecast-details"> <div>🌧️ {day['precipitation_sum']:.1f}mm</div> </div> </div>""", unsafe_allow_html=True)
 
+perf_trace.mark("css")
 st.markdown("""
 <style>
 .weather-card { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 2rem; border-radius: 20px; color: white; text-align: center; margin: 1rem 0; box-shadow: 0 8px 32px rgba(0,0,0,0.1); }
@@ -157,8 +160,10 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Render the agricultural chatbot in sidebar
+perf_trace.mark("chatbot")
 render_chatbot_sidebar()
 
+perf_trace.mark("calendar load")
 crop_calendars = load_crop_calendars()
 if not crop_calendars.empty:
     st.sidebar.header("Your Farm Profile / നിങ്ങളുടെ ഫാം പ്രൊഫൈൽ")
@@ -166,12 +171,36 @@ if not crop_calendars.empty:
     selected_crop = st.sidebar.selectbox("Select Your Crop / വിള തിരഞ്ഞെടുക്കുക", options=unique_crops)
     max_days = int(crop_calendars[crop_calendars['crop'] == selected_crop]['end_day'].max())
     planting_date = st.sidebar.date_input("Select Planting Date / നട്ട തീയതി തിരഞ്ഞെടുക്കുക", value=date.today() - timedelta(days=60), min_value=date.today() - timedelta(days=max_days), max_value=date.today())
-    selected_district = st.sidebar.selectbox("Select Your District / ജില്ല തിരഞ്ഞെടുക്കുക", options=list(KERALA_DISTRICTS.keys()))
+    district_names = list(KERALA_DISTRICTS.keys())
+    gps_text = st.sidebar.text_input("GPS coordinates (optional) / ജിപിഎസ് (lat, lon)", value="", placeholder="9.9816, 76.2999")
+    gps_point, gps_district = None, None
+    if gps_text.strip():
+        try:
+            gps_point = tuple(float(v) for v in gps_text.replace(" ", "").split(","))
+            if len(gps_point) != 2:
+                raise ValueError(gps_text)
+            area = locate(*gps_point)
+            gps_district = area["district"] if area and area.get("district") in KERALA_DISTRICTS else None
+            if gps_district is None:
+                st.sidebar.warning("These coordinates are outside Kerala's districts.")
+                gps_point = None
+            elif not area["exact"]:
+                st.sidebar.caption(f"Nearest district headquarters: {gps_district}. Check the district below if you are near a border.")
+        except ValueError:
+            st.sidebar.warning("Enter coordinates as: latitude, longitude")
+            gps_point = None
+    selected_district = st.sidebar.selectbox("Select Your District / ജില്ല തിരഞ്ഞെടുക്കുക", options=district_names,
+                                             index=district_names.index(gps_district) if gps_district else 0)
     st.info(f"Advisory for a **{selected_crop}** crop planted on **{planting_date.strftime('%d %B %Y')}** in **{selected_district}**.", icon="🌱")
     st.markdown("---")
     coords = KERALA_DISTRICTS[selected_district]
+    if gps_point is not None and selected_district == gps_district:
+        # forecast for the exact spot rather than the district headquarters
+        coords = {"lat": gps_point[0], "lon": gps_point[1]}
     with st.spinner(f"Fetching forecast and generating stage-aware alerts for {selected_district}..."):
+        perf_trace.mark("weather fetch")
         weather_data = get_weather_data(coords['lat'], coords['lon'])
+        perf_trace.mark("alerts and render")
         if weather_data:
             advisor = CropLifecycleAdvisor(crop_calendars)
             stage_alerts = advisor.get_stage_alerts(selected_crop, planting_date, weather_data)
@@ -187,5 +216,4 @@ if not crop_calendars.empty:
         else:
             st.error("Could not fetch weather data. Please try again later.")
 
-
-
+perf_trace.finish()
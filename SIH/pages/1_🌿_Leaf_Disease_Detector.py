@@ -5,6 +5,10 @@ import io
 import base64
 from sih.sih.config import HUGGINGFACE_API_KEY, MODEL_ID, API_URL, TIMEOUT_SECONDS, IMAGE_SIZE, IMAGE_QUALITY, MAX_FILE_SIZE_MB
 from chatbot_component import AgriculturalChatbot
+import perf_trace
+
+perf_trace.start("Leaf Disease Detector")
+perf_trace.mark("setup")
 
 st.title("🌿 Crop Leaf Disease Detector / ഇല രോഗ കണ്ടെത്തൽ")
 
@@ -77,6 +81,7 @@ def format_prediction(prediction):
 
 api_token = HUGGINGFACE_API_KEY
 
+perf_trace.mark("upload")
 uploaded_file = st.file_uploader("Choose a leaf image... / ഒരു ഇല ചിത്രം തിരഞ്ഞെടുക്കുക...", type=["jpg", "jpeg", "png"])
 
 if uploaded_file is not None:
@@ -97,6 +102,7 @@ if uploaded_file is not None:
         if file_size_mb > MAX_FILE_SIZE_MB:
             st.warning("File is large. Consider using a smaller image. / ഫയൽ വലുതാണ്. ചെറിയ ചിത്രം ഉപയോഗിക്കുക.")
         if st.button("Classify Leaf / ഇല വർഗീകരിക്കുക", type="primary"):
+            perf_trace.mark("classification")
             with st.spinner("Analyzing the image... / ചിത്രം വിശകലനം ചെയ്യുന്നു..."):
                 prediction = query_api(img_bytes, api_token)
             st.subheader("Prediction Result: / പ്രവചന ഫലം:")
@@ -119,7 +125,8 @@ if uploaded_file is not None:
                 if chatbot.is_configured():
                     with st.spinner("Getting treatment advice... / ചികിത്സാ ഉപദേശം നേടുന്നു..."):
                         treatment_query = f"{disease_name} രോഗത്തിനുള്ള ചികിത്സ എന്താണ്? ജൈവവും രാസവുമായ ഓപ്ഷനുകൾ ഉൾപ്പെടെ ചുരുക്കമായ ചികിത്സാ നിർദ്ദേശങ്ങൾ നൽകുക."
-                        treatment_advice = chatbot.process_text_query(treatment_query)
+                        # fixed prompt around the disease name: never reuse another disease's answer
+                        treatment_advice = chatbot.process_text_query(treatment_query, fuzzy=False)
                         st.markdown(treatment_advice)
                 else:
                     st.warning("Chatbot not configured. Please set GEMINI_API_KEY environment variable.")
@@ -135,5 +142,4 @@ if uploaded_file is not None:
 else:
     st.info("Please upload an image to get started. / ആരംഭിക്കാൻ ഒരു ചിത്രം അപ്‌ലോഡ് ചെയ്യുക.")
 
-
-
+perf_trace.finish()
@@ -3,13 +3,19 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime
 from chatbot_component import render_chatbot_sidebar
+import perf_trace
+
+perf_trace.start("KeralaFarmAssist")
+perf_trace.mark("setup")
 
 st.title("🌾 KeralaFarmAssist — Personal Farm Assistant / കേരള കൃഷി സഹായി")
 st.markdown("*Smart cultivation cost estimation and budget planning for Kerala farmers*")
 st.markdown("*കേരള കർഷകർക്കുള്ള സ്മാർട്ട് കൃഷി ചെലവ് കണക്കാക്കൽ, ബജറ്റ് ആസൂത്രണം*")
 
 # Render the agricultural chatbot in sidebar
+perf_trace.mark("chatbot")
 render_chatbot_sidebar()
+perf_trace.mark("inputs")
 
 LOCATION_DATA = {"district": "Kottayam", "season": "Kharif 2024", "soil_type": "Alluvial", "rainfall": "Heavy"}
 
@@ -79,6 +85,7 @@ export_results = st.sidebar.button("📊 Export Results / ഫലങ്ങൾ എ
 if 'cost_data' not in st.session_state: st.session_state.cost_data = None
 if 'comparison_data' not in st.session_state: st.session_state.comparison_data = None
 
+perf_trace.mark("cost calculation")
 if compute_costs:
     costs, total_cost, yield_total = calculate_costs(crop, approach, area)
     cost_per_acre = total_cost / area
@@ -98,6 +105,7 @@ if compare_approaches:
         comparison_data.append({'Approach': app, 'Total Cost (₹)': f"₹{total_cost:,.0f}", 'Expected Yield (Quintals)': f"{yield_total:.1f}", 'Cost per Quintal (₹)': f"₹{cost_per_quintal:.0f}", 'Profit per Quintal (₹)': f"₹{profit_per_quintal:.0f}" if market_price > 0 else "N/A"})
     st.session_state.comparison_data = comparison_data
 
+perf_trace.mark("charts and tables")
 if st.session_state.cost_data:
     data = st.session_state.cost_data
     st.header("📊 Quick Summary")
@@ -211,5 +219,4 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-
-
+perf_trace.finish()
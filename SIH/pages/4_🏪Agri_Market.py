@@ -3,10 +3,15 @@ import os
 import sys
 import runpy
 from chatbot_component import render_chatbot_sidebar
+import perf_trace
+
+perf_trace.start("Agri Market")
+perf_trace.mark("setup")
 
 st.title("🏪 Agri Market / കാർഷിക വിപണി")
 
 # Render the agricultural chatbot in sidebar
+perf_trace.mark("chatbot")
 render_chatbot_sidebar()
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(__file__))
@@ -35,7 +40,8 @@ else:
             sys.path.insert(0, entry_dir)
         # Inform the embedded app not to call st.set_page_config again
         os.environ["EMBEDDED_STREAMLIT"] = "1"
-        # Execute the found script in this process
+        # Execute the found script in this process; its marks land in this page's trace
+        perf_trace.mark("market app")
         runpy.run_path(entry, run_name="__main__")
     finally:
         # Best-effort removal to avoid polluting sys.path across reruns
@@ -52,5 +58,4 @@ else:
             pass
         os.chdir(cwd)
 
-
-
+perf_trace.finish()
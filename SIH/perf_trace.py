@@ -0,0 +1,221 @@
+"""
+Opt-in rerun profiler for the Agri Suite pages.
+
+Every widget interaction reruns the whole page script; this times named
+sections of each rerun and counts cache hits/misses of functions cached
+with perf_trace.cache_data, then emits one trace per rerun.
+
+Enable with the AGRI_PERF_TRACE environment variable:
+    file   - append one JSON line per rerun to AGRI_PERF_TRACE_FILE
+             (default: .perf/reruns.jsonl next to this file)
+    panel  - show the last rerun's timings in a sidebar expander
+    all    - both
+or for one browser session by opening a page with ?perf=1 (panel only).
+When disabled every helper is a cheap no-op.
+
+In a page:
+    import perf_trace
+    perf_trace.start("Weather Advisory")
+    perf_trace.mark("data load")      # checkpoint: times until the next mark
+    with perf_trace.section("chart"): # or time one block
+        ...
+    perf_trace.finish()
+"""
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import streamlit as st
+
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:  # older Streamlit
+    try:
+        from streamlit.scriptrunner import get_script_run_ctx
+    except ImportError:
+        get_script_run_ctx = None
+
+TRACE_MODE = os.environ.get("AGRI_PERF_TRACE", "").strip().lower()
+TRACE_FILE = os.environ.get(
+    "AGRI_PERF_TRACE_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".perf", "reruns.jsonl")
+)
+
+# the open trace of every browser session, keyed by Streamlit session id; a rerun
+# may run on a different thread than the one it interrupted, so threads can't be the key
+_traces = {}
+_traces_lock = threading.Lock()
+# traces of sessions that went away mid-rerun are dropped after this long
+STALE_TRACE_SECONDS = 600
+_file_lock = threading.Lock()
+# process-wide cache counters: {function name: {"hits": n, "misses": n}}
+CACHE_STATS = {}
+_stats_lock = threading.Lock()
+
+def _modes():
+    if TRACE_MODE in ("1", "all", "true", "yes"):
+        return {"file", "panel"}
+    modes = {m.strip() for m in TRACE_MODE.split(",") if m.strip() in ("file", "panel")}
+    try:
+        if st.query_params.get("perf") in ("1", "true"):
+            modes.add("panel")
+    except Exception:
+        pass
+    return modes
+
+def _session_key():
+    ctx = get_script_run_ctx() if get_script_run_ctx else None
+    # outside a Streamlit script run (bare python, tests) fall back to the thread
+    return ctx.session_id if ctx is not None else f"thread-{threading.get_ident()}"
+
+def _trace():
+    with _traces_lock:
+        return _traces.get(_session_key())
+
+def _pop_trace():
+    with _traces_lock:
+        return _traces.pop(_session_key(), None)
+
+def _set_trace(trace):
+    key = _session_key()
+    with _traces_lock:
+        stale = trace["started"] - STALE_TRACE_SECONDS
+        for other in [k for k, t in _traces.items() if t["started"] < stale]:
+            del _traces[other]
+        _traces[key] = trace
+
+def start(page):
+    """Begin tracing a rerun of page. Flushes a previous rerun of this session that never reached finish()."""
+    modes = _modes()
+    pending = _pop_trace()
+    if pending is not None:
+        _emit(pending, complete=False)
+    if not modes:
+        return
+    _set_trace({
+        "page": page,
+        "modes": modes,
+        "started": time.perf_counter(),
+        "wall_time": time.time(),
+        "sections": [],
+        "cache": {},
+        "open_mark": None,
+        "stack": [],
+    })
+
+def _add_section(trace, name, seconds):
+    trace["sections"].append({"name": name, "ms": round(seconds * 1000, 3)})
+
+def _close_mark(trace, now):
+    if trace["open_mark"] is not None:
+        name, began = trace["open_mark"]
+        _add_section(trace, name, now - began)
+        trace["open_mark"] = None
+
+def mark(name):
+    """Checkpoint: close the previous mark and time from here to the next mark or finish()."""
+    trace = _trace()
+    if trace is None:
+        return
+    now = time.perf_counter()
+    _close_mark(trace, now)
+    trace["open_mark"] = (name, now)
+
+@contextlib.contextmanager
+def section(name):
+    """Time one block; nested sections are named parent/child."""
+    trace = _trace()
+    if trace is None:
+        yield
+        return
+    trace["stack"].append(name)
+    full_name = "/".join(trace["stack"])
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_section(trace, full_name, time.perf_counter() - began)
+        trace["stack"].pop()
+
+def _count(name, key):
+    with _stats_lock:
+        CACHE_STATS.setdefault(name, {"hits": 0, "misses": 0})[key] += 1
+    trace = _trace()
+    if trace is not None:
+        trace["cache"].setdefault(name, {"hits": 0, "misses": 0})[key] += 1
+
+def cache_data(func=None, **kwargs):
+    """
+    Drop-in for st.cache_data that also counts hits and misses per function.
+    Use as @perf_trace.cache_data or @perf_trace.cache_data(ttl=...).
+    """
+    def decorate(fn):
+        name = fn.__qualname__
+        computed = threading.local()
+
+        @functools.wraps(fn)
+        def body(*args, **kw):
+            # only runs on a cache miss
+            computed.miss = True
+            return fn(*args, **kw)
+
+        cached = st.cache_data(**kwargs)(body)
+
+        @functools.wraps(fn)
+        def call(*args, **kw):
+            computed.miss = False
+            try:
+                return cached(*args, **kw)
+            finally:
+                _count(name, "misses" if computed.miss else "hits")
+
+        call.clear = cached.clear
+        return call
+
+    return decorate(func) if func is not None else decorate
+
+def finish():
+    """End the current rerun's trace and emit it (file and/or panel)."""
+    trace = _pop_trace()
+    if trace is None:
+        return
+    _emit(trace, complete=True)
+
+def _emit(trace, complete):
+    now = time.perf_counter()
+    _close_mark(trace, now)
+    record = {
+        "ts": round(trace["wall_time"], 3),
+        "page": trace["page"],
+        "complete": complete,
+        "total_ms": round((now - trace["started"]) * 1000, 3),
+        "sections": trace["sections"],
+        "cache": trace["cache"],
+    }
+    if "file" in trace["modes"]:
+        try:
+            os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+            line = json.dumps(record, ensure_ascii=False)
+            with _file_lock, open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print("Could not write perf trace:", e)
+    if "panel" in trace["modes"] and complete:
+        _render_panel(record)
+
+def _render_panel(record):
+    with st.sidebar.expander(f"⏱ Rerun profile: {record['total_ms']:.0f} ms", expanded=False):
+        if record["sections"]:
+            st.dataframe(
+                [{"section": s["name"], "ms": s["ms"]} for s in record["sections"]],
+                use_container_width=True, hide_index=True,
+            )
+        if record["cache"]:
+            rows = []
+            for name, counts in record["cache"].items():
+                total = CACHE_STATS.get(name, {})
+                rows.append({"function": name, "hits": counts["hits"], "misses": counts["misses"],
+                             "process hits": total.get("hits", 0), "process misses": total.get("misses", 0)})
+            st.dataframe(rows, use_container_width=True, hide_index=True)
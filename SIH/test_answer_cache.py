@@ -0,0 +1,37 @@
+# test_answer_cache.py
+from answer_cache import AnswerCache, normalize_query, query_vector
+
+# the leaf disease page's treatment prompt
+TREATMENT = "{} രോഗത്തിനുള്ള ചികിത്സ എന്താണ്? ജൈവവും രാസവുമായ ഓപ്ഷനുകൾ ഉൾപ്പെടെ ചുരുക്കമായ ചികിത്സാ നിർദ്ദേശങ്ങൾ നൽകുക."
+
+def similarity(a, b):
+    return float(query_vector(normalize_query(a)) @ query_vector(normalize_query(b)))
+
+def test_diseases_in_same_prompt_do_not_share_answers():
+    cache = AnswerCache(max_entries=16)
+    cache.put(TREATMENT.format("Tomato Late Blight"), "late blight answer")
+    for other in ("Tomato Early Blight", "Potato Late Blight"):
+        question = TREATMENT.format(other)
+        # close enough by n-grams alone; the disease name must still keep them apart
+        assert similarity(question, TREATMENT.format("Tomato Late Blight")) >= cache.similarity
+        assert cache.get(question) is None
+        assert cache.get(question, fuzzy=False) is None
+    assert cache.get(TREATMENT.format("Tomato Late Blight"), fuzzy=False) == "late blight answer"
+    assert cache.metrics()["similar_hits"] == 0
+
+def test_wording_variants_still_hit():
+    cache = AnswerCache(max_entries=16)
+    cache.put(TREATMENT.format("Tomato Late Blight"), "late blight answer")
+    cache.put("How to treat tomato late blight?", "english answer")
+    variant = TREATMENT.format("tomato late blight").replace("എന്താണ്", "എന്താണു")
+    assert cache.get(variant) == "late blight answer"
+    assert cache.get("how do i treat tomato late blight") == "english answer"
+    assert cache.metrics()["similar_hits"] == 2
+    # fuzzy=False only takes exact (normalized) repeats
+    assert cache.get(variant, fuzzy=False) is None
+    assert cache.get("HOW to treat Tomato late blight", fuzzy=False) == "english answer"
+
+def test_different_numbers_never_match():
+    cache = AnswerCache(max_entries=16)
+    cache.put("How much urea for 2 kg of seed", "two")
+    assert cache.get("How much urea for 5 kg of seed") is None
@@ -0,0 +1,92 @@
+# test_chat_queue.py
+import threading
+import time
+import pytest
+from chat_queue import CANCELLED, DONE, FAILED, TIMED_OUT, ChatQueue, QueueFull
+
+class StubBot:
+    """Streams fixed chunks; blocks on `gate` before each one when given."""
+
+    def __init__(self, chunks=("a", "b", "c"), gate=None, error=None):
+        self.chunks = chunks
+        self.gate = gate
+        self.error = error
+        self.started = threading.Event()
+
+    def stream_text_query(self, question):
+        self.started.set()
+        for chunk in self.chunks:
+            if self.gate is not None:
+                self.gate.wait()
+            yield chunk
+        if self.error:
+            raise self.error
+
+@pytest.fixture
+def gate():
+    """Holds stub calls mid-stream; always opened at teardown so no worker outlives the test."""
+    event = threading.Event()
+    yield event
+    event.set()
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+def test_collect_returns_finished_answers_once():
+    queue = ChatQueue(workers=2, max_pending=4, max_per_session=2, timeout=5)
+    request_id = queue.submit("s1", StubBot(), "question")
+    failing = queue.submit("s1", StubBot(error=RuntimeError("boom")), "question")
+    wait_for(lambda: all(r.finished for r in queue.poll("s1")))
+    done = {r.id: r for r in queue.collect("s1")}
+    assert done[request_id].status == DONE and done[request_id].answer == "abc"
+    assert done[failing].status == FAILED and "boom" in done[failing].answer
+    assert queue.collect("s1") == [] and queue.poll("s1") == []
+
+def test_submit_limits_per_session_and_process(gate):
+    queue = ChatQueue(workers=1, max_pending=3, max_per_session=2, timeout=5)
+    queue.submit("s1", StubBot(gate=gate), "q1")
+    queue.submit("s1", StubBot(gate=gate), "q2")
+    with pytest.raises(QueueFull):
+        queue.submit("s1", StubBot(gate=gate), "q3")
+    queue.submit("s2", StubBot(gate=gate), "q4")
+    with pytest.raises(QueueFull):
+        queue.submit("s3", StubBot(gate=gate), "q5")
+    gate.set()
+    wait_for(lambda: queue.stats()["in_flight"] == 0)
+    queue.submit("s3", StubBot(), "q6")
+
+def test_timed_out_call_counts_until_worker_returns(gate):
+    queue = ChatQueue(workers=1, max_pending=1, max_per_session=1, timeout=0.2)
+    hanging = StubBot(gate=gate)
+    queue.submit("s1", hanging, "slow")
+    assert hanging.started.wait(5)
+    # timeouts are applied when the page polls
+    wait_for(lambda: [r.status for r in queue.poll("s1")] == [TIMED_OUT])
+    # the request is given up, but its worker is still stuck in the call
+    assert [r.status for r in queue.collect("s1")] == [TIMED_OUT]
+    for session in ("s1", "s2"):
+        with pytest.raises(QueueFull):
+            queue.submit(session, StubBot(), "next")
+    gate.set()
+    wait_for(lambda: queue.stats()["in_flight"] == 0)
+    queue.submit("s2", StubBot(), "next")
+
+def test_cancel_queued_and_running_requests(gate):
+    queue = ChatQueue(workers=1, max_pending=4, max_per_session=2, timeout=5)
+    running = StubBot(gate=gate)
+    running_id = queue.submit("s1", running, "q1")
+    queued_id = queue.submit("s1", StubBot(), "q2")
+    assert running.started.wait(5)
+    assert not queue.cancel(queued_id, session_id="other")
+    assert queue.cancel(queued_id, session_id="s1")
+    assert queue.cancel(running_id)
+    assert not queue.cancel(running_id)
+    gate.set()
+    wait_for(lambda: queue.stats()["in_flight"] == 0)
+    statuses = {r.id: r.status for r in queue.collect("s1")}
+    assert statuses == {running_id: CANCELLED, queued_id: CANCELLED}
+    # the cancelled call's partial text is never handed out as an answer
+    assert queue.get(running_id) is None
@@ -52,5 +52,36 @@ def test_chatbot():
     
     return True
 
+def test_model_cache():
+    """Test model resolution and its disk cache offline, with a stub model list"""
+    import tempfile
+    from chatbot_config import ClientRegistry, ModelCache, stub_model_source
+
+    print("🧪 Testing model cache (offline)...")
+    listed = []
+    source = stub_model_source("gemini-2.0-flash-exp", "gemini-1.5-pro", "gemini-pro-vision")
+
+    def counting_source():
+        listed.append(1)
+        return source()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ModelCache(os.path.join(tmp, "models.json"))
+        registry = ClientRegistry(cache=cache, list_models=counting_source, background=False)
+        # nothing cached yet: the first get() refreshes, later ones reuse the result
+        registry.get("test-key")
+        clients = registry.get("test-key")
+        assert (clients.text_model_name, clients.vision_model_name) == ("gemini-1.5-pro", "gemini-pro-vision")
+        assert len(listed) == 1
+
+        # a new process starts from the disk cache without listing models
+        restarted = ClientRegistry(cache=cache, list_models=counting_source, background=False)
+        assert restarted.get("test-key").text_model_name == "gemini-1.5-pro"
+        assert len(listed) == 1
+
+    print("✅ Model cache works")
+    return True
+
 if __name__ == "__main__":
+    test_model_cache()
     test_chatbot()